@@ -0,0 +1,248 @@
+
+import pandas as pd
+import numpy as np
+import os
+import datetime
+import shutil
+import json
+import hashlib
+import argparse
+import logging
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from fpa_load_file_creator import backup_file, backup_columns, backup_key_columns, backup_snapshot_dir, backup_snapshot_manifest, \
+                                  backup_partition_name, encode_backup_keys, read_backup_file
+
+
+##########################################################################################
+# NOTE: This is a nightly job that runs on the Alteryx server after the FIN_STMT backup
+# export (CORPPLN_Forecast_CY) has been written to the shared drive
+#
+# It converts the export into uncompressed Arrow (Feather) files on the server's local disk
+# DataLoader.process_backup_file memory-maps those files instead of loading the whole export,
+# so concurrent load runs on the server share one copy of the backup in the OS page cache
+#
+# Each partition gets a sidecar key index (sorted encoded keys plus row offsets) that the loader
+# binary-searches for the exact intersections on a load sheet
+#
+# The export is regenerated in full every night, but only a small part of it changes
+# Each partition's content digest is kept in the manifest; a partition whose digest hasn't changed keeps
+# its files from the previous generation, so only the changed partitions (and their indexes) are rewritten
+# The files of the snapshot a run replaces are kept until the following run, so a load run that read the
+# old manifest just before it was replaced can still map its partitions
+#
+#   python fpa_backup_snapshot.py [--full]
+##########################################################################################
+
+
+def write_snapshot_manifest(snapshot_manifest):
+
+    # Write to a temporary file and swap it in, so a load run never reads a half-written manifest
+    manifest_temp_file = backup_snapshot_manifest + '.tmp'
+    with open(manifest_temp_file, 'w') as f:
+        json.dump(snapshot_manifest, f, indent=2)
+    os.replace(manifest_temp_file, backup_snapshot_manifest)
+
+
+
+def snapshot_files(snapshot_manifest):
+
+    # The partition and index files a manifest references, relative to the snapshot folder (none if there's no manifest)
+    manifest_files = set()
+    if not snapshot_manifest is None:
+        for partition in snapshot_manifest['partitions'].values():
+            manifest_files.update([partition['file'], partition['keys_file'], partition['rows_file']])
+    return manifest_files
+
+
+
+def remove_old_generations(snapshot_manifest, replaced_manifest):
+
+    # Delete the generation folders, and the partition files in the folders that are kept, that neither the new manifest nor the one it replaced references
+    # The replaced manifest's files are kept until the next night's job: a load run that read that manifest just before the swap
+    # may not have mapped its partitions yet, and it must still find them
+    # Load runs that still have older files mapped (Windows won't delete them) are skipped and picked up again by the next night's job
+    retained_files = snapshot_files(snapshot_manifest) | snapshot_files(replaced_manifest)
+    retained_generations = set(retained_file.split('/')[0] for retained_file in retained_files)
+
+    for generation in os.listdir(backup_snapshot_dir):
+        if generation.startswith('gen_') and not generation in retained_generations:
+            try:
+                shutil.rmtree(os.path.join(backup_snapshot_dir, generation))
+                print('Removed old snapshot generation ' + generation)
+            except OSError:
+                print('Snapshot generation ' + generation + ' is still in use; it will be removed next time')
+        elif generation in retained_generations:
+            for partition_file in os.listdir(os.path.join(backup_snapshot_dir, generation)):
+                if not generation + '/' + partition_file in retained_files:
+                    try:
+                        os.remove(os.path.join(backup_snapshot_dir, generation, partition_file))
+                    except OSError:
+                        print('Snapshot file ' + generation + '/' + partition_file + ' is still in use; it will be removed next time')
+
+
+
+def read_snapshot_manifest():
+
+    # The manifest of the current snapshot, or None if there isn't one yet
+    if not os.path.exists(backup_snapshot_manifest):
+        return None
+    with open(backup_snapshot_manifest) as f:
+        return json.load(f)
+
+
+
+def partition_digest(df_partition):
+
+    # Content hash of a partition that doesn't depend on the row order of the export: the sorted hashes of its rows
+    row_hashes = np.sort(pd.util.hash_pandas_object(df_partition[backup_columns], index=False).to_numpy())
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
+
+
+
+def diff_partition(previous_partition, df_partition):
+
+    # Compare a changed partition with its previous version by composite key (ACCT|CC|IO|CO|PC|ET|SCEN|VER|TYPE|YEAR)
+    # Returns the number of intersections that were added, removed, and changed (any monthly value differs)
+    df_previous = feather.read_feather(os.path.join(backup_snapshot_dir, previous_partition['file']), memory_map=True)
+    month_columns = backup_columns[10:]
+
+    previous_rows = pd.DataFrame({'KEY': encode_backup_keys(df_previous), 'VALUES': pd.util.hash_pandas_object(df_previous[month_columns], index=False).to_numpy()})
+    current_rows = pd.DataFrame({'KEY': encode_backup_keys(df_partition), 'VALUES': pd.util.hash_pandas_object(df_partition[month_columns], index=False).to_numpy()})
+    compared = previous_rows.merge(current_rows, how='outer', on='KEY', indicator=True)
+
+    partition_changes = {}
+    partition_changes['added'] = int((compared['_merge'] == 'right_only').sum())
+    partition_changes['removed'] = int((compared['_merge'] == 'left_only').sum())
+    partition_changes['changed'] = int(((compared['_merge'] == 'both') & (compared['VALUES_x'] != compared['VALUES_y'])).sum())
+
+    return partition_changes
+
+
+
+def write_partition_index(df_partition, partition_file):
+
+    # Sort the partition's encoded keys and keep each key's row offset in the partition file
+    # Both arrays are saved as .npy files so the loader can memory-map them
+    keys = encode_backup_keys(df_partition)
+    order = np.argsort(keys, kind='stable')
+
+    keys_file = partition_file[:-len('.arrow')] + '.keys.npy'
+    rows_file = partition_file[:-len('.arrow')] + '.rows.npy'
+    np.save(os.path.join(backup_snapshot_dir, keys_file), keys[order])
+    np.save(os.path.join(backup_snapshot_dir, rows_file), order.astype(np.int64))
+
+    return keys_file, rows_file
+
+
+
+def create_backup_snapshot(full_refresh=False):
+
+    print('Running create_backup_snapshot...')
+
+    # Capture the export's timestamp before reading it; if the export is replaced while it's being read,
+    # the loader will see the snapshot as stale and fall back to the export
+    source_mtime = os.path.getmtime(backup_file)
+
+    finstmt_backup = read_backup_file()
+    finstmt_backup.columns = backup_columns
+
+    # Store the monthly values as float64 so the loader never has to convert them
+    for period in backup_columns[10:]:
+        finstmt_backup[period] = pd.to_numeric(finstmt_backup[period], errors='coerce')
+
+    print('Backup file size:')
+    print(finstmt_backup.shape)
+
+    # Assign every row to its YEAR/ACCT partition (the same naming the loader uses to find them)
+    finstmt_backup['PARTITION'] = [backup_partition_name(year, acct) for year, acct in zip(finstmt_backup['YEAR'], finstmt_backup['ACCT'])]
+
+    # Partitions are compared with the previous snapshot unless a full refresh was requested
+    # Its files are kept either way until the next run of this job (see remove_old_generations)
+    replaced_manifest = read_snapshot_manifest()
+    previous_partitions = {}
+    if not full_refresh and not replaced_manifest is None:
+        previous_partitions = replaced_manifest['partitions']
+
+    # Each run of this job writes a new generation folder; the files in it are never modified after the manifest points to them
+    # Unchanged partitions stay in the generation they were written to
+    now = datetime.datetime.now()
+    generation = 'gen_' + now.strftime('%Y%m%d%H%M%S')
+
+    snapshot_manifest = {}
+    snapshot_manifest['created'] = now.isoformat(timespec='seconds')
+    snapshot_manifest['source_file'] = backup_file
+    snapshot_manifest['source_mtime'] = source_mtime
+    snapshot_manifest['partitions'] = {}
+
+    snapshot_changes = {'partitions_written':0, 'partitions_reused':0, 'added':0, 'removed':0, 'changed':0}
+
+    for partition, df_partition in finstmt_backup.groupby('PARTITION', sort=True):
+        df_partition = df_partition[backup_columns].reset_index(drop=True)
+        digest = partition_digest(df_partition)
+
+        previous_partition = previous_partitions.get(partition)
+        if not previous_partition is None and previous_partition.get('digest') == digest:
+            snapshot_manifest['partitions'][partition] = previous_partition
+            snapshot_changes['partitions_reused'] += 1
+            continue
+
+        if not previous_partition is None:
+            partition_changes = diff_partition(previous_partition, df_partition)
+            print('Partition ' + partition + ' changed: ' + str(partition_changes))
+        else:
+            partition_changes = {'added':len(df_partition.index), 'removed':0, 'changed':0}
+        for change in partition_changes:
+            snapshot_changes[change] += partition_changes[change]
+
+        # Uncompressed, so the loader can use the mapped pages directly without decompressing them
+        os.makedirs(os.path.join(backup_snapshot_dir, generation), exist_ok=True)
+        partition_file = generation + '/' + partition + '.arrow'
+        feather.write_feather(df_partition, os.path.join(backup_snapshot_dir, partition_file), compression='uncompressed')
+        keys_file, rows_file = write_partition_index(df_partition, partition_file)
+        snapshot_manifest['partitions'][partition] = {'file':partition_file, 'keys_file':keys_file, 'rows_file':rows_file,
+                                                      'rows':len(df_partition.index), 'digest':digest}
+        snapshot_changes['partitions_written'] += 1
+
+    # Partitions that no longer have any rows in the export
+    for partition in previous_partitions:
+        if not partition in snapshot_manifest['partitions']:
+            snapshot_changes['removed'] += previous_partitions[partition]['rows']
+
+    snapshot_manifest['changes'] = snapshot_changes
+
+    write_snapshot_manifest(snapshot_manifest)
+    remove_old_generations(snapshot_manifest, replaced_manifest)
+
+    logging.info('Backup snapshot ' + generation + ' created with ' + str(len(finstmt_backup.index)) + ' rows in ' + str(len(snapshot_manifest['partitions'])) + ' partitions ' + str(snapshot_changes))
+    print('Backup snapshot created: ' + str(snapshot_changes))
+
+    return snapshot_manifest
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Convert the FIN_STMT backup export into the memory-mapped backup snapshot')
+    parser.add_argument('--full', action='store_true', help='Rewrite every partition, even the ones that haven\'t changed')
+    args = parser.parse_args()
+
+    try:
+        os.makedirs(backup_snapshot_dir, exist_ok=True)
+        create_backup_snapshot(args.full)
+        return True
+
+    except Exception as e:
+        log = logging.getLogger("fpa_log")
+        log.exception(e)
+        return False
+
+
+
+if __name__ == '__main__':
+
+    if main() == True:
+        print('Backup snapshot was created successfully')
+    else:
+        print('Backup snapshot was NOT created successfully')
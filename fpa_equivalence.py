@@ -0,0 +1,359 @@
+
+import pandas as pd
+import numpy as np
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import logging
+
+import fpa_load_file_creator as loader
+from fpa_replay import read_recording, compare_outputs
+
+
+##########################################################################################
+# NOTE: Equivalence gate for the loader's execution modes; run it on a workstation or test
+# server before a new mode (or a change to one) is turned on in the Alteryx workflow
+#
+# Every input is run through the legacy mode and through each alternate mode, and the load,
+# capacity flag, error, rollup impact and anomaly report outputs are compared row-for-row after
+# canonical ordering (see fpa_replay.compare_outputs). Each mode gets a verdict: identical or not, and
+# its speedup over the legacy mode (median of the repeated runs)
+#
+# The inputs are synthetic load sheets built from the Outline Extractor doc files on the share
+# (valid member names, aliases, a capacity load, duplicate rows, an invalid member and an ExTO export), plus
+# any submissions recorded with --record (see fpa_replay.py)
+# Nothing is written to the Output or Validation_Errors folders
+#
+#   python fpa_equivalence.py [--rows 500] [--repeat 3] [--modes stream_reader ...] [<recording.zip> ...]
+##########################################################################################
+
+
+# Execution modes, as overrides of the default run options (see default_run_options)
+# The legacy mode is the reference; a mode only ships when its outputs are identical to the legacy mode's
+#   reader:   How the load sheet is read (synthetic inputs only; a recording already contains the sheet)
+#   backup:   Where the backup values come from; snapshot modes are skipped when there's no current snapshot
+#   backend:  What runs the backup join and the member checks; arrow modes are skipped when pyarrow.acero is missing
+#   block_rows: Sheet rows per block of a streamed ExTO sheet (0 builds the load file whole); only ExTO sheets are streamed, so only the ExTO case
+#               and ExTO recordings exercise it. exto_blocks uses small blocks so the synthetic ExTO sheet is streamed in several
+legacy_mode = 'legacy'
+execution_modes = {
+    'legacy':          {'reader':'pandas', 'backup':'export', 'backend':'pandas', 'block_rows':0},
+    'stream_reader':   {'reader':'stream', 'backup':'export', 'backend':'pandas', 'block_rows':0},
+    'backup_snapshot': {'reader':'pandas', 'backup':'snapshot', 'backend':'pandas', 'block_rows':0},
+    'arrow_backend':   {'reader':'pandas', 'backup':'export', 'backend':'arrow', 'block_rows':0},
+    'exto_blocks':     {'reader':'pandas', 'backup':'export', 'backend':'pandas', 'block_rows':100},
+    'optimized':       {'reader':'stream', 'backup':'snapshot', 'backend':'arrow'}
+}
+
+synthetic_user_email = 'e00000@wnco.com'
+
+
+def read_synthetic_inputs():
+
+    print('Running read_synthetic_inputs...')
+
+    # The doc files and backup export on the share; each run gets its own copy (see copy_input_files)
+    input_files = {}
+    for dimension in loader.outline_extract_files:
+        input_files[dimension] = loader.read_outline_extract(dimension)
+
+    input_files['BACKUP'] = None
+    if os.path.exists(loader.backup_file):
+        input_files['BACKUP'] = loader.read_backup_file()
+        input_files['BACKUP']['FileName'] = 'CORPPLN_Forecast_CY'
+
+    return input_files
+
+
+
+def synthetic_members(input_files):
+
+    # The members a synthetic sheet may use in each dimension, after the dimension's restrictions (see dimension_specs)
+    summary_info = {'user_id':'e00000', 'user_email':synthetic_user_email, 'workbook_name':'Synthetic', 'load_sheet_name':'Synthetic'}
+    dimension_loader = loader.DataLoader(dict(input_files, LOADSHEET=None), summary_info)
+
+    members = {}
+    for dimension, spec in loader.dimension_specs.items():
+        members[spec['header']] = dimension_loader.get_dimension_members(dimension)[['Member Name','Alias: Default']].reset_index(drop=True)
+
+    return members
+
+
+
+def synthetic_sheet(members, rows, rng, version='Working', aliases=False, duplicate=False, invalid=False):
+
+    # A load sheet laid out the way analysts build them: F1 - F9 member columns, the year in the headers and the months on Row 0
+    # The year is the current year when it's open (it has the most backup data), otherwise the first open year
+    year = 'FY' + str(loader.now.year)[2:]
+    if not year in members['YEAR']['Member Name'].tolist():
+        year = sorted(members['YEAR']['Member Name'])[0]
+    months = members['PERIOD']['Member Name'].tolist()
+
+    accounts = members['ACCT']
+    cost_centers = members['CC']
+
+    # ACCT and CC pairs are drawn without replacement, so the sheet has no duplicate intersections unless asked for
+    rows = min(rows, len(accounts.index) * len(cost_centers.index))
+    pairs = rng.choice(len(accounts.index) * len(cost_centers.index), size=rows, replace=False)
+
+    member_columns = {}
+    for header, positions in [('ACCT', pairs // len(cost_centers.index)), ('CC', pairs % len(cost_centers.index))]:
+        dim_members = accounts if header == 'ACCT' else cost_centers
+        member_columns[header] = dim_members['Member Name'].to_numpy()[positions]
+        if aliases:
+            # Members without an alias keep their member name
+            member_columns[header] = dim_members['Alias: Default'].fillna(dim_members['Member Name']).to_numpy()[positions]
+    for header in ['IO','CO','PC','ET']:
+        member_columns[header] = rng.choice(members[header]['Member Name'].to_numpy(), size=rows)
+    member_columns['SCEN'] = ['Forecast'] * rows
+    member_columns['VER'] = [version] * rows
+    member_columns['TYPE'] = ['Amount'] * rows
+
+    df = pd.DataFrame(member_columns)[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE']]
+    values = pd.DataFrame(np.round(rng.uniform(-5000, 5000, size=(rows, len(months))), 2), columns=months)
+    df = pd.concat([df, values], axis=1)
+
+    if duplicate:
+        df = pd.concat([df, df.iloc[[0]]], ignore_index=True)
+    if invalid:
+        df.loc[len(df.index) // 2, 'ACCT'] = str(df.loc[len(df.index) // 2, 'ACCT']).lower() + ' x'
+
+    header_rows = pd.DataFrame([[None] * 9 + [year] * len(months), [None] * 9 + months])
+    df.columns = range(len(df.columns))
+    return pd.concat([header_rows, df], ignore_index=True)
+
+
+
+def synthetic_exto_sheet(members, rows, rng):
+
+    # The ExTO adjustments data laid out the way it's exported from FIN_STMT (see exto_validation_rules): ten unlabeled member columns,
+    # Equipment Type first and Year in the rows, and the months in the headers; some months are left empty, as in the export
+    years = sorted(members['YEAR']['Member Name'])[:2]
+    months = members['PERIOD']['Member Name'].tolist()
+
+    accounts = members['ACCT']
+    cost_centers = members['CC']
+
+    # ACCT, CC and YEAR combinations are drawn without replacement, so the sheet has no duplicate intersections
+    rows = min(rows, len(accounts.index) * len(cost_centers.index) * len(years))
+    combinations = rng.choice(len(accounts.index) * len(cost_centers.index) * len(years), size=rows, replace=False)
+    pairs = combinations // len(years)
+
+    member_columns = {}
+    member_columns['ET'] = rng.choice(members['ET']['Member Name'].to_numpy(), size=rows)
+    for header in ['PC','CO']:
+        member_columns[header] = rng.choice(members[header]['Member Name'].to_numpy(), size=rows)
+    member_columns['TYPE'] = ['Amount'] * rows
+    member_columns['IO'] = rng.choice(members['IO']['Member Name'].to_numpy(), size=rows)
+    member_columns['CC'] = cost_centers['Member Name'].to_numpy()[pairs % len(cost_centers.index)]
+    member_columns['YEAR'] = np.array(years, dtype=object)[combinations % len(years)]
+    member_columns['VER'] = ['Working'] * rows
+    member_columns['SCEN'] = ['Forecast'] * rows
+    member_columns['ACCT'] = accounts['Member Name'].to_numpy()[pairs // len(cost_centers.index)]
+
+    df = pd.DataFrame(member_columns)
+    values = np.round(rng.uniform(-5000, 5000, size=(rows, len(months))), 2)
+    values[rng.uniform(size=values.shape) < 0.3] = np.nan
+    df = pd.concat([df, pd.DataFrame(values, columns=months)], axis=1)
+
+    header_row = pd.DataFrame([[None] * 10 + months])
+    df.columns = range(len(df.columns))
+    return pd.concat([header_row, df], ignore_index=True)
+
+
+
+def write_synthetic_workbook(workbook_path, members, rows, seed):
+
+    print('Running write_synthetic_workbook...')
+
+    # One sheet per case; each case exercises a different output of the loader
+    rng = np.random.default_rng(seed)
+    synthetic_cases = {
+        'Names':      synthetic_sheet(members, rows, rng),
+        'Aliases':    synthetic_sheet(members, rows, rng, aliases=True),
+        'Capacity':   synthetic_sheet(members, max(rows // 10, 1), rng, version='Current Capacity'),
+        'Duplicates': synthetic_sheet(members, rows, rng, duplicate=True),
+        'Invalid':    synthetic_sheet(members, rows, rng, invalid=True),
+        'ExTO':       synthetic_exto_sheet(members, rows, rng)
+    }
+    with pd.ExcelWriter(workbook_path) as writer:
+        for load_sheet_name, df in synthetic_cases.items():
+            df.to_excel(writer, sheet_name=load_sheet_name, header=False, index=False)
+
+    return list(synthetic_cases)
+
+
+
+def copy_input_files(input_files):
+
+    # The DataLoader renames and filters its inputs in place (the load sheet's blocks too), so every run starts from its own copy
+    return {input_name: (df.copy() if isinstance(df, (pd.DataFrame, loader.LoadSheet)) else df) for input_name, df in input_files.items()}
+
+
+
+def mode_available(mode_options):
+
+    # A mode that reads the backup snapshot can only run where there's a current one, and the arrow backend needs pyarrow.acero
+    if mode_options.get('backup') == 'snapshot' and loader.get_backup_snapshot(loader.backup_file) is None:
+        return False
+    if mode_options.get('backend') == 'arrow' and loader.pa_acero is None:
+        return False
+    return True
+
+
+
+def run_mode(mode_options, input_files, summary_info=None, workbook_path=None, load_sheet_name=None):
+
+    # Runs one input through the loader in one execution mode; returns the result, the captured outputs and the run time
+    # For a synthetic case the load sheet is read with the mode's reader, and the read is part of the run time
+    run_options = dict(loader.default_run_options)
+    run_options.update(mode_options)
+    run_options['record'] = False
+
+    input_files = copy_input_files(input_files)
+    loader.captured_outputs.clear()
+
+    start_time = time.perf_counter()
+    if not workbook_path is None:
+        if run_options['reader'] == 'stream':
+            input_files['LOADSHEET'] = loader.read_load_sheet_streaming(workbook_path, load_sheet_name, synthetic_user_email)
+        else:
+            input_files['LOADSHEET'] = loader.read_load_sheet(workbook_path, load_sheet_name, synthetic_user_email)
+        summary_info = loader.summary_information(input_files['LOADSHEET'])
+        summary_info['enhanced_file_name'] = summary_info['user_id'] + '_' + summary_info['workbook_name'] + '_' + summary_info['load_sheet_name'] + '.txt'
+    input_files['BACKUP_SOURCE'] = loader.get_backup_source(run_options['backup'], loader.backup_file)
+    if input_files['BACKUP_SOURCE']['source'] == 'snapshot':
+        input_files['BACKUP'] = None
+
+    result = loader.run_data_loader(input_files, summary_info, run_options)
+    run_seconds = time.perf_counter() - start_time
+
+    return result, list(loader.captured_outputs), run_seconds
+
+
+
+def check_case(case_name, modes, repeat, input_files, summary_info=None, workbook_path=None, load_sheet_name=None):
+
+    print('Running check_case for ' + case_name + '...')
+
+    # Every mode runs the case repeat times; the first run's outputs are compared and the median run time is kept
+    mode_runs = {}
+    for mode in [legacy_mode] + modes:
+        runs = [run_mode(execution_modes[mode], input_files, summary_info, workbook_path, load_sheet_name) for n in range(repeat)]
+        mode_runs[mode] = (runs[0][0], runs[0][1], float(np.median([run_seconds for result, outputs, run_seconds in runs])))
+
+    legacy_result, legacy_outputs, legacy_seconds = mode_runs[legacy_mode]
+
+    verdicts = []
+    for mode in modes:
+        result, outputs, run_seconds = mode_runs[mode]
+        comparisons = compare_outputs(legacy_outputs, outputs, loader.current_datetime, loader.current_datetime)
+
+        verdict = {'case':case_name, 'mode':mode, 'result':result}
+        verdict['anchors'] = ','.join(str(comparison['anchor']) for comparison in comparisons)
+        verdict['differences'] = sum(comparison['only_recorded'] + comparison['only_replayed'] for comparison in comparisons)
+        verdict['identical'] = result == legacy_result and all(comparison['identical'] for comparison in comparisons)
+        verdict['legacy_seconds'] = round(legacy_seconds, 3)
+        verdict['mode_seconds'] = round(run_seconds, 3)
+        verdict['speedup'] = round(legacy_seconds / run_seconds, 2) if run_seconds > 0 else None
+        verdicts.append(verdict)
+
+        if not verdict['identical']:
+            print('Outputs of ' + mode + ' DIFFER from the legacy mode for ' + case_name + ':')
+            print(pd.DataFrame(comparisons).to_string(index=False))
+
+    return verdicts
+
+
+
+def check_equivalence(modes, rows, repeat, seed, recordings):
+
+    print('Running check_equivalence...')
+
+    # Outputs are captured instead of written to the shared drive
+    loader.publish_outputs = False
+
+    verdicts = []
+    input_files = read_synthetic_inputs()
+    workbook_dir = tempfile.mkdtemp(prefix='fpa_equivalence_')
+    try:
+        workbook_path = os.path.join(workbook_dir, 'Synthetic.xlsx')
+        load_sheet_names = write_synthetic_workbook(workbook_path, synthetic_members(input_files), rows, seed)
+        for load_sheet_name in load_sheet_names:
+            verdicts += check_case('synthetic:' + load_sheet_name, modes, repeat, input_files, workbook_path=workbook_path, load_sheet_name=load_sheet_name)
+    finally:
+        shutil.rmtree(workbook_dir, ignore_errors=True)
+
+    # A recording contains its own load sheet and doc files; the backup is the current one
+    for archive_file in recordings:
+        submission, recorded_input_files, recorded_outputs = read_recording(archive_file)
+        recorded_input_files['BACKUP'] = input_files['BACKUP']
+        verdicts += check_case('recorded:' + os.path.basename(archive_file), modes, repeat, recorded_input_files, submission['summary_info'])
+
+    return pd.DataFrame(verdicts)
+
+
+
+def print_verdicts(df_verdicts):
+
+    print('')
+    print('Equivalence with the legacy mode:')
+    print(df_verdicts.to_string(index=False))
+
+    # One verdict per mode: identical on every case, and its overall speedup (total legacy time over total mode time)
+    df_modes = df_verdicts.groupby('mode', sort=False).agg(cases=('case','count'), identical=('identical','all'),
+                                                           legacy_seconds=('legacy_seconds','sum'), mode_seconds=('mode_seconds','sum'))
+    df_modes['speedup'] = (df_modes['legacy_seconds'] / df_modes['mode_seconds']).round(2)
+    df_modes['verdict'] = np.where(df_modes['identical'], 'PASS', 'FAIL')
+
+    print('')
+    print('Verdict by mode:')
+    print(df_modes.to_string())
+
+    return df_modes
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Check that the FP&A loader\'s execution modes produce the same outputs as the legacy mode, and how much faster they are')
+    parser.add_argument('recordings', nargs='*', help='Recording archives written by fpa_load_file_creator.py (see fpa_replay.py)')
+    parser.add_argument('--modes', nargs='+', choices=[mode for mode in execution_modes if mode != legacy_mode], help='Modes to check (default: every mode)')
+    parser.add_argument('--rows', type=int, default=500, help='Rows on each synthetic load sheet (default: 500)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each mode per case; the median run time is reported (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic load sheets (default: 0)')
+    args = parser.parse_args()
+
+    modes = args.modes if args.modes else [mode for mode in execution_modes if mode != legacy_mode]
+    skipped_modes = [mode for mode in modes if not mode_available(execution_modes[mode])]
+    for mode in skipped_modes:
+        print('Mode ' + mode + ' is not available here and will be skipped')
+    modes = [mode for mode in modes if not mode in skipped_modes]
+
+    if loader.get_backup_snapshot(loader.backup_file) is None and not os.path.exists(loader.backup_file):
+        print('There is no backup export at ' + loader.backup_file)
+        return False
+
+    try:
+        df_verdicts = check_equivalence(modes, args.rows, args.repeat, args.seed, args.recordings)
+        df_modes = print_verdicts(df_verdicts)
+        logging.info('Equivalence gate: ' + ', '.join(mode + ' ' + verdict + ' (' + str(speedup) + 'x)' for mode, verdict, speedup in zip(df_modes.index, df_modes['verdict'], df_modes['speedup'])))
+        return bool(df_modes['identical'].all())
+
+    except Exception as e:
+        log = logging.getLogger("fpa_log")
+        log.exception(e)
+        return False
+
+
+
+if __name__ == '__main__':
+
+    if main() == True:
+        print('Every mode produced the same outputs as the legacy mode')
+    else:
+        print('At least one mode did NOT produce the same outputs as the legacy mode')
+        sys.exit(1)
@@ -0,0 +1,262 @@
+
+import pandas as pd
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import logging
+
+from fpa_load_file_creator import load_files_output_dir, serialize_output, claim_output_name
+
+
+##########################################################################################
+# NOTE: Runs on the Alteryx server on a schedule (e.g., every 15 minutes at close), before the
+# Essbase batch picks up the load files in the Output folder
+#
+# Every successful submission writes its own load file, so at close the batch runs the load rule
+# hundreds of times for a few rows each. This job merges the pending load files of each type
+# (Working, CurrentCapacity, Actual) into one combined file per type
+#
+# When more than one submission loads the same intersection, the latest submission wins
+# Each combined file gets a lineage report (every source file, and how many of its rows were kept)
+# and a conflict report (every superseded row, and the row that replaced it)
+# The source files and both reports are moved to Output/Coalesced/<combined file name>
+#
+# Sharded load files (see shard_load_file) are left alone; they're already split for parallel loading
+#
+#   python fpa_load_coalescer.py [--min-age 120] [--dry-run]
+##########################################################################################
+
+
+coalesced_dir = os.path.join(load_files_output_dir, 'Coalesced')
+
+# Load file types that can be combined, and the pattern of their file names (the timestamp is the submission time)
+# FleetOnly capacity loads are combined with the other capacity loads; see coalesce_capacity_flags for their flag values
+# A name that another run had already claimed in the same minute has a claim number before the timestamp (see claim_output_name)
+load_file_pattern = r'^(Working|CurrentCapacity|Actual)_Load_(.+)_(\d{4}-\d{2}-\d{2}-\d{4})\.txt$'
+capacity_flags_pattern = r'^CapacityFlags_(?:R\d+_)?(\d{4}-\d{2}-\d{2}-\d{4})\.txt$'
+shard_file_pattern = r'_Part\d{2}of\d{2}\.txt$'
+
+# Columns that identify an intersection in a load file
+intersection_columns = ['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD']
+
+
+def find_pending_files(min_age_seconds):
+
+    print('Running find_pending_files...')
+
+    # Returns the pending load files of each type, and the pending capacity flag files, oldest submission first
+    # Files modified in the last min_age_seconds are skipped; they may still be being written
+    pending_files = {'Working':[], 'CurrentCapacity':[], 'Actual':[]}
+    pending_flag_files = []
+    settled_time = time.time() - min_age_seconds
+
+    for file_name in os.listdir(load_files_output_dir):
+        file_path = os.path.join(load_files_output_dir, file_name)
+        if not os.path.isfile(file_path) or re.search(shard_file_pattern, file_name) or '_Combined_' in file_name:
+            continue
+        if os.path.getmtime(file_path) > settled_time:
+            continue
+
+        load_file_match = re.match(load_file_pattern, file_name)
+        capacity_flags_match = re.match(capacity_flags_pattern, file_name)
+        if load_file_match:
+            pending_files[load_file_match.group(1)].append(pending_file(file_path, load_file_match.group(3)))
+        elif capacity_flags_match:
+            pending_flag_files.append(pending_file(file_path, capacity_flags_match.group(1)))
+
+    for load_type in pending_files:
+        pending_files[load_type].sort(key=lambda source: (source['submitted'], source['mtime']))
+    pending_flag_files.sort(key=lambda source: (source['submitted'], source['mtime']))
+
+    return pending_files, pending_flag_files
+
+
+
+def pending_file(file_path, timestamp):
+
+    # The timestamp in the file name only has minute resolution; the file's modification time breaks ties
+    return {'file':os.path.basename(file_path), 'path':file_path, 'submitted':timestamp, 'mtime':os.path.getmtime(file_path)}
+
+
+
+def read_pending_files(sources):
+
+    # Every value is read as text, so the combined file has exactly the same values as the source files
+    df_sources = []
+    for submission_order, source in enumerate(sources):
+        df_source = pd.read_csv(source['path'], dtype=str, keep_default_na=False)
+        df_source['Source'] = source['file']
+        df_source['SubmissionOrder'] = submission_order
+        df_sources.append(df_source)
+
+    return pd.concat(df_sources, ignore_index=True).fillna('')
+
+
+
+def resolve_intersections(df_pending, key_columns):
+
+    # Keeps the latest submission's row for every intersection; returns the kept rows and the superseded rows
+    # Each superseded row is listed with the source and value of the row that replaced it
+    df_pending = df_pending.sort_values('SubmissionOrder', kind='stable')
+    superseded = df_pending.duplicated(subset=key_columns, keep='last')
+    df_kept = df_pending[~superseded]
+
+    df_superseded = df_pending[superseded].merge(df_kept[key_columns + ['Source','DATA']].rename(columns={'Source':'WinningSource','DATA':'WinningDATA'}),
+                                                 on=key_columns, how='left')
+    df_superseded['SameValue'] = pd.to_numeric(df_superseded['DATA'], errors='coerce') == pd.to_numeric(df_superseded['WinningDATA'], errors='coerce')
+    df_conflicts = df_superseded[key_columns + ['Source','DATA','WinningSource','WinningDATA','SameValue']]
+
+    return df_kept.sort_index(), df_conflicts
+
+
+
+def build_lineage(sources, df_pending, df_kept):
+
+    # One row per source file: when it was submitted, who submitted it, and how many of its rows made it into the combined file
+    df_lineage = pd.DataFrame(sources)[['file','submitted']].rename(columns={'file':'Source','submitted':'Submitted'})
+    df_lineage['Rows'] = df_lineage['Source'].map(df_pending['Source'].value_counts()).fillna(0).astype(int)
+    df_lineage['RowsKept'] = df_lineage['Source'].map(df_kept['Source'].value_counts()).fillna(0).astype(int)
+    df_lineage['RowsSuperseded'] = df_lineage['Rows'] - df_lineage['RowsKept']
+    if 'UserEmail' in df_pending.columns:
+        df_lineage['UserEmail'] = df_lineage['Source'].map(df_pending.groupby('Source')['UserEmail'].first())
+    return df_lineage
+
+
+
+def coalesce_capacity_flags(flag_sources, combined_flags_name):
+
+    # The flag file tells the capacity calc scripts which months were loaded: 1 runs the full calc, 2 only the fleet calc (FleetOnly loads)
+    # A combined capacity file can hold both kinds of load, so a month is flagged 1 if any of the submissions flagged it 1
+    # The months stay in the order they were first flagged
+    df_flags = read_pending_files(flag_sources)
+    df_flags['FlagValue'] = pd.to_numeric(df_flags['DATA'], errors='coerce')
+    df_flags['FirstFlagged'] = df_flags.groupby(intersection_columns, sort=False).ngroup()
+    df_flags = df_flags.sort_values(['FlagValue','SubmissionOrder'], ascending=[True, False], kind='stable')
+    df_flags = df_flags.drop_duplicates(subset=intersection_columns, keep='first').sort_values('FirstFlagged')
+
+    df_flags['FileName'] = combined_flags_name
+    return df_flags.drop(columns=['Source','SubmissionOrder','FlagValue','FirstFlagged'])
+
+
+
+def archive_sources(sources, archive_dir, dry_run):
+
+    # Move the combined source files out of the Output folder so the batch doesn't load them again
+    for source in sources:
+        if dry_run:
+            print('Would move ' + source['file'] + ' to ' + archive_dir)
+        else:
+            shutil.move(source['path'], os.path.join(archive_dir, source['file']))
+
+
+
+def publish_combined_file(df_combined, combined_name, dry_run):
+
+    # Write to a temporary file and rename it, so the batch never picks up a partial file
+    combined_file = os.path.join(load_files_output_dir, combined_name + '.txt')
+    if dry_run:
+        print('Would write ' + combined_file + ' with ' + str(len(df_combined.index)) + ' rows')
+        return
+    with open(combined_file + '.tmp', 'wb') as f:
+        f.write(serialize_output(df_combined))
+    os.replace(combined_file + '.tmp', combined_file)
+    print('Combined file written to ' + combined_file)
+
+
+
+def coalesce_load_type(load_type, sources, flag_sources, dry_run):
+
+    print('Running coalesce_load_type for ' + load_type + '...')
+
+    df_pending = read_pending_files(sources)
+    df_kept, df_conflicts = resolve_intersections(df_pending, intersection_columns)
+    df_lineage = build_lineage(sources, df_pending, df_kept)
+
+    # Name the combined file like a single submission of the same type, so the batch's file masks still match
+    # It's stamped with the newest source's submission time, not this job's, since that's the latest data it holds
+    # Another run of this job can stamp a file with the same minute, so the name is claimed like a submission's (see claim_output_name)
+    submitted = sources[-1]['submitted']
+    if load_type == 'CurrentCapacity' and all('_FleetOnly_' in source['file'] for source in sources):
+        combined_name = 'CurrentCapacity_Load_FleetOnly_Combined_' + submitted
+    else:
+        combined_name = load_type + '_Load_Combined_' + submitted
+    if not dry_run:
+        combined_name = claim_output_name(combined_name)
+    df_combined = df_kept.drop(columns=['Source','SubmissionOrder'])
+    df_combined['FileName'] = combined_name
+
+    archive_dir = os.path.join(coalesced_dir, combined_name)
+    if not dry_run:
+        os.makedirs(archive_dir, exist_ok=True)
+        df_lineage.to_csv(os.path.join(archive_dir, combined_name + '_lineage.csv'), index=False)
+        df_conflicts.to_csv(os.path.join(archive_dir, combined_name + '_conflicts.csv'), index=False)
+
+    print('Lineage:')
+    print(df_lineage.to_string(index=False))
+    print(str(len(df_conflicts.index)) + ' superseded rows, ' + str(int((~df_conflicts['SameValue']).sum())) + ' with a different value')
+
+    # The combined files are published before their sources are moved out of the Output folder
+    # If the job stops in between, the batch loads the sources again next to the combined file, which loads the same values; no rows are lost
+    publish_combined_file(df_combined, combined_name, dry_run)
+
+    # The capacity calc scripts need one flag file that matches the combined capacity file (the same claim number and timestamp)
+    if load_type == 'CurrentCapacity' and flag_sources:
+        combined_suffix = combined_name.split('_Combined', 1)[1]
+        df_flags = coalesce_capacity_flags(flag_sources, '_Combined' + combined_suffix)
+        publish_combined_file(df_flags, 'CapacityFlags' + '_Combined' + combined_suffix, dry_run)
+        archive_sources(flag_sources, archive_dir, dry_run)
+
+    archive_sources(sources, archive_dir, dry_run)
+
+    logging.info('Coalesced ' + str(len(sources)) + ' ' + load_type + ' load files (' + str(len(df_pending.index)) + ' rows) into ' + combined_name + ' (' + str(len(df_combined.index)) + ' rows, ' + str(len(df_conflicts.index)) + ' superseded)')
+
+    return combined_name
+
+
+
+def coalesce_pending_files(min_age_seconds, dry_run=False):
+
+    print('Running coalesce_pending_files...')
+
+    pending_files, pending_flag_files = find_pending_files(min_age_seconds)
+
+    combined_files = []
+    for load_type, sources in pending_files.items():
+        # A single pending file is already one load job
+        if len(sources) < 2:
+            continue
+        combined_files.append(coalesce_load_type(load_type, sources, pending_flag_files, dry_run))
+
+    return combined_files
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Merge the pending FP&A load files of each type into one combined load file')
+    parser.add_argument('--min-age', type=int, default=120, help='Skip files modified in the last MIN_AGE seconds (default: 120)')
+    parser.add_argument('--dry-run', action='store_true', help='Show what would be combined without writing or moving any files')
+    args = parser.parse_args()
+
+    try:
+        combined_files = coalesce_pending_files(args.min_age, args.dry_run)
+        print(str(len(combined_files)) + ' combined load files')
+        return True
+
+    except Exception as e:
+        log = logging.getLogger("fpa_log")
+        log.exception(e)
+        return False
+
+
+
+if __name__ == '__main__':
+
+    if main() == True:
+        print('Pending load files were coalesced successfully')
+    else:
+        print('Pending load files were NOT coalesced successfully')
+        sys.exit(1)
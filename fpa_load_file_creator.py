@@ -1,1321 +1,3477 @@
-
-from ayx import Alteryx
-import pandas as pd
-import numpy as np
-import os
-import datetime
-import glob
-import re
-import sys
-import json
-import logging
-from IPython.display import display
-from pandas.api.types import CategoricalDtype
-from IPython.core.interactiveshell import InteractiveShell
-
-
-##########################################################################################
-# NOTE: This code runs in a single Python tool within an Alteryx workflow                    
-# It can optionally be split into multiple cells in the tool's Jupyter notebook
-# However, the entire DataLoader class should be confined to a single cell
-##########################################################################################
-
-# Enable logging
-log_file = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Logs\fpa_load_files.log'
-
-logging.basicConfig(
-    filename=log_file,
-    format='%(asctime)s %(levelname)-8s %(message)s',
-    level=logging.INFO,
-    datefmt='%Y-%m-%d %H:%M:%S')
-
-
-print('Python version running on the Alteryx server:')
-print(sys.version_info)
-
-print('Pandas version running on the Alteryx server:')
-print(pd.__version__)
-
-
-# Get the current date and time to append to the output file names
-now = datetime.datetime.now()
-current_datetime = str(now.year) + '-' + str(now.month).zfill(2) + '-' + str(now.day).zfill(2) + '-' + str(now.hour).zfill(2) + str(now.minute).zfill(2)
-
-
-class DataLoader:
-
-    print('Creating the DataLoader object...')
-    
-    def __init__(self, input_files, summary_info):
-        
-        self.user_id = summary_info['user_id']
-        self.user_email = summary_info['user_email']
-        self.workbook_name = summary_info['workbook_name']
-        self.load_sheet_name = summary_info['load_sheet_name']
-        self.enhanced_file_name = self.user_id + '_' + self.workbook_name + '_' + self.load_sheet_name + '.txt'
-        
-        self.summary_info = summary_info
-        self.input_files = input_files
-        
-        self.df = self.input_files['LOADSHEET']
-        self.finstmt_backup = self.input_files['BACKUP']
-        
-        print('DataLoader object created.')
-        
-        
-        
-    def validate_loadfile_name(self):
-    
-        print('Running validate_loadfile_name...')
-
-        print('Workbook name: ' + self.workbook_name)
-        print('Load Sheet name: ' + self.load_sheet_name)
-
-        # Ensure the combined workbook and load sheet names are not too long (more than 80 characters)
-        if len(self.workbook_name) + len(self.load_sheet_name) > 80:
-            
-            # Set error email info
-            error_email_info = {}
-            error_email_info['error_email_subject'] = 'WARNING: Load process failed - see attachment for details'
-            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
-            error_email_info['error_email_body'] = 'The load failed because the combined length of the workbook and load sheet names exceeds 80 characters. See the attachment for details. NOTE: No data on your sheet has been loaded.'
-            
-            error_log_entry = "Validation failed because the combined names of the workbook and load sheet exceed 80 characters. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
-            
-            print('Combined length of names = ' + str(len(self.workbook_name) + len(self.load_sheet_name)))
-            validation_errors = {}
-            validation_errors['workbook_name_error'] = 'The combined workbook and load sheet names exceed 80 characters'
-            validation_errors['workbook_name_length'] = 'Workbook name length: ' + str(len(self.workbook_name))
-            validation_errors['load_sheet_name_length'] = 'Load sheet name length: ' + str(len(self.load_sheet_name))
-            validation_errors_df = pd.DataFrame.from_dict(validation_errors, orient='index', columns=['Details'])
-            ret = self.create_error_file(validation_errors_df, error_email_info, error_log_entry)
-            print('The combined workbook and load sheet names exceed 80 characters')
-            return False
-        else:
-            print('The workbook and load sheet names are within their limits')
-            return True
-            
-            
-            
-    def validate_dimension_files(self):
-        
-        print("Running validate_dimension_files...")
-    
-        invalid_dim_files = {}
-
-        # Check the number of lines in each dataframe
-        # The files that populate the dataframes are from an external source and occassionally they are incomplete
-        # The numbers shown for each dimension reflect a fully complete file (in August 2022)
-        # If any of them are not complete, we can't use them to validate the members on the load sheet, and the load must be aborted
-        if len(self.input_files['ACCT'].index) < 2796:
-            invalid_dim_files['ACCT'] = 'The Account dimension file contains only ' + str(len(self.input_files['ACCT'].index)) + ' lines'
-
-        if len(self.input_files['CC'].index) < 1743:
-            invalid_dim_files['CC'] = 'The Cost Center dimension file contains only ' + str(len(self.input_files['CC'].index)) + ' lines'
-
-        if len(self.input_files['IO'].index) < 257:
-            invalid_dim_files['IO'] = 'The Internal Order dimension file contains only ' + str(len(self.input_files['IO'].index)) + ' lines'
-
-        if len(self.input_files['CO'].index) < 14:
-            invalid_dim_files['CO'] = 'The Company Code dimension file contains only ' + str(len(self.input_files['CO'].index)) + ' lines'
-
-        if len(self.input_files['PC'].index) < 535:
-            invalid_dim_files['PC'] = 'The Profit Center dimension file contains only ' + str(len(self.input_files['PC'].index)) + ' lines'
-
-        if len(self.input_files['ET'].index) < 11:
-            invalid_dim_files['ET'] = 'The Equipment Type dimension file contains only ' + str(len(self.input_files['ET'].index)) + ' lines'
-
-        if len(self.input_files['SCEN'].index) < 29:
-            invalid_dim_files['SCEN'] = 'The Scenario dimension file contains only ' + str(len(self.input_files['SCEN'].index)) + ' lines'
-
-        if len(self.input_files['VER'].index) < 26:
-            invalid_dim_files['VER'] = 'The Version dimension file contains only ' + str(len(self.input_files['VER'].index)) + ' lines'
-
-        if len(self.input_files['TYPE'].index) < 8:
-            invalid_dim_files['TYPE'] = 'The Type dimension file contains only ' + str(len(self.input_files['TYPE'].index)) + ' lines'
-
-        if len(self.input_files['YEAR'].index) < 29:
-            invalid_dim_files['YEAR'] = 'The Year dimension file contains only ' + str(len(self.input_files['YEAR'].index)) + ' lines'
-
-        if len(self.input_files['PERIOD'].index) < 112:
-            invalid_dim_files['PERIOD'] = 'The Period dimension file contains only ' + str(len(self.input_files['PERIOD'].index)) + ' lines'
-
-
-        # Create an error file if any dimension files are incomplete
-        if invalid_dim_files:
-
-            # Set error email info
-            error_email_info = {}
-            error_email_info['error_email_subject'] = 'WARNING: Load process failed - see attachment for details'
-            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
-            error_email_info['error_email_body'] = 'The load failed because at least one dimension validation file is missing or incomplete. See the attachment for details.  NOTE: No data on your sheet has been loaded.'
-
-            error_log_entry = "Validation failed because one or more dimension files are either missing or incomplete. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
-
-            invalid_dim_files_df = pd.DataFrame.from_dict(invalid_dim_files, orient='index', columns=['Details'])
-            ret = self.create_error_file(invalid_dim_files_df, error_email_info, error_log_entry)
-            print('At least one dimension file is incomplete')
-            return False
-        else:
-            logging.info("Dimension files validated.")
-            print("Dimension files validated.")
-            return True
-
-        
-    
-    def get_time_labels(self):
-        
-        print("Running get_time_labels...")
-    
-        if self.df.iloc[1,0].startswith('ET:'):
-            # Put the month headers into a new dataframe (exclude the FileName label at the end of the headers)
-            months_labels = self.df.columns[10:-1].to_frame().dropna().reset_index()
-            months_labels.rename(columns={months_labels.columns[1]:'PERIOD'}, inplace=True)
-
-            #return the new dataframe
-            return months_labels
-        else:
-            # Capture the first row of the dataframe (not the headers) and convert it into a new dataframe
-            # The year labels are the index
-            # Month labels are in the first column; add a new column for the year labels (use the index to populate it)
-            months_years_labels = self.df.iloc[0,:].to_frame().dropna().reset_index()
-            months_years_labels.rename(columns={months_years_labels.columns[1]:'PERIOD'}, inplace=True)
-            months_years_labels['YEAR'] = months_years_labels['index']
-            cond1 = months_years_labels['PERIOD'] != 0
-            cond2 = months_years_labels['PERIOD'] != ''
-            cond3 = months_years_labels['YEAR'].str.upper().isin(['FILENAME','USEREMAIL'])
-            months_years_labels = months_years_labels[cond1 & cond2 & ~ cond3]
-
-            # Drop the _## suffixes from the year labels
-            months_years_labels['YEAR'] = months_years_labels['YEAR'].str.replace(r'_.*','', regex=True)
-
-            #return the new dataframe
-            return months_years_labels
-
-    
-    
-    def create_capacity_flag_file(self, df, version, load_flag_value):
-        
-        print("Running create_capacity_flag_file...")
-    
-        df = df.join(pd.DataFrame(
-        {
-            'ACCT':'CL:09962',
-            'CC':'CC:None',
-            'IO':'IO:None',
-            'CO': 'CO:9001',
-            'PC':'PC:1000',
-            'ET':'ET:None',
-            'SCEN':'Forecast',
-            'VER':version,
-            'TYPE':'Amount',
-            'DATA':load_flag_value,
-            'FileName':'_' + str(current_datetime)
-        }, index = df.index
-        ))
-
-        # Reorder the columns to match the load rule
-        df = df[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName']]
-
-        return df
-
-
-    
-    def process_backup_file(self, load_sheet_members):
-    
-        print('Running process_backup_file...')
-
-        # Create the column headers
-        self.finstmt_backup.columns = ['ET','PC','CO','TYPE','IO','CC','YEAR','VER','SCEN','ACCT','Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec','FileName']
-
-        print('Backup file size before processing:')
-        print(self.finstmt_backup.shape)
-        print(self.finstmt_backup.info())
-
-        # Create a dataframe from the month headers
-        periods = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
-        df_period = pd.DataFrame (periods, columns = ['PERIOD'])
-
-        # Limit the data to the members on the load sheet
-        cond1 = self.finstmt_backup['ACCT'].isin(load_sheet_members['acct'].tolist())
-        cond2 = self.finstmt_backup['CC'].isin(load_sheet_members['cc'].tolist())
-        cond3 = self.finstmt_backup['IO'].isin(load_sheet_members['io'].tolist())
-        cond4 = self.finstmt_backup['CO'].isin(load_sheet_members['co'].tolist())
-        cond5 = self.finstmt_backup['PC'].isin(load_sheet_members['pc'].tolist())
-        cond6 = self.finstmt_backup['ET'].isin(load_sheet_members['et'].tolist())
-        cond7 = self.finstmt_backup['SCEN'].isin(load_sheet_members['scen'].tolist())
-        cond8 = self.finstmt_backup['VER'].isin(load_sheet_members['ver'].tolist())
-        cond9 = self.finstmt_backup['TYPE'].isin(load_sheet_members['type'].tolist())
-        cond10 = self.finstmt_backup['YEAR'].isin(load_sheet_members['year'].tolist())
-
-        self.finstmt_backup = self.finstmt_backup[cond1 & cond2 & cond3 & cond4 & cond5 & cond6 & cond7 & cond8 & cond9 & cond10]
-
-        print('Backup file size after filtering:')
-        print(self.finstmt_backup.shape)
-        print(self.finstmt_backup.info())
-
-        # Melt all of the year_month headers into a new column named Combo_Period
-        # Intentionally omit the "value_vars" parameter here, which causes all of the remaining columns to be namelessly melted
-        # This is perfect because you never know how many months columns there will be, or which year(s) are being loaded
-        self.finstmt_backup = pd.melt(self.finstmt_backup, id_vars=['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','FileName'], var_name='PERIOD',value_name='DATA')
-
-        # Reorder the columns
-        self.finstmt_backup = self.finstmt_backup[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName']]
-
-        print('Backup file size after melting:')
-        print(self.finstmt_backup.shape)
-        print(self.finstmt_backup.info())
-
-        return self.finstmt_backup
-
-    
-    
-    def process_date_month_labels(self, column_header):
-        
-        print('Running process_date_month_labels...')
-
-        print(type(column_header))
-        print('Incoming header column:')
-        print(column_header)
-
-        match_pattern = r'(FY)\s\d\d(\d\d_\w\w\w)'
-
-        z = re.match(match_pattern, column_header)
-        if not z == None:
-            print('group 0: ' + ''.join(z.groups(0)))
-            repl = ''.join(z.groups(0))  # Convert the tuple to a string
-            print('Replacement string: ' + repl)
-            column_header = re.sub(r'FY .*', repl, column_header)
-            return column_header
-        else:
-            return column_header
-    
-    
-
-    def add_email_columns(self, df, user_email):
-        
-        print('Running add_email_columns...')
-        
-        # Note: This function is called by the 'create_error_file' function only
-        # The email field in the dataframe for the load sheet was created by Alteryx when the sheet was imported
-    
-        # Create new columns in the dataframe for email addresses (one column for the primary recipient, and one for the cc:)
-        # If the user's eID was found in the name of the load file, add the user's email address as the primary recipient
-        # If the user's eID was not found, make me the primary recipient
-        # If the user is the primary recipient, put my address in the cc column; if I'm the primary, leave the cc: column empty
-
-        if not user_email is None:
-            if not 'UserEmail' in df.columns:
-                df['UserEmail'] = user_email
-            df['ccEmail'] = 'e79230@wnco.com'
-        else:
-            if not 'UserEmail' in df.columns:
-                df['UserEmail'] = 'e79230@wnco.com'
-            df['ccEmail'] = None
-
-        return df   
-    
-
-
-    def cleanup_load_sheet(self):
-    
-        print("Running cleanup_load_sheet...")
-
-        #user_id = self.user_id
-        #workbook_name = self.workbook_name
-        #load_sheet_name = self.load_sheet_name
-        
-        print("Before cleanup:")
-        print(self.df.head())
-
-        # Drop any empty rows and columns; this was retested on 4/26/22
-        # NOTE: The FileName and UserEmail columns will always be auto-populated by Alteryx when it creates the datafame
-        print('df shape before dropna rows and columns: ' + str(self.df.shape))
-        self.df = self.df.dropna(axis=0, thresh=3) # Drop all rows having fewer than 3 *non*-NA values (two being FileName and UserEmail)
-        self.df = self.df.dropna(axis=1, how='all') # Drop all columns that are entirely empty
-        print('df shape after dropna rows and columns: ' + str(self.df.shape))
-
-        ##################################################################################################################
-        # Fill all empty cells if AND ONLY IF the initial F1 - F9 and FY* column headers are correct
-        # If the headers are incorrect, leave the sheet alone and let it fail the validation process
-        #if list(pd.Series(df.columns))[8] == 'F9' and list(pd.Series(df.columns))[9] != 'F10':
-        print('Year column headers:')
-        print(list(pd.Series(self.df.columns)))
-        if list(pd.Series(self.df.columns))[0] == 'F1' and list(pd.Series(self.df.columns))[8] == 'F9' and list(pd.Series(self.df.columns))[9].startswith('FY'):
-            print('Writing empty strings in empty header cells...')
-            replacement_values = {'F1':'','F2':'','F3':'','F4':'','F5':'','F6':'','F7':'','F8':'','F9':''}
-            self.df = self.df.fillna(value=replacement_values)  # Fill the empty member cells (Columns 1 through 9) with empty strings
-            self.df = self.df.fillna(0) # Only numeric cells (Column 10 and beyond) will be empty at this point; fill them with zeroes
-            print('Dataframe after filling empty cells:')
-            print(self.df.head())
-            print('')
-        ##################################################################################################################
-
-        # Verify the user entered their eID; if not, use mine
-        print('Incoming user email: ' + self.df.loc[1,'UserEmail'])
-        if len(self.df.loc[1,'UserEmail']) == 9:
-            self.df['UserEmail'] = 'e79230@wnco.com'
-            logging.warning("UserEmail was FORCED to e79230@wnco.com")
-            print('WARNING: UserEmail was FORCED to e79230@wnco.com')
-        
-        # Convert the year and month headers to be member names, not aliases
-        # This is done to ensure proper index matching with the CORPPLN_Forecast_CY (FIN_STMT) backup file
-        x = range(len(self.df.columns))
-        for n in x:
-            year_label = re.search(r'\s{0,}FY\s{0,}((?:\d{4}|\d{2}))\s{0,}(_?\d{0,})$', self.df.columns[n])
-            if not year_label is None:
-                self.df.rename(columns={self.df.columns[n]:'FY' + str(year_label.group(1)[-2:])}, inplace=True)
-                # If the year label had a suffix, reappend it (because it makes the label unique in the index)
-                if not len(year_label.group(2)) == 0:
-                    self.df.rename(columns={self.df.columns[n]:self.df.columns[n] + str(year_label.group(2))}, inplace=True)
-                else:
-                    self.df.rename(columns={self.df.columns[n]:self.df.columns[n] + '_1'}, inplace=True)
-                
-                month_label = re.search(r'(?:^|(?<= ))(January|February|March|April|May|June|July|August|September|October|November|December|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)(?:(?= )|$)', self.df.iloc[0,n])
-                if not month_label is None:
-                    self.df.iloc[0,n] = month_label.group(1)[:3]
-                else:
-                    print('No month label match on ' + self.df.iloc[0,n])
-            else:
-                print('No year label match on ' + self.df.columns[n])
-
-        print("After cleanup:")
-        print(self.df.head())
-
-        return True
-
-    
-    
-    def validation_and_cleanup(self):
-        
-        print('Running validation_and_cleanup...')
-        
-        if self.validate_loadfile_name() == False:
-            return False
-
-        if self.validate_dimension_files() == False:
-            return False
-
-        if self.cleanup_load_sheet() == False:
-            return False
-
-        
-
-    def process_load_sheet(self):
-    
-        print('Running process_load_sheet...')
-
-        #this_function_name = sys._getframe(  ).f_code.co_name  <=== This works, but there's currently no need for it
-
-        print("Before processing:")
-        print(self.df.head())
-        
-
-        if self.preliminary_validation() == False:
-            return False
-
-        # Check the load sheet for duplicate rows
-        # Note: If duplicate rows are found, a partial load file will NOT be created
-        if self.duplicate_rows() == True:
-            return False
-
-        # Check the load sheet for invalid members
-        validation_result = self.validate_dimensions() # if validation_result is a df, the validation was successful
-        if isinstance(validation_result, pd.DataFrame):
-            self.df = validation_result
-        else:
-            return False
-
-        # Create the load file(s)
-        # Note: Loading Current Capacity creates a second text load file, which contains flag values 
-        if self.create_load_file() == True:
-            return True
-        else:
-            return False
-
-    
-    
-    def preliminary_validation(self):
-        
-        # This is a *high-level* eye test of whether the load sheet generally follows the layout/format requirements
-        # The purpose of this validation is to catch any obvious problems that need to be fixed by the sheet's creator
-        # Even if this validation is successful, additional validations that are more thorough will be done in subsequent steps
-
-        invalid_dims = {}
-
-        print('Running preliminary_validation...')
-        print('')
-        print('Preliminary dataframe:')
-        print(self.df.head())
-        
-        # The first nine cells on the month labels row should contain empty strings (written there after the df was created)
-        z = str(list(self.df.iloc[0,0:9]).count(''))
-        print(f'The number of empty strings before the first column header is {z}')
-
-        z = str(self.df.iloc[0,0:9].isna().sum())
-        print(f'The number of na cells before the first column header is {z}')
-        
-        # Get the count of columns containing forecast values
-        # Next, we'll make sure the number of year and month labels matches this count
-        # Note: The first 9 columns are the non-time-based dimensions; the last 2 are filename and user email
-        forecast_columns = self.df.shape[1] - 9 - 2  
-        
-        
-        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-        # WARNING: When evaluating the df values, empty cells and those containing zeroes will always be evaluated as TRUE
-        #          by Python's 'any' and 'all' functions.
-        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-
-        # Check whether any values in Column 1 resemble account members or aliases
-        if not any(self.df.iloc[:,0].str.contains(r'\D\D:\d{4,7}|.*\([HFS]?\d{4,7}\)$', regex=True)):
-            invalid_dims['Account'] = 'The Account dimension has at least one invalid and/or missing member in Column A'
-
-        # Check whether any values in Column 2 resemble cost center members or aliases
-        if not any(self.df.iloc[:,1].str.contains(r'CC:\d{5}|.*\(\d{5}\)$', regex=True)):
-            invalid_dims['Cost Center'] = 'The Cost Center dimension has at least one invalid and/or missing member in Column B'
-
-        # Check whether any values in Column 3 resemble internal order members or aliases
-        if not any(self.df.iloc[:,2].str.contains(r'IO:\d{6}|.*\(\d{6}\)$|IO:None', regex=True)):
-            invalid_dims['Internal Order'] = 'The Internal Order dimension has at least one invalid and/or missing member in Column C'
-
-        # Check whether any values in Column 4 resemble company code members or aliases
-        if not any(self.df.iloc[:,3].str.contains(r'CO:\d{4}|.*\(\d{4}\)$', regex=True)):
-            invalid_dims['Company Code'] = 'The Company Code dimension has at least one invalid and/or missing member in Column D'
-
-        # Check whether any values in Column 5 resemble profit center members or aliases
-        if not any(self.df.iloc[:,4].str.contains(r'PC:\d{4}|.*\(\d{4}\)$', regex=True)):
-            invalid_dims['Profit Center'] = 'The Profit Center dimension has at least one invalid and/or missing member in Column E'
-
-        # Check whether any values in Column 6 resemble equipment type members or aliases
-        if not any(self.df.iloc[:,5].str.contains(r'ET:\d{3}|.*\(\d{3}M?X?\)$|ET:None', regex=True)):
-            invalid_dims['Equipment Type'] = 'The Equipment Type dimension has at least one invalid and/or missing member in Column F'
-
-        # Check whether Column 7 contains either Forecast or Actual (Actual is for ExTO loads only)
-        if not any(self.df.iloc[:,6].isin(['Forecast','Actual'])):
-            invalid_dims['Scenario'] = 'The Scenario dimension has at least one invalid and/or missing member in Column G'
-
-        # Check whether Column 8 contains either Working or Locked
-        if not any(self.df.iloc[:,7].isin(['Working','Locked','Final','Current Capacity'])):
-            invalid_dims['Version'] = 'The Version dimension has at least one invalid and/or missing member in Column H'
-
-        # Check whether Column 9 contains either Amount or Adjustment
-        if not any(self.df.iloc[:,8].isin(['Amount','Adjustment'])):
-            invalid_dims['Type'] = 'The Type dimension has at least one invalid and/or missing member in Column I'
-        
-        # Check the critical cells on the year header row, and get the count of columns containing a year header (member name or alias)
-        # A column labeled as "Total" will cause a failure here
-        if list(pd.Series(self.df.columns))[0] != 'F1' or \
-        list(pd.Series(self.df.columns))[8] != 'F9' or \
-        not list(pd.Series(self.df.columns))[9].startswith('FY') or \
-        list(pd.Series(self.df.columns))[-1] != 'UserEmail' or \
-        list(pd.Series(self.df.columns))[-2] != 'FileName':
-            invalid_dims['Year'] = 'The Year dimension has at least one invalid and/or missing member in Row 1.'
-
-        # Check the month headers row; the first nine cells must contain an empty string
-        # Any header other than a month name will cause the validation to fail; a "Total" label will cause a failure
-        if list(self.df.iloc[0,0:9]).count('') != 9 or \
-        not self.df.iloc[0,9].startswith(('Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec')):
-            invalid_dims['Month'] = 'The Month dimension has at least one invalid and/or missing member in Row 2.'
-
-        
-        # Check whether any dimensions have been flagged as invalid
-        if not invalid_dims:
-            # All of the dimensions are in the correct position on the load sheet
-            # Now check for other issues...  
-            
-            # NOTE: In these validations, the Forecast columns are collectively treated as a "dimension"
-            
-            # 1. Check for missing column headers in the Forecast values region (which begins in Column 10 on a properly formatted sheet):
-            # We're looking for any Year column header that follows the pattern "F##" and/or a Month header of 0 (*not* an empty cell)
-            # Example: Year headers "F1" through "F9" are ok (at this point in the process); "F10", "F11", "F12" etc. are NOT ok
-            if any(pd.Series(self.df.columns).str.contains(r'F\d{2}', regex=True)) or any(pd.Series(self.df.iloc[0]) == 0):
-                invalid_dims['ForecastColumns'] = 'Forecast values were found in one or more columns that do not have column headers.'        
-            
-            # 2. Check for non-numeric characters in the Forecast values region:
-            #    Create a new dataframe for the load sheet and force all cells in the Forecast region to be numeric
-            #    Any cells containing non-numeric characters will be converted by pandas to the value 'NaN' ('Not a Number')
-            #    Count the resulting 'NaN' cells in the new dataframe; if greater than zero, we will notify the user
-            #    Note: After the number of 'NaN' cells is captured, this new 'df2' dataframe will not be used or referenced again
-            df2 = self.df.iloc[1:,9:self.df.shape[1]-2]  # Limit the new dataframe to the numeric region of the load sheet
-            df2 = df2.apply(lambda s: pd.to_numeric(s, errors='coerce'))
-            df2_nulls = df2.isnull().sum().sum()  # 'NaN' is considered a null value
-            if df2_nulls != 0:
-                invalid_dims['ForecastColumns'] = df2_nulls
-                if df2_nulls > 1:
-                    invalid_dims['ForecastColumns'] = 'A non-numeric character was found in ' + str(df2_nulls) + ' cells in the Forecast values region of the sheet'
-                else:
-                    invalid_dims['ForecastColumns'] = 'A non-numeric character was found in ' + str(df2_nulls) + ' cell in the Forecast values region of the sheet'
-              
-                
-        # Create an error file if any dimensions were flagged
-        if invalid_dims:
-            # Set error email info
-            error_email_info = {}
-            error_email_info['error_email_subject'] = 'WARNING: Load process failed - see attachment for details'
-            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
-            error_email_info['error_email_body'] = 'The load process failed. Please see the attachment for details. \n\n NOTE: No data on your sheet has been loaded.'
-
-            error_log_entry = "The preliminary validation failed. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
-
-            invalid_dims_df = pd.DataFrame.from_dict(invalid_dims, orient='index', columns=['Details'])
-            ret = self.create_error_file(invalid_dims_df, error_email_info, error_log_entry)
-            return False
-        else:
-            logging.info("Worksheet meets layout rules.")
-            print("Worksheet meets layout rules.")
-            return True      
-
-        
-        
-    def duplicate_rows(self):
-    
-        print('Running duplicate_rows...')
-        
-        # Determine if there are any duplicate rows (based on combining the values in the first 9 columns as a key)
-        cond1 = self.df.duplicated(subset=['F1','F2','F3','F4','F5','F6','F7','F8','F9'], keep=False)
-        duplicate_rows = self.df.copy()[cond1]  # Create a COPY of the df to prevent the SettingWithCopyWarning issue
-
-        # Add a column for row number and move it to the first position
-        duplicate_rows['RowNumber'] = duplicate_rows.index + 2
-        rn = duplicate_rows.pop('RowNumber') # remove column and store it
-        duplicate_rows.insert(0, 'RowNumber', rn)
-
-        # Sort
-        duplicate_rows = duplicate_rows.sort_values(by=['F1','F2','F3','F4','F5','F6','F7','F8','F9','RowNumber'])
-
-        print('Duplicate rows df:')
-        print(duplicate_rows.head())
-
-        # If any duplicates were found, create a file containing all of the duplicate rows for the user to fix
-        # Do NOT create a load file
-        if len(duplicate_rows.index) > 0:
-
-            # Set error email info
-            error_email_info = {}
-            error_email_info['error_email_subject'] = 'WARNING: Load process failed - duplicate rows found on the load sheet'
-            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
-            error_email_info['error_email_body'] = """Duplicate account/cost center/internal order combinations were found on the load sheet.  
-            The first column in the attachment shows the row numbers on the sheet where the duplicates were found.  
-            Please delete the appropriate rows from the sheet and repeat the load process.
-            NOTE: No data on your sheet has been loaded."""
-
-            error_log_entry = "Validation failed because of duplicate rows on the load sheet. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
-
-            ret = self.create_error_file(duplicate_rows, error_email_info, error_log_entry)
-            return True
-        else:
-            logging.info("No duplicate rows found.")
-            print("No duplicate rows found.")
-            return False
-    
-    
-    
-    def validate_dimensions(self):
-    
-        print('Running validate_dimensions...')
-
-        month_labels = ['JAN','FEB','MAR','APR','MAY','JUN','JUL','AUG','SEP','OCT','NOV','DEC',  \
-        'JANUARY','FEBRUARY','MARCH','APRIL','MAY','JUNE','JULY','AUGUST','SEPTEMBER','OCTOBER','NOVEMBER','DECEMBER']
-
-        # Get the year and month labels from the headers
-        # NOTE: For ExTO load files, get the month labels only
-        time_labels = self.get_time_labels()
-
-        # For all load files other than ExTO, get the year and month labels and validate them; 
-        # All other dimensions are validated below
-        if self.df.iloc[1,0].startswith('ET:'):
-            # Validate the Period members
-            # The Year members will be validated below (in ExTO load files they're in the rows rather than the headers)
-            PERIOD_validated = self.validate_members(time_labels['PERIOD'],'Period')
-        else:
-            # Validate the Year and Period members
-            YEAR_validated = self.validate_members(time_labels['YEAR'],'Years')
-            PERIOD_validated = self.validate_members(time_labels['PERIOD'],'Period')
-
-        x = range(len(self.df.columns))
-        for n in x:
-            if self.df.columns[n].upper() in (month_labels) or  self.df.columns[n].upper() in ['FILENAME', 'USEREMAIL']:
-                pass # Leave the column header as-is
-            # On all of these evaluations, skip Row 0 because it contains either None or the month labels
-            elif any(self.df.iloc[1:,n].isin(self.input_files['ET']['Member Name'].tolist())) or any(self.df.iloc[1:,n].isin(self.input_files['ET']['Alias: Default'].tolist())):
-                self.df.rename(columns={self.df.columns[n]:'ET'}, inplace=True)
-                ET_validated = self.validate_members(self.df['ET'][self.df['ET']!=''],'Equipment Type') #Filter out the rows containing zeros
-                if ET_validated.empty == True:
-                    if self.df.iloc[1,n].find(':') != 2:
-                        # The dimension contains aliases on the sheet, so add a new column for member names
-                        ET_MemberNames = self.get_member_names(self.df['ET'],'Equipment Type')
-                        self.df = self.df.merge(ET_MemberNames, how='left', left_index=True, right_index=True, suffixes=(None, '_y'))
-                        self.df = self.df.drop(columns=['ET_y','ET_Alias'])
-                        self.df = self.df.rename(columns={'ET':'ET_Alias','ET_MemberName':'ET'})
-            elif any(self.df.iloc[1:,n].isin(self.input_files['PC']['Member Name'].tolist())) or any(self.df.iloc[1:,n].isin(self.input_files['PC']['Alias: Default'].tolist())):
-                self.df.rename(columns={self.df.columns[n]:'PC'}, inplace=True)
-                PC_validated = self.validate_members(self.df['PC'][self.df['PC']!=''],'Profit Center') #Filter out the rows containing zeros
-                if PC_validated.empty == True:
-                    if self.df.iloc[1,n].find(':') != 2:
-                        # The dimension contains aliases on the sheet, so add a new column for member names
-                        PC_MemberNames = self.get_member_names(self.df['PC'],'Profit Center')
-                        self.df = self.df.merge(PC_MemberNames, how='left', left_index=True, right_index=True, suffixes=(None, '_y'))
-                        self.df = self.df.drop(columns=['PC_y','PC_Alias'])
-                        self.df = self.df.rename(columns={'PC':'PC_Alias','PC_MemberName':'PC'})
-            elif any(self.df.iloc[1:,n].isin(self.input_files['CO']['Member Name'].tolist())) or any(self.df.iloc[1:,n].isin(self.input_files['CO']['Alias: Default'].tolist())):
-                self.df.rename(columns={self.df.columns[n]:'CO'}, inplace=True)
-                CO_validated = self.validate_members(self.df['CO'][self.df['CO']!=''],'Company Code') #Filter out the rows containing zeros
-                if CO_validated.empty == True:
-                    if self.df.iloc[1,n].find(':') != 2:
-                        # The dimension contains aliases on the sheet, so add a new column for member names
-                        CO_MemberNames = self.get_member_names(self.df['CO'],'Company Code')
-                        self.df = self.df.merge(CO_MemberNames, how='left', left_index=True, right_index=True, suffixes=(None, '_y'))
-                        self.df = self.df.drop(columns=['CO_y','CO_Alias'])
-                        self.df = self.df.rename(columns={'CO':'CO_Alias','CO_MemberName':'CO'})
-            elif any(self.df.iloc[1:,n].isin(self.input_files['IO']['Member Name'].tolist())) or any(self.df.iloc[1:,n].isin(self.input_files['IO']['Alias: Default'].tolist())):
-                self.df.rename(columns={self.df.columns[n]:'IO'}, inplace=True)
-                IO_validated = self.validate_members(self.df['IO'][self.df['IO']!=''],'Internal Order') #Filter out the rows containing zeros
-                if IO_validated.empty == True:
-                    if self.df.iloc[1,n].find(':') != 2:
-                        # The dimension contains aliases on the sheet, so add a new column for member names
-                        IO_MemberNames = self.get_member_names(self.df['IO'],'Internal Order')
-                        self.df = self.df.merge(IO_MemberNames, how='left', left_index=True, right_index=True, suffixes=(None, '_y'))
-                        self.df = self.df.drop(columns=['IO_y','IO_Alias'])
-                        self.df = self.df.rename(columns={'IO':'IO_Alias','IO_MemberName':'IO'})
-            elif any(self.df.iloc[1:,n].isin(self.input_files['CC']['Member Name'].tolist())) or any(self.df.iloc[1:,n].isin(self.input_files['CC']['Alias: Default'].tolist())):
-                self.df.rename(columns={self.df.columns[n]:'CC'}, inplace=True)
-                CC_validated = self.validate_members(self.df['CC'][self.df['CC']!=''],'Cost Center') #Filter out the rows containing zeros
-                if CC_validated.empty == True:
-                    if self.df.iloc[1,n].find(':') != 2:
-                        # The dimension contains aliases on the sheet, so add a new column for member names
-                        CC_MemberNames = self.get_member_names(self.df['CC'],'Cost Center')
-                        self.df = self.df.merge(CC_MemberNames, how='left', left_index=True, right_index=True, suffixes=(None, '_y'))
-                        self.df = self.df.drop(columns=['CC_y','CC_Alias'])
-                        self.df = self.df.rename(columns={'CC':'CC_Alias','CC_MemberName':'CC'})
-            elif any(self.df.iloc[1:,n].isin(self.input_files['ACCT']['Member Name'].tolist())) or any(self.df.iloc[1:,n].isin(self.input_files['ACCT']['Alias: Default'].tolist())):
-                self.df.rename(columns={self.df.columns[n]:'ACCT'}, inplace=True)
-                ACCT_validated = self.validate_members(self.df['ACCT'][self.df['ACCT']!=''],'Account')
-                if ACCT_validated.empty == True:
-                    if self.df.iloc[1,n].find(':') != 2:
-                        # The dimension contains aliases on the sheet, so add a new column for member names
-                        ACCT_MemberNames = self.get_member_names(self.df['ACCT'],'Account')
-                        self.df = self.df.merge(ACCT_MemberNames, how='left', left_index=True, right_index=True, suffixes=(None, '_y'))
-                        self.df = self.df.drop(columns=['ACCT_y','ACCT_Alias'])
-                        self.df = self.df.rename(columns={'ACCT':'ACCT_Alias','ACCT_MemberName':'ACCT'})
-            elif any(self.df.iloc[1:,n].isin(self.input_files['YEAR']['Member Name'].tolist())) or any(self.df.iloc[1:,n].isin(self.input_files['YEAR']['Alias: Default'].tolist())):
-                self.df.rename(columns={self.df.columns[n]:'YEAR'}, inplace=True)
-                YEAR_validated = self.validate_members(self.df['YEAR'][self.df['YEAR']!=''],'Years') #Filter out the rows containing zeros
-                if YEAR_validated.empty == True:
-                    if self.df.iloc[1,n].find(':') != 2:
-                        # The dimension contains aliases on the sheet, so add a new column for member names
-                        YEAR_MemberNames = self.get_member_names(self.df['YEAR'],'Years')
-                        self.df = self.df.merge(YEAR_MemberNames, how='left', left_index=True, right_index=True, suffixes=(None, '_y'))
-                        self.df = self.df.drop(columns=['YEAR_y','YEAR_Alias'])
-                        self.df = self.df.rename(columns={'YEAR':'YEAR_Alias','YEAR_MemberName':'YEAR'})
-            elif any(self.df.iloc[1:,n].isin(['Amount','Adjustment','Rate','Units'])):
-                self.df.rename(columns={self.df.columns[n]:'TYPE'}, inplace=True)
-                TYPE_validated = self.validate_members(self.df['TYPE'][self.df['TYPE']!=''],'Type') #Filter out the rows containing zeros
-            elif any(self.df.iloc[1:,n].isin(['Working','Final','Current Capacity'])):
-                self.df.rename(columns={self.df.columns[n]:'VER'}, inplace=True)
-                VER_validated = self.validate_members(self.df['VER'][self.df['VER']!=''],'Version') #Filter out the rows containing zeros
-            elif any(self.df.iloc[1:,n].isin(['Forecast','Actual','Flash_Base','Flash_GAAP','Flash_NonGAAP','Flash_Eco'])):
-                self.df.rename(columns={self.df.columns[n]:'SCEN'}, inplace=True)
-                SCEN_validated = self.validate_members(self.df['SCEN'][self.df['SCEN']!=''],'Scenario') #Filter out the rows containing zeros
-            elif YEAR_validated.empty == True and PERIOD_validated.empty == True:
-                if str(self.df.iloc[0,n]).upper() in (month_labels):
-                    # WARNING: The placement of this test for month labels *on Row 0* is crucial - it must be here at the bottom
-                    # Concatenate the year and month as the new header (ex: FY 2021_Jan)
-                    # It will be split after it's melted into the rows
-                    year = re.search(r'F?Y?\s?[0-9]{0,4}', self.df.columns[n]).group(0)
-                    self.df.rename(columns={self.df.columns[n]:year + '_' + self.df.iloc[0,n]}, inplace=True)
-            else:
-                pass # Leave the header as-is (even if it appears to be wrong - it will be flagged during validation)
-
-        # For *NON-ExTO* data only, drop the first row of the dataframe (i.e., the second header row in the source file)
-        # The ExTO data set is the only one with Equipment Type in the first column (since it was exported directly from FIN_STMT)
-        if not self.df.iloc[1,0].startswith('ET:'):
-            self.df = self.df.drop([0])
-
-        
-        print('Dataframe with new headers:')       
-        print(self.df.head())
-
-        # Sort all columns to speed up the check for duplicates
-        # This will fail if any of the columns don't contain at least one valid member (and thus the column header will be missing)
-        self.df = self.df.sort_values(by=['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE'])
-
-
-        # If ANY of the dimension validations failed, create a file containing all of the invalid members for the user to fix
-        # Do NOT create a load file
-        if any([ACCT_validated.empty == False, CC_validated.empty == False, IO_validated.empty == False, \
-                CO_validated.empty == False, PC_validated.empty == False, ET_validated.empty == False, \
-                SCEN_validated.empty == False, VER_validated.empty == False, TYPE_validated.empty == False, \
-                YEAR_validated.empty == False, PERIOD_validated.empty == False]):
-
-            # Concatenate all of the validation dataframes that contain invalid members
-            # This way the user will be able to see all invalid members across all dimensions in a single file
-            validations = [ACCT_validated, CC_validated, IO_validated, CO_validated, PC_validated, ET_validated, \
-                           SCEN_validated, VER_validated, TYPE_validated, YEAR_validated, PERIOD_validated]
-            invalid_members = {}
-            for df_index, df_dim in enumerate(validations):
-                if df_dim.empty == False:
-                    invalid_members[df_index] = df_dim  # Create a dictionary of dataframes
-                    
-            # Set error email info
-            error_email_info = {}
-            error_email_info['error_email_subject'] = 'WARNING: Load process failed - invalid Essbase members found on the load sheet'
-            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
-            error_email_info['error_email_body'] = """The attached file contains a list of the invalid Essbase members found on the load sheet.
-            Invalid members are those that do not have an exact match in SWA_RPT.
-            Discrepancies are often caused by capitalization, special characters, and space characters.
-            Please correct the load sheet and repeat the load process. \n \n
-            NOTE: No data on your sheet has been loaded."""
-
-            error_log_entry = "Validation failed because of invalid members on the load sheet. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
-                    
-            invalid_members_df = pd.concat(df_dim for df_dim in invalid_members.values())  # Concatenate the dataframes into a single one
-            ret = self.create_error_file(invalid_members_df, error_email_info, error_log_entry)
-            print('At least one dimension file is incomplete')
-            return False
-
-        else:
-            # The df was altered during the successful validation process, so send it back to the ProcessSourceFile def
-            # The presence of the dataframe *implies* a return value of "True", but we will not return "True" explicitly
-            logging.info("All members validated.")
-            print("All members validated.")
-            return self.df
-    
-   
-
-    def validate_members(self, s_load_sheet_members, dimension):
-        
-        print('Running validate_members...')
-    
-        # Get the dimension's Outline Extractor doc file (these were imported as input files below)
-        if dimension == 'Account':
-            dim_members = self.input_files['ACCT']
-            # RESTRICTION: In the doc file, keep only accounts that store data
-            dim_members = dim_members[dim_members['Data Storage'].str.upper().isin(['STORE DATA','NEVER SHARE'])]
-            sheet_dim_header = 'ACCT'
-        elif dimension == 'Cost Center':
-            dim_members = self.input_files['CC']
-            sheet_dim_header = 'CC'
-        elif dimension == 'Internal Order':
-            dim_members = self.input_files['IO']
-            sheet_dim_header = 'IO'
-        elif dimension == 'Company Code':
-            dim_members = self.input_files['CO']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['CO:9001'])]
-            sheet_dim_header = 'CO'
-        elif dimension == 'Profit Center':
-            dim_members = self.input_files['PC']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['PC:1000','HDQ (1000)'])]
-            sheet_dim_header = 'PC'
-        elif dimension == 'Equipment Type':
-            dim_members = self.input_files['ET']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['ET:NONE'])]
-            sheet_dim_header = 'ET'
-        elif dimension == 'Scenario':
-            dim_members = self.input_files['SCEN']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['ACTUAL','FORECAST','FLASH_BASE'])]
-            sheet_dim_header = 'SCEN'
-        elif dimension == 'Version':
-            dim_members = self.input_files['VER']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['FINAL','WORKING','CURRENT CAPACITY','CURRENT CAPACITY2'])]
-            sheet_dim_header = 'VER'
-        elif dimension == 'Type':
-            dim_members = self.input_files['TYPE']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['AMOUNT','ADJUSTMENT'])]
-            sheet_dim_header = 'TYPE'
-        elif dimension == 'Years':
-            # RESTRICTION: Keep current year and future years only
-            dim_members = self.input_files['YEAR']
-            # Split the alias on the space character to create two new columns
-            dim_members[['FY Prefix','Year Number']] = dim_members['Alias: Default'].str.split(expand=True)
-            # Convert the new Year Number column from string to numeric
-            dim_members['Year Number'] = pd.to_numeric(dim_members['Year Number'])
-            # Keep only the years that are equal to or greater than the current year
-            dim_members = dim_members[dim_members['Year Number'] >= now.year - 1] 
-            sheet_dim_header = 'YEAR'
-        elif dimension == 'Period': 
-            dim_members = self.input_files['PERIOD']
-            sheet_dim_header = 'PERIOD'
-
-        # In all doc files/dimensions, keep only the level-zero members
-        dim_members = dim_members[dim_members['Level'] == '0']
-
-        f_load_sheet_members = s_load_sheet_members.to_frame()
-
-        # This command: print(f_load_sheet.iloc[0,0].contains('FY[2-9][0-9]',regex=True))
-        # Creates this error: "AttributeError: 'str' object has no attribute 'contains' ""
-        # NOTE REGARDING THE ERROR: 
-        # The str method/object is for a pandas Series BUT NOT FOR A SINGLE ELEMENT OF A SERIES (even though that element is a string)
-        # By subscripting a series with [0] you are getting an element of the series. 
-
-        f_dim_members = dim_members[['Member Name','Alias: Default']]
-
-        # Look at the first member on the load sheet to see if it's a member name or an alias
-        if any(f_load_sheet_members[sheet_dim_header].isin(['Forecast','Working','Locked','Current Capacity','Amount','Adjustment'])):
-            dim_members_join_field = 'Member Name'
-        elif any(f_load_sheet_members[sheet_dim_header].str.find(':') == 2): # This catches GL:*, CC:*, etc.
-            dim_members_join_field = 'Member Name'
-        elif any(f_load_sheet_members[sheet_dim_header].isin(['Jan','Feb','Mar','Apr','Jun','Jul','Aug','Sep','Oct','Nov','Dec'])):
-            # Note: May was intentionally omitted from the list since it doesn't have an alias defined in the dim_members file
-            dim_members_join_field = 'Member Name'
-        elif any(f_load_sheet_members[sheet_dim_header].str.contains('FY[2-9][0-9]',regex=True)):
-            dim_members_join_field = 'Member Name'
-        else:
-            dim_members_join_field = 'Alias: Default'
-
-        # Join the list of members from the load sheet to the members in the dim file
-        f_load_sheet_members = f_load_sheet_members.merge(f_dim_members, how='left', left_on=sheet_dim_header, right_on=dim_members_join_field)
-
-        # Rows where the member name AND alias are both NaN indicate invalid members on the load sheet
-        cond1 = f_load_sheet_members['Member Name'].isnull()
-        cond2 = f_load_sheet_members['Alias: Default'].isnull()
-        cond3 = f_load_sheet_members[sheet_dim_header].str.upper().isin(['MAY']) # Filter out the anomalies
-        invalid_members = f_load_sheet_members[(cond1 & cond2) & ~ cond3]
-
-        # Drop the Member Name and Alias columns, and all duplicate invalid members
-        # Create a standard column name for all dimensions
-        invalid_members = invalid_members.drop(columns=['Member Name','Alias: Default']).drop_duplicates()   
-        invalid_members.columns = ['Invalid Members']
-        invalid_members = invalid_members.sort_values(by=['Invalid Members'])
-
-        return invalid_members
-
-    
-    
-    def get_member_names(self, s_load_file_members, dimension):
-        
-        print('Running get_member_names...')
-    
-        # Get the dimension's Outline Extractor doc file (these were imported as input files below)
-        if dimension == 'Account':
-            dim_members = self.input_files['ACCT']
-            # RESTRICTION: In the doc file, keep only accounts that store data
-            dim_members = dim_members[dim_members['Data Storage'].str.upper().isin(['STORE DATA','NEVER SHARE'])]
-            backup_file_dim_header = 'ACCT'
-        elif dimension == 'Cost Center':
-            dim_members = self.input_files['CC']
-            backup_file_dim_header = 'CC'
-        elif dimension == 'Internal Order':
-            dim_members = self.input_files['IO']
-            backup_file_dim_header = 'IO'
-        elif dimension == 'Company Code':
-            dim_members = self.input_files['CO']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['CO:9001'])]
-            backup_file_dim_header = 'CO'
-        elif dimension == 'Profit Center':
-            dim_members = self.input_files['PC']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['PC:1000','HDQ (1000)'])]
-            backup_file_dim_header = 'PC'
-        elif dimension == 'Equipment Type':
-            dim_members = self.input_files['ET']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['ET:NONE'])]
-            backup_file_dim_header = 'ET'
-        elif dimension == 'Scenario':
-            dim_members = self.input_files['SCEN']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['ACTUAL','FORECAST','FLASH_BASE'])]
-            backup_file_dim_header = 'SCEN'
-        elif dimension == 'Version':
-            dim_members = self.input_files['VER']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['FINAL','WORKING','CURRENT CAPACITY','CURRENT CAPACITY2'])]
-            backup_file_dim_header = 'VER'
-        elif dimension == 'Type':
-            dim_members = self.input_files['TYPE']
-            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(['AMOUNT','ADJUSTMENT'])]
-            backup_file_dim_header = 'TYPE'
-        elif dimension == 'Years':
-            # RESTRICTION: Keep current year and future years only
-            dim_members = self.input_files['YEAR']
-            # Split the alias on the space character to create two new columns
-            dim_members[['FY Prefix','Year Number']] = dim_members['Alias: Default'].str.split(expand=True)
-            # Convert the new Year Number column from string to numeric
-            dim_members['Year Number'] = pd.to_numeric(dim_members['Year Number'])
-            # Keep only the years that are equal to or greater than the current year
-            dim_members = dim_members[dim_members['Year Number'] >= now.year - 1] 
-            backup_file_dim_header = 'YEAR'
-        elif dimension == 'Period': 
-            dim_members = self.input_files['PERIOD']
-            backup_file_dim_header = 'PERIOD'
-
-        # In all doc files/dimensions, keep only the level-zero members
-        dim_members = dim_members[dim_members['Level'] == '0']
-
-        f_load_file_members = s_load_file_members.to_frame()
-
-        f_dim_members = dim_members[['Member Name','Alias: Default']]
-        f_dim_members = f_dim_members.drop_duplicates(subset=['Member Name'])
-
-        # Join the list of members from the backup file to the members in the dim file
-        f_load_file_members = f_load_file_members.merge(f_dim_members, how='left', left_on=backup_file_dim_header, right_on='Alias: Default')
-
-        # Rename the alias field
-        f_load_file_members = f_load_file_members.rename(columns={'Member Name':backup_file_dim_header + '_MemberName','Alias: Default': backup_file_dim_header + '_Alias'})
-
-        return f_load_file_members
-    
-    
-    
-    def create_load_file(self):
-    
-        # This function produces one or more text files that will be loaded into FIN_STMT
-
-        print('Running create_load_file...')
-        
-        # Test the handling of a runtime error outside of a try/except block
-        #z = 1/0
-
-        # Continue with the steps to create the load file...
-        # The following line was updated in v5.0.4; previously it was: if self.df.iloc[1,0].startswith('ET:'):
-        if self.df.iloc[0,0].startswith('ET:'):
-            # This is the ExTO adjustments data (it is the only source file with Equipment Type in the first column)
-            # NOTE: Unlike the load files coming from users, this one already has Year in the rows
-
-            # Melt the months into the rows and then reorder the columns
-            self.df = pd.melt(self.df, id_vars=['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','FileName','UserEmail'], var_name='PERIOD',value_name='DATA')
-            self.df = self.df[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName','UserEmail']]
-            self.df['SCEN'] = 'Actual'  # Replace Flash_Base with Actual in the ExTO file
-            self.df['VER'] = 'Final'    # Replace Working with Final in the ExTO file
-        else:
-            # Melt all of the year_month headers into a new column named Combo_Period
-            # Intentionally omit the "value_vars" parameter here, which causes all of the remaining columns to be namelessly melted
-            # This is perfect because you never know how many months columns there will be, or which year(s) are being loaded
-
-            print('Load file df before melting:')
-            print(self.df.head())
-
-            # Drop all alias columns before melting
-            for dim in self.df.columns:
-                if dim.endswith('_Alias'):
-                    self.df = self.df.drop(columns=[dim])
-
-            self.df = pd.melt(self.df, id_vars=['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','FileName','UserEmail'], var_name='COMBO_PERIOD',value_name='DATA')
-
-            print('Load file df after melting:')
-            print(self.df.head())
-
-            # Split the concatenated year_month labels into separate columns (in a new dataframe)
-            month_year = self.df['COMBO_PERIOD'].str.split(pat="_",expand=True)
-            month_year = month_year.rename(columns={0:'YEAR',1:'PERIOD'})
-            unique_periods = month_year.drop_duplicates()
-
-            # Bring the new Year and Period columns into the original dataframe, then delete the Combo_Period column
-            self.df = self.df.merge(month_year,left_index=True,right_index=True,copy=False)
-            self.df = self.df.drop(columns=['COMBO_PERIOD'])
-
-            # Reorder the new columns
-            self.df = self.df[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName','UserEmail']]
-
-            # Fill blank cells in the DATA column with zeroes
-            self.df = self.df.fillna(value={'DATA':0})
-
-        # Reorder the new columns
-        self.df = self.df[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName','UserEmail']]
-
-        # The dataframe already includes a column named 'FileName'
-        # Append the file type to the front of the filename and a timestamp to the end
-        if all(self.df['VER'].isin(['Current Capacity'])):
-            if all(self.df['CC'].isin(['CC:40001','Non Operating (40001)'])):
-                self.df['FileName'] = 'CurrentCapacity_Load_FleetOnly_' + self.workbook_name + '_' + str(current_datetime)
-		load_flag_value = 2 
-            else:
-                self.df['FileName'] = 'CurrentCapacity_Load_' + self.workbook_name + '_' + str(current_datetime)
-		load_flag_value = 1
-        elif all(self.df['SCEN'].isin(['Actual'])):
-            # Actual_Load_ (these are the monthly ExTO adjustments)
-            self.df['FileName'] = 'Actual_Load_' + self.workbook_name + '_' + str(current_datetime)
-	    load_flag_value = 0
-        else:
-            # Working_Load_
-            self.df['FileName'] = 'Working_Load_' + self.user_id + '_' + self.workbook_name + '_' + self.load_sheet_name + '_' + str(current_datetime)
-	    load_flag_value = 0
-
-        # Embed the backup data into the load file (as a new column that will be ignored by the load rule)
-        #if not all(self.df['VER'].isin(['Current Capacity'])):  As of 4/26/22, capacity load files will have the new column too
-        print('Load file df before adding backup data:')
-        print(self.df.head())
-
-        # Drop the duplicates in all dimensions; these series will be used as filters for the backup data
-        load_sheet_acct = self.df['ACCT'].drop_duplicates()
-        load_sheet_cc = self.df['CC'].drop_duplicates()
-        load_sheet_io = self.df['IO'].drop_duplicates()
-        load_sheet_co = self.df['CO'].drop_duplicates()
-        load_sheet_pc = self.df['PC'].drop_duplicates()
-        load_sheet_et = self.df['ET'].drop_duplicates()
-        load_sheet_scen = self.df['SCEN'].drop_duplicates()
-        load_sheet_ver = self.df['VER'].drop_duplicates()
-        load_sheet_type = self.df['TYPE'].drop_duplicates()
-        load_sheet_year  = self.df['YEAR'].drop_duplicates()
-
-        load_sheet_members = {'acct':load_sheet_acct,'cc':load_sheet_cc,'io':load_sheet_io,'co':load_sheet_co, \
-                              'pc':load_sheet_pc,'et':load_sheet_et,'scen':load_sheet_scen,'ver':load_sheet_ver, \
-                              'type':load_sheet_type,'year':load_sheet_year}
-
-        # Get the associated pre-load data from the latest FIN_STMT backup file on the shared drive
-        df_backup_file = self.process_backup_file(load_sheet_members)
-
-        # Merge the backup file and the load file
-        print('Adding backup data to the load file df...')
-        left_key = ['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD']
-        right_key = ['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD']
-        self.df = self.df.merge(df_backup_file, how='left', left_on=left_key, right_on=right_key)
-
-        # Rename the new columns
-        self.df.rename(columns={'DATA_x':'DATA','FileName_x':'FileName', 'DATA_y':'DATA_Backup','FileName_y':'FileName_Backup'},inplace=True)
-
-        # Drop the backup filename column
-        self.df = self.df.drop(columns=['FileName_Backup'])
-
-        #Fill all empty cells in the backup data column with zeros
-        self.df = self.df.fillna({'DATA_Backup':0})
-
-        # Add the email columns to the dataframe    
-        self.df = self.add_email_columns(self.df, self.user_email)
-
-        # Output the load file
-        Alteryx.write(self.df,1)
-
-        logging.info("Worksheet validation successful. Load file " + str(self.df.loc[0,'FileName']) + r".txt written to \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Output")
-        print('Worksheet validation successful. Load file written to Automation-FPA\Load_Files\Output...')
-
-        # For capacity loads only, create a flag file that indicates which months to load
-        # It's written to the same directory as the capacity data file and uses the same load rule
-        # The values loaded from this flag file will be referenced when the capacity calc scripts are run
-	# Note: load_flag_value was set in the previous if block
-        if load_flag_value == 1 or load_flag_value == 2: 
-            capacity_load_flags = self.create_capacity_flag_file(unique_periods,'Current Capacity',load_flag_value)
-            Alteryx.write(capacity_load_flags,2)
-            logging.info(r"Capacity flag file written to \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Output")
-            print('Capacity flag file created')
-
-        return True
-
-    
-            
-    def create_error_file(self, error_details_df, error_email_info, error_log_entry=None):
-        
-        # The "error_log_entry" will be received for all error types except runtime errors
-
-        print('Running create_error_file...')
-        
-        print('Incoming error dataframe:')
-        print(error_details_df)
-       
-        # Add the FileName column to the dataframe
-        error_details_df['FileName'] = self.enhanced_file_name
-
-        # Add the recipients' email columns to the dataframe    
-        error_details_df = self.add_email_columns(error_details_df, self.user_email)
-
-        # Add columns containing info/details about the error
-        error_details_df['ErrorEmailSubject'] = error_email_info['error_email_subject']
-        error_details_df['ErrorFilePath'] = error_email_info['error_email_filepath']
-        error_details_df['ErrorEmailBody'] = error_email_info['error_email_body']
-            
-        print('Errors dataframe:')
-        print(error_details_df)
-
-        # Ouput the details of the error(s) but do NOT create the load file
-        Alteryx.write(error_details_df, 3)
-
-        if error_log_entry:
-            logging.error(error_log_entry)
-        
-        print('Load file validation FAILED. See the log for details.')
-
-# End of the DataLoader class
-        
-
-
-def summary_information(df):
-    
-    print('Running summary_information...')
-    
-    # Create empty dictionary
-    summary_info = {}
-    
-    match_pattern_filepath = r'.*\\(.*).xls[xm]?.[|]{0,}\W{0,}(.*)\$'
-    match_pattern_email = r'.*([ex]\d{3,7})@wnco.com$'
-    
-    z1 = re.match(match_pattern_filepath, df.loc[1,'FileName'])  # FileName actually contains the full path to the file
-    z2 = re.match(match_pattern_email, df.loc[1,'UserEmail'])  # Email address is formatted as e12345@wnco.com
-        
-    if not z1 == None:
-        summary_info['workbook_name'] = ''.join(z1.group(1)) # Convert tuple to string
-    else:
-        summary_info['workbook_name'] = None
-        
-    if not z1 == None:
-        summary_info['load_sheet_name'] = ''.join(z1.group(2)) # Convert tuple to string
-    else:
-        summary_info['load_sheet_name'] = None
-
-    if not z2 == None:
-        summary_info['user_id'] = ''.join(z2.group(1)) # Convert tuple to string
-    else:
-        summary_info['user_id'] = None
-    
-    summary_info['user_email'] = df.loc[1,'UserEmail']
-    
-    return summary_info
-
-
-def get_input_files():
-    
-    print("Running get_input_files...")
-    
-    input_files = {}
-    
-    # Get the user's load workbook, the Outline Extractor doc files, the list of capacity accounts, and the FIN_STMT backup data file
-
-    # Get the user's load workbook
-    # The user will be prompted to browse to it and select the load sheet within the workbook
-    # They will also be required to enter their eID (including the 'e')
-    df = Alteryx.read("#1")
-    input_files['LOADSHEET'] = df
-
-    # Get the Outline Extractor doc files for each dimension
-    # As of 8/19/22 these file are retrieved by Alteryx from: \\disk23\fin_plan-shared\Automation-FPA\OutlineExtracts
-    # Updated files are placed in that folder as needed (ie, when new cost centers, accounts, etc. are created)
-    # The location to get the updated files from is: \\disk23\fin_plan-shared\Automation-ALTERYX\OutlineExtracts
-    ACCT_dim = Alteryx.read("#2")
-    input_files['ACCT'] = ACCT_dim 
-
-    CC_dim = Alteryx.read("#3")
-    input_files['CC'] = CC_dim
-
-    IO_dim = Alteryx.read("#4")
-    input_files['IO'] = IO_dim
-
-    CO_dim = Alteryx.read("#5")
-    input_files['CO'] = CO_dim
-
-    PC_dim = Alteryx.read("#6")
-    input_files['PC'] = PC_dim
-
-    ET_dim = Alteryx.read("#7")
-    input_files['ET'] = ET_dim
-
-    SCEN_dim = Alteryx.read("#8")
-    input_files['SCEN'] = SCEN_dim
-
-    VER_dim = Alteryx.read("#9")
-    input_files['VER'] = VER_dim
-
-    TYPE_dim = Alteryx.read("#10")
-    input_files['TYPE'] = TYPE_dim
-
-    YEAR_dim = Alteryx.read("#11")
-    input_files['YEAR'] = YEAR_dim
-
-    PERIOD_dim = Alteryx.read("#12")
-    input_files['PERIOD'] = PERIOD_dim
-
-    # Get the latest FIN_STMT backup file
-    finstmt_backup = Alteryx.read("#13")
-    input_files['BACKUP'] = finstmt_backup
-	
-    print("All input files have been imported")
-
-    return input_files
-    
-
-
-def main():
-    
-    # This function is the entry point into the entire process of validating the load sheet and creating a load file
-    
-    try:
-    
-        print("Running main...")
-
-        input_files = get_input_files()  # A dictionary is returned that contains all 14 files defined in get_input_files()
-        df = input_files['LOADSHEET']
-        finstmt_backup = input_files['BACKUP']
-
-        # Get summary information about the load from the FileName and UserEmail fields
-        # Info will include the user's eID and email address, the name of the workbook, and the name of the load sheet
-        # Note1: The email address is formatted as e12345@wnco.com
-        # Note2: The FileName field contains the full path to the analyst's Excel file
-        summary_info = summary_information(df)  # The info will be returned in a dictionary
-        user_id = summary_info.get('user_id', '')
-        user_email = summary_info.get('user_email', '')
-        workbook_name = summary_info.get('workbook_name', '')
-        load_sheet_name = summary_info.get('load_sheet_name', '')
-        summary_info['enhanced_file_name'] = user_id + '_' + workbook_name + '_' + load_sheet_name + '.txt'
-
-        logging.info("Validating the worksheet " + load_sheet_name + " in " + workbook_name + " for user " + user_id + "...")
-
-        # Display high-level info about the data to load
-        print('DataFrame before cleanup and processing:')
-        print(df.head())
-        print(df.shape)
-        print(df.info())
-
-        # Add a new column to the FIN_STMT backup file
-        finstmt_backup['FileName'] = 'CORPPLN_Forecast_CY'
-        print('FIN_STMT backup data:')
-        print(finstmt_backup.head())
-
-        print('Creating the dataload object...')
-        my_load_obj = DataLoader(input_files, summary_info)
-        if not my_load_obj:
-            return False
-       
-        if my_load_obj.validation_and_cleanup() == False:
-            return False
-
-        if my_load_obj.process_load_sheet() == False:
-            return False
-
-        return True
-    
-    except Exception as e:
-        
-        log = logging.getLogger("fpa_log")
-        log.exception(e)
-
-        # Attach the log to the error email
-        error_messages = []
-        this_function_name = sys._getframe(  ).f_code.co_name
-        error_messages.append('The following runtime error occurred in the ' + str(this_function_name) + ' function or one of its sub-functions : ' + str(e))
-        runtime_error_df = pd.DataFrame(error_messages, columns=['Runtime Error'])
-
-        try:
-
-            print('Running create_error_file...')
-        
-            print('Incoming runtime error dataframe:')
-            print(runtime_error_df)
-
-            # Add the FileName column to the dataframe
-            runtime_error_df['FileName'] = user_id + '_' + workbook_name + '_' + load_sheet_name + '.txt'
-
-            # Add columns containing info/details about the error
-            if user_email:
-                runtime_error_df['UserEmail'] = user_email
-            else:
-                runtime_error_df['UserEmail'] = 'e79230@wnco.com'
-            runtime_error_df['ccEmail'] = 'e79230@wnco.com'
-            runtime_error_df['ErrorEmailSubject'] = 'CRITICAL ERROR: Load process failed - see attachment for details'
-            runtime_error_df['ErrorFilePath'] = log_file
-            runtime_error_df['ErrorEmailBody'] = 'A critical error occured during the load process. Please see the attachment for details.  NOTE: No data on your sheet has been loaded.'
-
-            print('Updated runtime error dataframe:')
-            print(runtime_error_df)
-
-            # Ouput the details of the error(s) but do NOT create the load file
-            Alteryx.write(runtime_error_df, 3)
-
-            print('Load file validation FAILED. See the log for details.')
-            
-        except Exception as e2:
-            log = logging.getLogger("fpa_log")
-            log.exception(e2)
-            
-        finally:
-            return False
-    
-
-
-if main() == True:
-    print('Load sheet was processed successfully')
-else:
-    print('Load sheet was NOT processed successfully')
+
+import pandas as pd
+import numpy as np
+import os
+import datetime
+import glob
+import re
+import sys
+import json
+import time
+import argparse
+import logging
+import logging.handlers
+import queue
+import threading
+import atexit
+import tempfile
+import zlib
+import hashlib
+import shutil
+import pickle
+import zipfile
+import sqlite3
+import platform
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from IPython.display import display
+from pandas.api.types import CategoricalDtype
+from IPython.core.interactiveshell import InteractiveShell
+
+# The ayx package only exists inside the Alteryx Python tool
+# When it's missing, the script is running headless and reads/writes its files directly on the shared drive
+try:
+    from ayx import Alteryx
+except ImportError:
+    Alteryx = None
+
+# pyarrow is needed to read the memory-mapped backup snapshot (see fpa_backup_snapshot.py)
+# Without it, the backup is read from the full FIN_STMT export as before
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pa_compute
+except ImportError:
+    pa = None
+
+# pyarrow's Acero engine runs the query plans of the arrow backend (see join_backup_values)
+# Without it, runs that ask for the arrow backend use pandas
+try:
+    import pyarrow.acero as pa_acero
+except ImportError:
+    pa_acero = None
+
+# openpyxl's read-only mode is used by the streaming load sheet reader (see stream_load_sheet)
+# Without it, a headless run reads load sheets with pandas
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+##########################################################################################
+# NOTE: This code runs in a single Python tool within an Alteryx workflow
+# It can optionally be split into multiple cells in the tool's Jupyter notebook
+# However, the entire DataLoader class should be confined to a single cell
+#
+# It can also run headless (outside of Alteryx) from the command line:
+#   python fpa_load_file_creator.py <workbook path> <load sheet name> <user email>
+# Use * as the load sheet name to process every load sheet in the workbook in one run
+##########################################################################################
+
+# Root of the shared drive folders used by the load process
+# FPA_SHARE_ROOT can point a headless run at a copy of the folders (e.g., on a test server)
+share_root = os.environ.get('FPA_SHARE_ROOT', r'\\disk23\fin_plan-shared\Automation-FPA')
+
+# Every run (one process, even when it processes several load sheets) gets a unique ID: its start time and a random suffix
+# It tags the run's log records, so the records of concurrent runs can be told apart, and names the run's workspace (see publish_output_file)
+run_id = datetime.datetime.now().strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:8]
+
+# Enable logging
+log_file = os.path.join(share_root, 'Load_Files', 'Logs', 'fpa_load_files.log')
+
+# Logging calls only put the record on an in-memory queue; a background thread appends the queued records to the log on the share
+# in batches (see write_log_batches), so the load process never waits on an SMB write and concurrent runs write to the file less often
+# Records are written in the order they were logged; call flush_log to wait for everything logged so far to be written
+log_queue = queue.Queue()
+log_flush_seconds = 2       # How long the log thread collects records before writing them
+log_batch_records = 500     # Most records written at once
+log_formatter = logging.Formatter('%(asctime)s %(levelname)-8s ' + run_id + ' %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def append_log_batch(log_lines):
+
+    # Returns the lines that couldn't be written (the share may be briefly unreachable); they're retried with the next batch
+    try:
+        with open(log_file, 'a') as f:
+            f.write(''.join(log_lines))
+        return []
+    except OSError:
+        return log_lines
+
+
+
+def write_log_batches():
+
+    # Runs on the log thread for the life of the process
+    # Waits for a record, collects whatever else is logged within log_flush_seconds, and writes the batch in a single append
+    # A flush request (a threading.Event on the queue) writes the batch right away and then sets the event
+    unwritten_lines = []
+    while True:
+        batch = [log_queue.get()]
+        batch_deadline = time.monotonic() + log_flush_seconds
+        while len(batch) < log_batch_records and not isinstance(batch[-1], threading.Event):
+            try:
+                batch.append(log_queue.get(timeout=max(batch_deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+
+        unwritten_lines.extend(log_formatter.format(record) + '\n' for record in batch if isinstance(record, logging.LogRecord))
+        if unwritten_lines:
+            unwritten_lines = append_log_batch(unwritten_lines)
+        if isinstance(batch[-1], threading.Event):
+            batch[-1].set()
+
+
+
+def flush_log(timeout=30):
+
+    # Wait until every record logged so far has been written to the share (or the timeout expires)
+    # Nothing is queued until setup_run starts the log thread
+    if log_thread is None:
+        return True
+    flushed = threading.Event()
+    log_queue.put(flushed)
+    return flushed.wait(timeout)
+
+
+
+def setup_run():
+
+    # Starts the run's logging and registers its cleanup; main calls it, so importing the script (e.g., from fpa_replay.py) has no side effects
+    # Only the first call does anything (main is called once per load sheet when a whole workbook is processed)
+    global log_thread
+    if not log_thread is None:
+        return
+
+    logging.basicConfig(
+        handlers=[log_queue_handler],
+        level=logging.INFO,
+        force=True)
+
+    log_thread = threading.Thread(target=write_log_batches, name='fpa_log_writer', daemon=True)
+    log_thread.start()
+
+    # Exit handlers run in reverse order: the workspace is removed first, then the last log records are written
+    atexit.register(flush_log)
+    atexit.register(remove_run_workspace)
+
+    print('Python version running on the Alteryx server:')
+    print(sys.version_info)
+
+    print('Pandas version running on the Alteryx server:')
+    print(pd.__version__)
+
+
+# The queue handler only renders the message (and any traceback); the log thread adds the timestamp and level
+log_queue_handler = logging.handlers.QueueHandler(log_queue)
+log_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+log_thread = None
+
+
+##########################################################################################
+# Validation rules
+# Each layout check on the load sheet is declared once here and evaluated by evaluate_validation_rules
+# A new cube rule only needs a new entry (check types are defined in validation_checks)
+#   name:     Key of the violation in the error report
+#   check:    How the rule is evaluated
+#   requires: Rules that must pass first (e.g., the Forecast region can only be located if the headers are correct)
+#   message:  Text shown to the analyst when the rule fails
+# A check can also return the cells that failed (as 'details'); they're listed under the message in the error file
+##########################################################################################
+
+month_names = ('Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec')
+
+# The spellings of each month that are accepted on the month labels row: its three-letter name and its full name (see build_calendar_table)
+month_spellings = dict([(month, month) for month in month_names] + [(full_name, full_name[:3]) for full_name in
+                       ('January','February','March','April','May','June','July','August','September','October','November','December')])
+
+validation_rules = [
+    {'name':'Account', 'check':'member_pattern', 'column':'F1', 'pattern':r'\D\D:\d{4,7}|.*\([HFS]?\d{4,7}\)$',
+     'message':'The Account dimension has at least one invalid and/or missing member in Column A'},
+    {'name':'Cost Center', 'check':'member_pattern', 'column':'F2', 'pattern':r'CC:\d{5}|.*\(\d{5}\)$',
+     'message':'The Cost Center dimension has at least one invalid and/or missing member in Column B'},
+    {'name':'Internal Order', 'check':'member_pattern', 'column':'F3', 'pattern':r'IO:\d{6}|.*\(\d{6}\)$|IO:None',
+     'message':'The Internal Order dimension has at least one invalid and/or missing member in Column C'},
+    {'name':'Company Code', 'check':'member_pattern', 'column':'F4', 'pattern':r'CO:\d{4}|.*\(\d{4}\)$',
+     'message':'The Company Code dimension has at least one invalid and/or missing member in Column D'},
+    {'name':'Profit Center', 'check':'member_pattern', 'column':'F5', 'pattern':r'PC:\d{4}|.*\(\d{4}\)$',
+     'message':'The Profit Center dimension has at least one invalid and/or missing member in Column E'},
+    {'name':'Equipment Type', 'check':'member_pattern', 'column':'F6', 'pattern':r'ET:\d{3}|.*\(\d{3}M?X?\)$|ET:None',
+     'message':'The Equipment Type dimension has at least one invalid and/or missing member in Column F'},
+    # Actual is for ExTO loads only
+    {'name':'Scenario', 'check':'member_list', 'column':'F7', 'members':['Forecast','Actual'],
+     'message':'The Scenario dimension has at least one invalid and/or missing member in Column G'},
+    {'name':'Version', 'check':'member_list', 'column':'F8', 'members':['Working','Locked','Final','Current Capacity'],
+     'message':'The Version dimension has at least one invalid and/or missing member in Column H'},
+    {'name':'Type', 'check':'member_list', 'column':'F9', 'members':['Amount','Adjustment'],
+     'message':'The Type dimension has at least one invalid and/or missing member in Column I'},
+    # A column labeled as "Total" will cause a failure here
+    {'name':'Year', 'check':'headers', 'headers':{0:'F1', 8:'F9', -2:'FileName', -1:'UserEmail'}, 'header_prefixes':{9:('FY',)},
+     'message':'The Year dimension has at least one invalid and/or missing member in Row 1.'},
+    # The first nine cells on the month labels row contain empty strings (written there by cleanup_load_sheet)
+    # Any header other than a month name will cause the validation to fail; a "Total" label will cause a failure
+    {'name':'Month', 'check':'month_row', 'empty_cells':9, 'first_month_column':9, 'months':month_names,
+     'message':'The Month dimension has at least one invalid and/or missing member in Row 2.'},
+    # Forecast values in a column without headers: "F1" through "F9" are ok, "F10", "F11", etc. are NOT ok
+    {'name':'ForecastColumns', 'check':'unlabeled_columns', 'pattern':r'F\d{2}', 'requires':['Year'],
+     'message':'Forecast values were found in one or more columns that do not have column headers.'},
+    # Each non-numeric cell is listed by sheet row and column letter; a value repeated across a row is listed once, and at most max_cells are listed
+    {'name':'ForecastValues', 'check':'numeric_region', 'max_cells':200, 'requires':['Year','Month'],
+     'message':'A non-numeric character was found in {count} {cells} in the Forecast values region of the sheet'}
+]
+
+# The ExTO adjustments data is exported directly from FIN_STMT, so it has its own layout: ten member columns (Equipment Type first, and Year in the rows),
+# the months in the headers, and no month labels row (see get_validation_rules)
+# Each rule is named after the dimension it checks, so duplicate_rows can resolve the column's aliases
+exto_validation_rules = [
+    {'name':'Equipment Type', 'check':'member_pattern', 'column':'F1', 'pattern':r'ET:\d{3}|.*\(\d{3}M?X?\)$|ET:None',
+     'message':'The Equipment Type dimension has at least one invalid and/or missing member in Column A'},
+    {'name':'Profit Center', 'check':'member_pattern', 'column':'F2', 'pattern':r'PC:\d{4}|.*\(\d{4}\)$',
+     'message':'The Profit Center dimension has at least one invalid and/or missing member in Column B'},
+    {'name':'Company Code', 'check':'member_pattern', 'column':'F3', 'pattern':r'CO:\d{4}|.*\(\d{4}\)$',
+     'message':'The Company Code dimension has at least one invalid and/or missing member in Column C'},
+    {'name':'Type', 'check':'member_list', 'column':'F4', 'members':['Amount','Adjustment'],
+     'message':'The Type dimension has at least one invalid and/or missing member in Column D'},
+    {'name':'Internal Order', 'check':'member_pattern', 'column':'F5', 'pattern':r'IO:\d{6}|.*\(\d{6}\)$|IO:None',
+     'message':'The Internal Order dimension has at least one invalid and/or missing member in Column E'},
+    {'name':'Cost Center', 'check':'member_pattern', 'column':'F6', 'pattern':r'CC:\d{5}|.*\(\d{5}\)$',
+     'message':'The Cost Center dimension has at least one invalid and/or missing member in Column F'},
+    {'name':'Years', 'check':'member_pattern', 'column':'F7', 'pattern':r'FY[2-9][0-9]',
+     'message':'The Year dimension has at least one invalid and/or missing member in Column G'},
+    # The rows are loaded to Actual/Final whatever their Scenario and Version (see create_load_file)
+    {'name':'Version', 'check':'member_list', 'column':'F8', 'members':['Working','Final'],
+     'message':'The Version dimension has at least one invalid and/or missing member in Column H'},
+    {'name':'Scenario', 'check':'member_list', 'column':'F9', 'members':['Forecast','Flash_Base','Actual'],
+     'message':'The Scenario dimension has at least one invalid and/or missing member in Column I'},
+    {'name':'Account', 'check':'member_pattern', 'column':'F10', 'pattern':r'\D\D:\d{4,7}|.*\([HFS]?\d{4,7}\)$',
+     'message':'The Account dimension has at least one invalid and/or missing member in Column J'},
+    # Any header other than a month name will cause the validation to fail; a "Total" header will cause a failure
+    {'name':'Month', 'check':'headers', 'headers':{0:'F1', 9:'F10', -2:'FileName', -1:'UserEmail'}, 'header_prefixes':{10:month_names},
+     'message':'The Month dimension has at least one invalid and/or missing member in Row 1.'},
+    {'name':'ForecastColumns', 'check':'unlabeled_columns', 'pattern':r'F\d{2}', 'requires':['Month'],
+     'message':'Forecast values were found in one or more columns that do not have column headers.'},
+    {'name':'ForecastValues', 'check':'numeric_region', 'max_cells':200, 'requires':['Month'],
+     'message':'A non-numeric character was found in {count} {cells} in the Forecast values region of the sheet'}
+]
+
+# How a member *name* is recognized on the load sheet; anything else is treated as an alias
+# e.g., 'CC:40001' is a member name and 'Non Operating (40001)' is its alias
+prefixed_member_pattern = r'^[^:]{2}:'  # GL:*, CC:*, IO:*, etc.
+unprefixed_member_pattern = r'^(?:Forecast|Working|Locked|Current Capacity|Amount|Adjustment)$'
+month_member_pattern = r'^(?:Jan|Feb|Mar|Apr|Jun|Jul|Aug|Sep|Oct|Nov|Dec)$'  # May is omitted because it doesn't have an alias in the Period doc file
+year_member_pattern = r'FY[2-9][0-9]'
+
+
+##########################################################################################
+# Dimensions
+# Each dimension on the load sheet is declared once here; validate_dimensions, validate_members and get_member_names
+# all work from these entries, so a new dimension only needs a new entry (and its Outline Extractor doc file)
+# The entries are in the order their invalid members are listed in the error report
+#   extract:          Key of the dimension's Outline Extractor doc file (see outline_extract_files)
+#   header:           Header of the dimension's column on the load sheet once it's identified (and in the load file)
+#   allowed_members:  The only member names that may be loaded (compared in upper case); None allows every member
+#   data_storage:     The only storage types that may be loaded (compared in upper case); None allows every storage type
+#   open_years:       Only the open years may be loaded (the prior year and later; see build_calendar_table)
+#   level:            Level of the members that may be loaded
+#   signature:        How a member *name* of the dimension is recognized on the sheet; anything else is treated as an alias
+#   sheet_members:    The values that identify the dimension's column on the sheet; None means any member name or alias in the doc file
+#   resolve_aliases:  Aliases on the sheet are replaced with their member names in the load file
+##########################################################################################
+
+dimension_specs = {
+    'Account':        {'extract':'ACCT', 'header':'ACCT', 'allowed_members':None, 'data_storage':['STORE DATA','NEVER SHARE'], 'open_years':False,
+                       'level':'0', 'signature':prefixed_member_pattern, 'sheet_members':None, 'resolve_aliases':True},
+    'Cost Center':    {'extract':'CC', 'header':'CC', 'allowed_members':None, 'data_storage':None, 'open_years':False,
+                       'level':'0', 'signature':prefixed_member_pattern, 'sheet_members':None, 'resolve_aliases':True},
+    'Internal Order': {'extract':'IO', 'header':'IO', 'allowed_members':None, 'data_storage':None, 'open_years':False,
+                       'level':'0', 'signature':prefixed_member_pattern, 'sheet_members':None, 'resolve_aliases':True},
+    'Company Code':   {'extract':'CO', 'header':'CO', 'allowed_members':['CO:9001'], 'data_storage':None, 'open_years':False,
+                       'level':'0', 'signature':prefixed_member_pattern, 'sheet_members':None, 'resolve_aliases':True},
+    'Profit Center':  {'extract':'PC', 'header':'PC', 'allowed_members':['PC:1000','HDQ (1000)'], 'data_storage':None, 'open_years':False,
+                       'level':'0', 'signature':prefixed_member_pattern, 'sheet_members':None, 'resolve_aliases':True},
+    'Equipment Type': {'extract':'ET', 'header':'ET', 'allowed_members':['ET:NONE'], 'data_storage':None, 'open_years':False,
+                       'level':'0', 'signature':prefixed_member_pattern, 'sheet_members':None, 'resolve_aliases':True},
+    'Scenario':       {'extract':'SCEN', 'header':'SCEN', 'allowed_members':['ACTUAL','FORECAST','FLASH_BASE'], 'data_storage':None, 'open_years':False,
+                       'level':'0', 'signature':unprefixed_member_pattern, 'sheet_members':['Forecast','Actual','Flash_Base','Flash_GAAP','Flash_NonGAAP','Flash_Eco'],
+                       'resolve_aliases':False},
+    'Version':        {'extract':'VER', 'header':'VER', 'allowed_members':['FINAL','WORKING','CURRENT CAPACITY','CURRENT CAPACITY2'], 'data_storage':None, 'open_years':False,
+                       'level':'0', 'signature':unprefixed_member_pattern, 'sheet_members':['Working','Final','Current Capacity'], 'resolve_aliases':False},
+    'Type':           {'extract':'TYPE', 'header':'TYPE', 'allowed_members':['AMOUNT','ADJUSTMENT'], 'data_storage':None, 'open_years':False,
+                       'level':'0', 'signature':unprefixed_member_pattern, 'sheet_members':['Amount','Adjustment','Rate','Units'], 'resolve_aliases':False},
+    'Years':          {'extract':'YEAR', 'header':'YEAR', 'allowed_members':None, 'data_storage':None, 'open_years':True,
+                       'level':'0', 'signature':year_member_pattern, 'sheet_members':None, 'resolve_aliases':True},
+    'Period':         {'extract':'PERIOD', 'header':'PERIOD', 'allowed_members':None, 'data_storage':None, 'open_years':False,
+                       'level':'0', 'signature':month_member_pattern, 'sheet_members':None, 'resolve_aliases':False}
+}
+
+# A load sheet column belongs to the first of these dimensions whose sheet members it contains
+# (Period is never a column; the months are in the headers)
+dimension_detection_order = ['Equipment Type','Profit Center','Company Code','Internal Order','Cost Center','Account','Years','Type','Version','Scenario']
+
+# Maximum number of dimensions validated at the same time (see validate_dimensions)
+dimension_validation_workers = 6
+
+
+# Get the current date and time to append to the output file names
+now = datetime.datetime.now()
+current_datetime = str(now.year) + '-' + str(now.month).zfill(2) + '-' + str(now.day).zfill(2) + '-' + str(now.hour).zfill(2) + str(now.minute).zfill(2)
+
+
+# Headless input and output locations
+# These mirror the files the Alteryx workflow feeds into input anchors #2 through #13 and the folders its output tools write to
+outline_extracts_dir = os.path.join(share_root, 'OutlineExtracts')
+outline_extract_files = {
+    'ACCT':'Account.csv',
+    'CC':'Cost Center.csv',
+    'IO':'Internal Order.csv',
+    'CO':'Company Code.csv',
+    'PC':'Profit Center.csv',
+    'ET':'Equipment Type.csv',
+    'SCEN':'Scenario.csv',
+    'VER':'Version.csv',
+    'TYPE':'Type.csv',
+    'YEAR':'Years.csv',
+    'PERIOD':'Period.csv'
+}
+# The FIN_STMT backup export that headless runs and the nightly snapshot job read; it must be the export the workflow's #13 input reads
+# Inside Alteryx the run doesn't use this path; the #13 input passes the export's own path in its FileName field (see get_input_files)
+backup_file = os.environ.get('FPA_BACKUP_FILE', os.path.join(share_root, 'Load_Files', 'Backup', 'CORPPLN_Forecast_CY.txt'))
+load_files_output_dir = os.path.join(share_root, 'Load_Files', 'Output')
+validation_errors_dir = os.path.join(share_root, 'Load_Files', 'Validation_Errors')
+
+# What each load does to the ACCT and CC parent totals (see DataLoader.summarize_rollup_impact)
+# The summaries have their own folder because the Essbase batch loads everything in the Output folder
+rollup_impact_dir = os.path.join(share_root, 'Load_Files', 'RollupImpact')
+rollup_dimensions = ['ACCT','CC']
+
+# How a member's consolidation operator in its doc file rolls it up into its parent (see build_closure_table): + adds it and - subtracts it
+# Members with any other operator aren't in their parent's total (~ and ^ are never consolidated; *, / and % can't be summed)
+# A doc file without the operator column rolls every member up with +
+consolidation_column = 'Consolidation Operator'
+consolidation_signs = {'+':1, '-':-1}
+
+# The anomaly screen compares the loaded values (DATA) with the values they replace (DATA_Backup) (see DataLoader.screen_anomalies)
+# It catches what the structural checks can't, e.g., a sheet keyed in thousands instead of units or an account with its sign flipped
+# Flagged rows and accounts are written to their own folder as a warning; the load goes ahead either way
+anomaly_reports_dir = os.path.join(share_root, 'Load_Files', 'AnomalyReports')
+anomaly_thresholds = {
+    'scale_ratio':100,  # A row or account is flagged when DATA is more than this many times DATA_Backup, or less than 1/scale_ratio of it
+    'zscore':5,         # A row is flagged when its change is this many standard deviations from the mean change of its account's rows
+                        # (an account, from the mean change of the sheet's accounts)
+                        # The largest z-score a group of n changes can produce is (n-1)/sqrt(n), so a group needs at least 27 rows to reach 5
+    'min_rows':5,       # Fewest rows (or accounts) whose changes a z-score is taken over; smaller groups get no z-score at all
+    'min_delta':1000    # Changes (DATA - DATA_Backup) smaller than this are never flagged
+}
+
+# Maximum number of input files read from the shared drive at the same time
+# The reads are latency-bound on the share, so a few threads overlap the network waits without flooding the server
+input_load_workers = 6
+
+# Columns of the FIN_STMT backup export (it has no header row)
+backup_columns = ['ET','PC','CO','TYPE','IO','CC','YEAR','VER','SCEN','ACCT','Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
+
+# The nightly fpa_backup_snapshot.py job converts the backup export into Arrow files on the Alteryx server's local disk
+# Every run on the server memory-maps the same files, so they share one copy in the OS page cache
+# The snapshot is partitioned by YEAR and a hash bucket of ACCT so a run only maps the partitions its load sheet touches
+backup_snapshot_dir = os.environ.get('FPA_SNAPSHOT_DIR', os.path.join(os.environ.get('PROGRAMDATA', tempfile.gettempdir()), 'Automation-FPA', 'BackupSnapshot'))
+backup_snapshot_manifest = os.path.join(backup_snapshot_dir, 'snapshot_manifest.json')
+backup_partition_buckets = 16
+
+# Each snapshot partition also has a sorted index of its encoded ACCT|CC|IO|CO|PC|ET|SCEN|VER|TYPE|YEAR keys
+# It lets a run binary-search for the exact intersections on its load sheet instead of scanning the partition
+backup_key_columns = ['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR']
+
+# Identical resubmissions (same load sheet, same dimension files and backup) replay the outputs of the earlier run
+# Entries older than run_cache_days are removed; bump run_cache_version whenever a change to this script alters its outputs
+use_run_cache = True
+run_cache_dir = os.path.join(share_root, 'Load_Files', 'RunCache')
+run_cache_days = 7
+run_cache_version = 4
+
+# Every dataframe written to an output anchor during the current run, as (anchor, dataframe)
+captured_outputs = []
+
+# How long each stage of the current run took, in seconds (see DataLoader.timed_stage)
+stage_durations = {}
+
+# Sizes measured during the current run (e.g., how many rows the load sheet melted into)
+run_statistics = {}
+
+# When False, outputs are only captured and never written (e.g., when fpa_replay.py replays a recorded submission)
+publish_outputs = True
+
+# Each run writes its output files in its own workspace folder and then renames them into place (see publish_output_file),
+# so concurrent runs never write to the same file and the Essbase batch never picks up a partial one
+# The workspaces are on the share because a rename can't move a file to another drive
+# A run removes its workspace when it exits; the ones left behind by runs that died are removed after run_workspace_hours
+run_workspaces_dir = os.path.join(share_root, 'Load_Files', 'Workspace')
+run_workspace_dir = os.path.join(run_workspaces_dir, run_id)
+run_workspace_hours = 24
+
+# The output file names that runs have reserved, in a folder for each minute (see claim_output_name)
+output_claims_dir = os.path.join(run_workspaces_dir, 'Claims')
+
+# Recorded submissions (see record_submission); fpa_replay.py reruns them offline
+recordings_dir = os.path.join(share_root, 'Load_Files', 'Recordings')
+
+# Every run appends its sheet size, stage durations, and outcome to a SQLite database on the local disk (see save_run_history)
+# fpa_run_history.py reports on it and flags the runs and stages that got slower
+run_history_db = os.environ.get('FPA_RUN_HISTORY_DB', os.path.join(os.environ.get('PROGRAMDATA', tempfile.gettempdir()), 'Automation-FPA', 'run_history.db'))
+
+# Options for a run; a headless run can override them from the command line (see get_headless_request)
+default_run_options = {
+    'shards':1,         # Number of load files to split a load into, so the Essbase batch can run the load rules in parallel
+    'shard_by':'ACCT',  # Dimension that decides each row's shard: ACCT (contiguous account ranges) or YEAR
+    'record':False,     # Record the submission's inputs and outputs so it can be replayed later (see record_submission); headless runs only (--record)
+    'reader':'stream',  # How a headless run reads load sheets: stream (see stream_load_sheet) or pandas (see read_load_sheet)
+    'backup':'snapshot',# Where the backup values come from: snapshot (the backup snapshot when it's current) or export (always the full export)
+    'backend':'pandas', # What runs the backup join and the member checks: pandas, or arrow (multi-threaded Acero query plans; see join_backup_values)
+    'block_rows':20000, # Sheet rows per block when an ExTO sheet is streamed through create_load_file (see stream_exto_load_file); 0 builds the load file whole
+    'anomaly_screen':True # Screen the loaded values against the backup values and report the outliers (see DataLoader.screen_anomalies)
+}
+
+# Cell text that the pandas reader reads as a null (pandas' default na_values); the streaming reader does the same
+excel_na_values = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+
+class LoadSheet:
+
+    # The load sheet as typed blocks, built when it's read (see split_load_sheet and read_load_sheet_streaming); no run ever builds a dataframe of the whole sheet
+    #   members:        The member columns (F1 - F9, plus the Year members in F10 on an ExTO sheet) as text, one row per data row,
+    #                   indexed by sheet row less 2 like the pandas reader's dataframe; validate_dimensions renames them to their dimensions
+    #   values:         The forecast region as a single float64 array; empty cells and cells that aren't numbers are NaN
+    #   value_headers:  The forecast columns' headers on the sheet (the year headers, or the months on an ExTO sheet)
+    #   value_columns:  The column number of each forecast column on the sheet (1 is column A)
+    #   label_row:      The month labels row, one cell per member and forecast column; None on an ExTO sheet, whose months are in the headers
+    #   text_cells:     (row, column, text) of every forecast cell that isn't a number, by position in values, so a non-numeric value is never lost
+    #   periods:        The (YEAR, PERIOD) members of each forecast column (see cleanup_load_sheet); YEAR is None on an ExTO sheet, whose years are in the rows
+    #   file_name, user_email: The FileName and UserEmail fields that Alteryx adds when it imports a sheet (see input_file_name)
+    # Empty rows and columns are dropped when the sheet is read
+    # The DataLoader cleans up and validates the blocks in place, so a caller that needs the sheet as it was read keeps a copy (see copy)
+    __slots__ = ('members', 'values', 'value_headers', 'value_columns', 'label_row', 'text_cells', 'periods', 'file_name', 'user_email')
+
+    def __init__(self, members, values, value_headers, value_columns, label_row, text_cells, file_name, user_email):
+
+        self.members = members
+        self.values = values
+        self.value_headers = value_headers
+        self.value_columns = value_columns
+        self.label_row = label_row
+        self.text_cells = text_cells
+        self.periods = None
+        self.file_name = file_name
+        self.user_email = user_email
+
+
+
+    def headers(self):
+
+        # The headers the way the Alteryx Input Data tool names them, with the FileName and UserEmail fields it adds at the end
+        return list(self.members.columns) + list(self.value_headers) + ['FileName','UserEmail']
+
+
+
+    def shape(self):
+
+        # Rows (the month labels row and the data rows) and columns (with the FileName and UserEmail fields), as the sheet's dataframe would have them
+        return (len(self.members.index) + (0 if self.label_row is None else 1), len(self.headers()))
+
+
+
+    def copy(self):
+
+        # A copy that a run can clean up and validate without changing this one (e.g., fpa_equivalence.py runs every sheet in several modes)
+        copied = LoadSheet(self.members.copy(), self.values.copy(), list(self.value_headers), list(self.value_columns),
+                           None if self.label_row is None else list(self.label_row), list(self.text_cells), self.file_name, self.user_email)
+        copied.periods = None if self.periods is None else list(self.periods)
+        return copied
+
+
+
+    def unpivot(self, rows=slice(None)):
+
+        # One row per data row and forecast column, in the same order as pd.melt (all of the rows for the first column, then the next)
+        # The member columns are repeated once per column and the values are read straight out of the float64 block
+        # rows limits the load file to a block of the sheet's rows (see DataLoader.get_exto_load_file_blocks)
+        members = self.members.iloc[rows]
+        values = self.values[rows]
+        row_count, column_count = values.shape
+        df = pd.DataFrame({dim: np.tile(members[dim].to_numpy(), column_count) for dim in members.columns})
+
+        if any(year is None for year, period in self.periods):
+            df['PERIOD'] = np.repeat(np.array([period for year, period in self.periods], dtype=object), row_count)
+        else:
+            df['YEAR'] = np.repeat(np.array([year for year, period in self.periods], dtype=object), row_count)
+            df['PERIOD'] = np.repeat(np.array([period for year, period in self.periods], dtype=object), row_count)
+
+        # The values are written the way they were entered on the sheet (e.g., 100, not 100.0)
+        df['DATA'] = format_forecast_values(values.ravel(order='F'))
+        df['FileName'] = self.file_name
+        df['UserEmail'] = self.user_email
+
+        return df
+
+
+
+class DataLoader:
+
+    print('Creating the DataLoader object...')
+    
+    def __init__(self, input_files, summary_info, run_options=None):
+        
+        self.user_id = summary_info['user_id']
+        self.user_email = summary_info['user_email']
+        self.workbook_name = summary_info['workbook_name']
+        self.load_sheet_name = summary_info['load_sheet_name']
+        self.enhanced_file_name = self.user_id + '_' + self.workbook_name + '_' + self.load_sheet_name + '.txt'
+        
+        self.summary_info = summary_info
+        self.input_files = input_files
+        self.run_options = run_options if run_options is not None else dict(default_run_options)
+
+        # The arrow backend needs pyarrow with Acero; without it the run uses pandas
+        self.backend = self.run_options.get('backend', default_run_options['backend'])
+        if self.backend == 'arrow' and pa_acero is None:
+            print('WARNING: pyarrow.acero is not available; the pandas backend will be used')
+            self.backend = 'pandas'
+        
+        self.load_sheet = self.input_files['LOADSHEET']
+        self.finstmt_backup = self.input_files['BACKUP']
+
+        # Member name and alias lookups, by dimension; built on first use (see get_member_lookup)
+        self.member_lookups = {}
+
+        # Year and month header spellings mapped to Year and Period members; built on first use (see get_calendar)
+        self.calendar = None
+
+        # Ancestors of every ACCT and CC member, by dimension; built on first use (see get_closure_table)
+        self.closure_tables = {}
+
+        # Member names and aliases that identify each dimension's column on the sheet; built on first use (see identify_dimension)
+        self.sheet_members = {}
+
+        # "Did you mean" indexes for invalid members, by dimension; built on first use (see get_suggestion_index)
+        self.suggestion_indexes = {}
+
+        # How long each stage took, in seconds (see timed_stage)
+        self.stage_durations = {}
+
+        # Number of rows the load sheet was melted into (see create_load_file)
+        self.melted_rows = None
+
+        # Number of blocks the load file was streamed in (see stream_exto_load_file); None when it wasn't streamed
+        self.load_file_blocks = None
+
+        # The load file, once the load sheet has been unpivoted (see create_load_file)
+        self.load_file = None
+        
+        print('DataLoader object created.')
+        
+        
+        
+    def validate_loadfile_name(self):
+    
+        print('Running validate_loadfile_name...')
+
+        print('Workbook name: ' + self.workbook_name)
+        print('Load Sheet name: ' + self.load_sheet_name)
+
+        # Ensure the combined workbook and load sheet names are not too long (more than 80 characters)
+        if len(self.workbook_name) + len(self.load_sheet_name) > 80:
+            
+            # Set error email info
+            error_email_info = {}
+            error_email_info['error_email_subject'] = 'WARNING: Load process failed - see attachment for details'
+            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
+            error_email_info['error_email_body'] = 'The load failed because the combined length of the workbook and load sheet names exceeds 80 characters. See the attachment for details. NOTE: No data on your sheet has been loaded.'
+            
+            error_log_entry = "Validation failed because the combined names of the workbook and load sheet exceed 80 characters. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
+            
+            print('Combined length of names = ' + str(len(self.workbook_name) + len(self.load_sheet_name)))
+            validation_errors = {}
+            validation_errors['workbook_name_error'] = 'The combined workbook and load sheet names exceed 80 characters'
+            validation_errors['workbook_name_length'] = 'Workbook name length: ' + str(len(self.workbook_name))
+            validation_errors['load_sheet_name_length'] = 'Load sheet name length: ' + str(len(self.load_sheet_name))
+            validation_errors_df = pd.DataFrame.from_dict(validation_errors, orient='index', columns=['Details'])
+            ret = self.create_error_file(validation_errors_df, error_email_info, error_log_entry)
+            print('The combined workbook and load sheet names exceed 80 characters')
+            return False
+        else:
+            print('The workbook and load sheet names are within their limits')
+            return True
+            
+            
+            
+    def validate_dimension_files(self):
+        
+        print("Running validate_dimension_files...")
+    
+        invalid_dim_files = {}
+
+        # Check the number of lines in each dataframe
+        # The files that populate the dataframes are from an external source and occassionally they are incomplete
+        # The numbers shown for each dimension reflect a fully complete file (in August 2022)
+        # If any of them are not complete, we can't use them to validate the members on the load sheet, and the load must be aborted
+        if len(self.input_files['ACCT'].index) < 2796:
+            invalid_dim_files['ACCT'] = 'The Account dimension file contains only ' + str(len(self.input_files['ACCT'].index)) + ' lines'
+
+        if len(self.input_files['CC'].index) < 1743:
+            invalid_dim_files['CC'] = 'The Cost Center dimension file contains only ' + str(len(self.input_files['CC'].index)) + ' lines'
+
+        if len(self.input_files['IO'].index) < 257:
+            invalid_dim_files['IO'] = 'The Internal Order dimension file contains only ' + str(len(self.input_files['IO'].index)) + ' lines'
+
+        if len(self.input_files['CO'].index) < 14:
+            invalid_dim_files['CO'] = 'The Company Code dimension file contains only ' + str(len(self.input_files['CO'].index)) + ' lines'
+
+        if len(self.input_files['PC'].index) < 535:
+            invalid_dim_files['PC'] = 'The Profit Center dimension file contains only ' + str(len(self.input_files['PC'].index)) + ' lines'
+
+        if len(self.input_files['ET'].index) < 11:
+            invalid_dim_files['ET'] = 'The Equipment Type dimension file contains only ' + str(len(self.input_files['ET'].index)) + ' lines'
+
+        if len(self.input_files['SCEN'].index) < 29:
+            invalid_dim_files['SCEN'] = 'The Scenario dimension file contains only ' + str(len(self.input_files['SCEN'].index)) + ' lines'
+
+        if len(self.input_files['VER'].index) < 26:
+            invalid_dim_files['VER'] = 'The Version dimension file contains only ' + str(len(self.input_files['VER'].index)) + ' lines'
+
+        if len(self.input_files['TYPE'].index) < 8:
+            invalid_dim_files['TYPE'] = 'The Type dimension file contains only ' + str(len(self.input_files['TYPE'].index)) + ' lines'
+
+        if len(self.input_files['YEAR'].index) < 29:
+            invalid_dim_files['YEAR'] = 'The Year dimension file contains only ' + str(len(self.input_files['YEAR'].index)) + ' lines'
+
+        if len(self.input_files['PERIOD'].index) < 112:
+            invalid_dim_files['PERIOD'] = 'The Period dimension file contains only ' + str(len(self.input_files['PERIOD'].index)) + ' lines'
+
+
+        # Create an error file if any dimension files are incomplete
+        if invalid_dim_files:
+
+            # Set error email info
+            error_email_info = {}
+            error_email_info['error_email_subject'] = 'WARNING: Load process failed - see attachment for details'
+            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
+            error_email_info['error_email_body'] = 'The load failed because at least one dimension validation file is missing or incomplete. See the attachment for details.  NOTE: No data on your sheet has been loaded.'
+
+            error_log_entry = "Validation failed because one or more dimension files are either missing or incomplete. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
+
+            invalid_dim_files_df = pd.DataFrame.from_dict(invalid_dim_files, orient='index', columns=['Details'])
+            ret = self.create_error_file(invalid_dim_files_df, error_email_info, error_log_entry)
+            print('At least one dimension file is incomplete')
+            return False
+        else:
+            logging.info("Dimension files validated.")
+            print("Dimension files validated.")
+            return True
+
+        
+    
+    def get_time_labels(self):
+        
+        print("Running get_time_labels...")
+
+        load_sheet = self.load_sheet
+        if load_sheet.label_row is None:
+            # Put the month headers into a new dataframe (ExTO data has no month labels row)
+            months_labels = pd.DataFrame({'PERIOD':load_sheet.value_headers})
+
+            #return the new dataframe
+            return months_labels
+        else:
+            # The month label of each forecast column, with its year header (the headers are the index)
+            # Columns without a month label (a 0 written by cleanup_load_sheet) are left out; they're flagged by the layout rules
+            member_count = len(load_sheet.members.columns)
+            months_years_labels = pd.DataFrame({'index':load_sheet.value_headers, 'PERIOD':load_sheet.label_row[member_count:]})
+            cond1 = months_years_labels['PERIOD'] != 0
+            cond2 = months_years_labels['PERIOD'] != ''
+            cond3 = months_years_labels['PERIOD'].notna()
+            months_years_labels = months_years_labels[cond1 & cond2 & cond3]
+
+            # Drop the _## suffixes from the year labels
+            months_years_labels['YEAR'] = months_years_labels['index'].str.replace(r'_.*','', regex=True)
+
+            #return the new dataframe
+            return months_years_labels
+
+    
+    
+    def create_capacity_flag_file(self, df, version, load_flag_value):
+        
+        print("Running create_capacity_flag_file...")
+    
+        df = df.join(pd.DataFrame(
+        {
+            'ACCT':'CL:09962',
+            'CC':'CC:None',
+            'IO':'IO:None',
+            'CO': 'CO:9001',
+            'PC':'PC:1000',
+            'ET':'ET:None',
+            'SCEN':'Forecast',
+            'VER':version,
+            'TYPE':'Amount',
+            'DATA':load_flag_value,
+            'FileName':claim_output_name('_' + str(current_datetime), 'CapacityFlags')
+        }, index = df.index
+        ))
+
+        # Reorder the columns to match the load rule
+        df = df[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName']]
+
+        return df
+
+
+    
+    def process_backup_file(self, load_sheet_members, load_sheet_keys=None):
+    
+        print('Running process_backup_file...')
+
+        # Use the memory-mapped snapshot when the run's backup source is the snapshot; only the rows for the load sheet's members are copied out of it
+        # The source was decided once when the inputs were read (see get_backup_source), so a refreshed export can't switch it mid-run
+        backup_snapshot = self.input_files['BACKUP_SOURCE']['snapshot']
+
+        # The arrow backend doesn't filter or melt the backup here; it returns the first steps of the query plan
+        # that joins the backup to the load file, and the plan runs in join_backup_values
+        if self.backend == 'arrow':
+            return plan_backup_source(backup_snapshot, self.finstmt_backup, load_sheet_members, load_sheet_keys)
+
+        if not backup_snapshot is None:
+            self.finstmt_backup = read_backup_snapshot(backup_snapshot, load_sheet_members, load_sheet_keys)
+            self.finstmt_backup['FileName'] = 'CORPPLN_Forecast_CY'
+        else:
+            self.finstmt_backup = self.filter_backup_file(load_sheet_members)
+
+        print('Backup file size after filtering:')
+        print(self.finstmt_backup.shape)
+        print(self.finstmt_backup.info())
+
+        # Melt all of the year_month headers into a new column named Combo_Period
+        # Intentionally omit the "value_vars" parameter here, which causes all of the remaining columns to be namelessly melted
+        # This is perfect because you never know how many months columns there will be, or which year(s) are being loaded
+        self.finstmt_backup = pd.melt(self.finstmt_backup, id_vars=['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','FileName'], var_name='PERIOD',value_name='DATA')
+
+        # Reorder the columns
+        self.finstmt_backup = self.finstmt_backup[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName']]
+
+        print('Backup file size after melting:')
+        print(self.finstmt_backup.shape)
+        print(self.finstmt_backup.info())
+
+        return self.finstmt_backup
+
+
+
+    def filter_backup_file(self, load_sheet_members):
+
+        print('Running filter_backup_file...')
+
+        # Create the column headers
+        self.finstmt_backup.columns = backup_columns + ['FileName']
+
+        print('Backup file size before processing:')
+        print(self.finstmt_backup.shape)
+        print(self.finstmt_backup.info())
+
+        # Limit the data to the members on the load sheet
+        cond1 = self.finstmt_backup['ACCT'].isin(load_sheet_members['acct'].tolist())
+        cond2 = self.finstmt_backup['CC'].isin(load_sheet_members['cc'].tolist())
+        cond3 = self.finstmt_backup['IO'].isin(load_sheet_members['io'].tolist())
+        cond4 = self.finstmt_backup['CO'].isin(load_sheet_members['co'].tolist())
+        cond5 = self.finstmt_backup['PC'].isin(load_sheet_members['pc'].tolist())
+        cond6 = self.finstmt_backup['ET'].isin(load_sheet_members['et'].tolist())
+        cond7 = self.finstmt_backup['SCEN'].isin(load_sheet_members['scen'].tolist())
+        cond8 = self.finstmt_backup['VER'].isin(load_sheet_members['ver'].tolist())
+        cond9 = self.finstmt_backup['TYPE'].isin(load_sheet_members['type'].tolist())
+        cond10 = self.finstmt_backup['YEAR'].isin(load_sheet_members['year'].tolist())
+
+        return self.finstmt_backup[cond1 & cond2 & cond3 & cond4 & cond5 & cond6 & cond7 & cond8 & cond9 & cond10]
+
+    
+    
+    def process_date_month_labels(self, column_header):
+        
+        print('Running process_date_month_labels...')
+
+        print('Incoming header column:')
+        print(column_header)
+
+        # Convert a year_month header to member names (e.g., 'FY 2021_January' to 'FY21_Jan') with the calendar table
+        # Headers that aren't an accepted year and month spelling are returned as-is
+        year_label, separator, month_label = str(column_header).rpartition('_')
+        calendar_header = lookup_calendar_header(self.get_calendar(), year_label, month_label)
+        if not calendar_header is None:
+            return calendar_header
+        else:
+            return column_header
+    
+    
+
+    def add_email_columns(self, df, user_email):
+        
+        print('Running add_email_columns...')
+        
+        # Note: This function is called by the 'create_error_file' function only
+        # The email field in the dataframe for the load sheet was created by Alteryx when the sheet was imported
+    
+        # Create new columns in the dataframe for email addresses (one column for the primary recipient, and one for the cc:)
+        # If the user's eID was found in the name of the load file, add the user's email address as the primary recipient
+        # If the user's eID was not found, make me the primary recipient
+        # If the user is the primary recipient, put my address in the cc column; if I'm the primary, leave the cc: column empty
+
+        if not user_email is None:
+            if not 'UserEmail' in df.columns:
+                df['UserEmail'] = user_email
+            df['ccEmail'] = 'e79230@wnco.com'
+        else:
+            if not 'UserEmail' in df.columns:
+                df['UserEmail'] = 'e79230@wnco.com'
+            df['ccEmail'] = None
+
+        return df   
+    
+
+
+    def cleanup_load_sheet(self):
+    
+        print("Running cleanup_load_sheet...")
+
+        #user_id = self.user_id
+        #workbook_name = self.workbook_name
+        #load_sheet_name = self.load_sheet_name
+
+        load_sheet = self.load_sheet
+        member_count = len(load_sheet.members.columns)
+        
+        print("Before cleanup:")
+        print(load_sheet.members.head())
+
+        # The empty rows and columns were dropped when the sheet was read (see split_load_sheet and stream_load_sheet)
+        print('Load sheet shape: ' + str(load_sheet.shape()))
+
+        ##################################################################################################################
+        # Fill all empty cells if AND ONLY IF the initial F1 - F9 and FY* column headers are correct (F1 - F10 on an ExTO sheet)
+        # If the headers are incorrect, leave the sheet alone and let it fail the validation process
+        headers = load_sheet.headers()
+        print('Year column headers:')
+        print(headers)
+        if (len(headers) > 9 and headers[0] == 'F1' and headers[8] == 'F9' and calendar_key(headers[9]).startswith('FY')) or \
+        (load_sheet.label_row is None and len(headers) > 10 and headers[0] == 'F1' and headers[9] == 'F10'):
+            print('Writing empty strings in empty member cells...')
+            load_sheet.members = load_sheet.members.fillna('')  # Fill the empty member cells (Columns 1 through 9, or 10) with empty strings
+            load_sheet.values[np.isnan(load_sheet.values)] = 0  # Fill the empty forecast cells with zeroes (the cells that aren't numbers are kept in text_cells)
+            if not load_sheet.label_row is None:
+                # On the month labels row, the member cells get empty strings and the forecast cells without a month label get zeroes
+                load_sheet.label_row = ['' if label is None else label for label in load_sheet.label_row[:member_count]] + \
+                                       [0 if label is None else label for label in load_sheet.label_row[member_count:]]
+            print('Members after filling empty cells:')
+            print(load_sheet.members.head())
+            print('')
+        ##################################################################################################################
+
+        # Verify the user entered their eID; if not, use mine
+        print('Incoming user email: ' + load_sheet.user_email)
+        if len(load_sheet.user_email) == 9:
+            load_sheet.user_email = 'e79230@wnco.com'
+            logging.warning("UserEmail was FORCED to e79230@wnco.com")
+            print('WARNING: UserEmail was FORCED to e79230@wnco.com')
+        
+        # Convert the year and month headers to be member names, not aliases (e.g., 'FY 2024' to 'FY24' and 'January' to 'Jan')
+        # This is done to ensure proper index matching with the CORPPLN_Forecast_CY (FIN_STMT) backup file
+        # Every accepted spelling is in the calendar table (see build_calendar_table)
+        calendar = self.get_calendar()
+        value_headers = list(load_sheet.value_headers)
+        label_row = None if load_sheet.label_row is None else list(load_sheet.label_row)
+        for j, header in enumerate(value_headers):
+            year_member = calendar['years'].get(calendar_key(header))
+            if not year_member is None:
+                # If the year label had a suffix, reappend it (because it makes the label unique in the index)
+                year_suffix = re.search(r'_\d+$', header)
+                if not year_suffix is None:
+                    value_headers[j] = year_member + year_suffix.group(0)
+                else:
+                    value_headers[j] = year_member + '_1'
+
+                if not label_row is None:
+                    period_member = lookup_calendar_period(calendar, label_row[member_count + j])
+                    if not period_member is None:
+                        label_row[member_count + j] = period_member
+                    else:
+                        print('No month label match on ' + str(label_row[member_count + j]))
+            else:
+                print('No year label match on ' + str(header))
+        load_sheet.value_headers = value_headers
+        load_sheet.label_row = label_row
+
+        # The Year and Period members of each forecast column; on an ExTO sheet the months are the headers and the years are in the rows
+        if label_row is None:
+            load_sheet.periods = [(None, header) for header in value_headers]
+        else:
+            load_sheet.periods = [(calendar['years'].get(calendar_key(header)), lookup_calendar_period(calendar, label)) for header, label in zip(value_headers, label_row[member_count:])]
+
+        print("After cleanup:")
+        print(value_headers)
+
+        return True
+
+    
+    
+    def timed_stage(self, stage_name, stage_function, *stage_args):
+
+        # Runs one stage of the process and records how long it took; the stage's return value is passed through
+        start_time = time.perf_counter()
+        try:
+            return stage_function(*stage_args)
+        finally:
+            self.stage_durations[stage_name] = time.perf_counter() - start_time
+
+    
+    
+    def validation_and_cleanup(self):
+        
+        print('Running validation_and_cleanup...')
+        
+        if self.timed_stage('validate_loadfile_name', self.validate_loadfile_name) == False:
+            return False
+
+        if self.timed_stage('validate_dimension_files', self.validate_dimension_files) == False:
+            return False
+
+        if self.timed_stage('cleanup_load_sheet', self.cleanup_load_sheet) == False:
+            return False
+
+        
+
+    def process_load_sheet(self):
+    
+        print('Running process_load_sheet...')
+
+        #this_function_name = sys._getframe(  ).f_code.co_name  <=== This works, but there's currently no need for it
+
+        print("Before processing:")
+        print(self.load_sheet.members.head())
+        
+        # The layout rules, the duplicate check and the member checks all work on the load sheet's member and forecast blocks (see LoadSheet)
+        if self.timed_stage('preliminary_validation', self.preliminary_validation) == False:
+            return False
+
+        # Check the load sheet for duplicate rows
+        # Note: If duplicate rows are found, a partial load file will NOT be created
+        if self.timed_stage('duplicate_rows', self.duplicate_rows) == True:
+            return False
+
+        # Check the load sheet for invalid members
+        if self.timed_stage('validate_dimensions', self.validate_dimensions) == False:
+            return False
+
+        # Create the load file(s)
+        # Note: Loading Current Capacity creates a second text load file, which contains flag values 
+        if self.timed_stage('create_load_file', self.create_load_file) == True:
+            return True
+        else:
+            return False
+
+    
+    
+    def preliminary_validation(self):
+        
+        # This is a *high-level* eye test of whether the load sheet generally follows the layout/format requirements
+        # The purpose of this validation is to catch any obvious problems that need to be fixed by the sheet's creator
+        # Even if this validation is successful, additional validations that are more thorough will be done in subsequent steps
+
+        print('Running preliminary_validation...')
+        print('')
+        print('Preliminary load sheet:')
+        print(self.load_sheet.members.head())
+        
+        # The first nine cells on the month labels row should contain empty strings (written there by cleanup_load_sheet)
+        if not self.load_sheet.label_row is None:
+            z = str(self.load_sheet.label_row[0:9].count(''))
+            print(f'The number of empty strings before the first column header is {z}')
+
+            z = str(self.load_sheet.label_row[0:9].count(None))
+            print(f'The number of empty cells before the first column header is {z}')
+        
+        # Evaluate every layout rule and collect all of the violations into a single report
+        # See validation_rules (and exto_validation_rules) at the top of the script
+        invalid_dims, invalid_cells = evaluate_validation_rules(self.load_sheet, get_validation_rules(self.load_sheet))
+                
+        # Create an error file if any dimensions were flagged
+        if invalid_dims:
+            # Set error email info
+            error_email_info = {}
+            error_email_info['error_email_subject'] = 'WARNING: Load process failed - see attachment for details'
+            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
+            error_email_info['error_email_body'] = 'The load process failed. Please see the attachment for details. \n\n NOTE: No data on your sheet has been loaded.'
+
+            error_log_entry = "The preliminary validation failed. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
+
+            invalid_dims_df = pd.DataFrame.from_dict(invalid_dims, orient='index', columns=['Details'])
+
+            # List the cells to fix (e.g., each non-numeric Forecast value) under the messages
+            if invalid_cells:
+                error_email_info['error_email_body'] = 'The load process failed. Please see the attachment for details; the cells to fix are listed by sheet row and column. \n\n NOTE: No data on your sheet has been loaded.'
+                invalid_dims_df = pd.concat([invalid_dims_df] + [df_cells.assign(Details=rule_name).set_index(pd.Index([rule_name] * len(df_cells.index))) for rule_name, df_cells in invalid_cells.items()])
+
+            ret = self.create_error_file(invalid_dims_df, error_email_info, error_log_entry)
+            return False
+        else:
+            logging.info("Worksheet meets layout rules.")
+            print("Worksheet meets layout rules.")
+            return True      
+
+        
+        
+    def get_member_lookup(self, dimension):
+
+        # Maps every level-zero member name and alias in a dimension's doc file to its member name (see dimension_specs)
+        # Each dimension has its own lookup, since the same alias can name different members in two dimensions
+        # Where a member name is also another member's alias, the member name wins
+        if not dimension in self.member_lookups:
+            dim_members = self.input_files[dimension_specs[dimension]['extract']]
+            dim_members = dim_members[dim_members['Level'] == '0']
+            dim_aliases = dim_members.dropna(subset=['Alias: Default'])
+            member_lookup = pd.concat([pd.Series(dim_members['Member Name'].values, index=dim_members['Member Name'].values),
+                                       pd.Series(dim_aliases['Member Name'].values, index=dim_aliases['Alias: Default'].values)])
+            self.member_lookups[dimension] = member_lookup[~member_lookup.index.duplicated()]
+
+        return self.member_lookups[dimension]
+
+    
+
+    def get_calendar(self):
+
+        # The calendar table is built once per run from the Year doc file and the month spellings (see build_calendar_table)
+        # Header cleanup, the Year validation and the unpivot all look up the same table
+        if self.calendar is None:
+            self.calendar = build_calendar_table(self.input_files['YEAR'])
+
+        return self.calendar
+
+
+
+    def get_closure_table(self, dimension):
+
+        # The closure table of a dimension's hierarchy is built once per run from its Outline Extractor doc file (see build_closure_table)
+        if not dimension in self.closure_tables:
+            self.closure_tables[dimension] = build_closure_table(self.input_files[dimension])
+
+        return self.closure_tables[dimension]
+
+    
+    
+    def duplicate_rows(self):
+    
+        print('Running duplicate_rows...')
+
+        member_columns = list(self.load_sheet.members.columns)
+        members = self.load_sheet.members
+        
+        # Determine if there are any duplicate rows (based on combining the values in the member columns as a key: 9 columns, or 10 on an ExTO sheet)
+        # Each row's key is hashed to a single 64-bit value, so one hash table pass finds the duplicates without sorting the sheet
+        raw_keys = pd.util.hash_pandas_object(members, index=False)
+        cond1 = raw_keys.duplicated(keep=False)
+
+        # Rows can also be duplicates once their aliases are resolved to member names (e.g., 'Non Operating (40001)' and 'CC:40001')
+        # Each column is resolved with the lookup of the dimension its layout rule checks (see get_validation_rules)
+        column_dimensions = {rule['column']: rule['name'] for rule in get_validation_rules(self.load_sheet) if rule['check'] in ['member_pattern','member_list']}
+        resolved_members = pd.DataFrame({col: members[col].map(self.get_member_lookup(column_dimensions[col])).fillna(members[col]) for col in member_columns})
+        resolved_keys = pd.util.hash_pandas_object(resolved_members, index=False)
+        cond2 = resolved_keys.duplicated(keep=False)
+
+        # Only the duplicate rows are laid out as sheet rows (their members, forecast values and input fields)
+        duplicate_positions = np.flatnonzero((cond1 | cond2).to_numpy())
+        duplicate_rows = self.load_sheet.members.iloc[duplicate_positions].copy()  # Create a COPY of the members to prevent the SettingWithCopyWarning issue
+
+        # The forecast cells are written the way they were entered on the sheet (e.g., 100, not 100.0)
+        for j, header in enumerate(self.load_sheet.value_headers):
+            duplicate_rows[header] = format_forecast_values(self.load_sheet.values[duplicate_positions, j])
+        duplicate_rows['FileName'] = self.load_sheet.file_name
+        duplicate_rows['UserEmail'] = self.load_sheet.user_email
+
+        # Add columns for the row number and type of duplicate, and move them to the first positions
+        duplicate_rows.insert(0, 'RowNumber', duplicate_rows.index + 2)
+        duplicate_rows.insert(1, 'DuplicateType', np.where(cond1.to_numpy()[duplicate_positions], 'Duplicate', 'Duplicate after alias resolution'))
+
+        # Only the duplicate rows are sorted, so each set of duplicates is listed together
+        duplicate_rows['ResolvedKey'] = resolved_keys.to_numpy()[duplicate_positions]
+        duplicate_rows = duplicate_rows.sort_values(by=['ResolvedKey','RowNumber']).drop(columns=['ResolvedKey'])
+
+        print('Duplicate rows df:')
+        print(duplicate_rows.head())
+
+        # If any duplicates were found, create a file containing all of the duplicate rows for the user to fix
+        # Do NOT create a load file
+        if len(duplicate_rows.index) > 0:
+
+            # Set error email info
+            error_email_info = {}
+            error_email_info['error_email_subject'] = 'WARNING: Load process failed - duplicate rows found on the load sheet'
+            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
+            error_email_info['error_email_body'] = """Duplicate account/cost center/internal order combinations were found on the load sheet.  
+            The first column in the attachment shows the row numbers on the sheet where the duplicates were found.  
+            Rows marked "Duplicate after alias resolution" use an alias on one row and the member name (or another alias) on the other.  
+            Please delete the appropriate rows from the sheet and repeat the load process.
+            NOTE: No data on your sheet has been loaded."""
+
+            error_log_entry = "Validation failed because of duplicate rows on the load sheet. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
+
+            ret = self.create_error_file(duplicate_rows, error_email_info, error_log_entry)
+            return True
+        else:
+            logging.info("No duplicate rows found.")
+            print("No duplicate rows found.")
+            return False
+    
+    
+    
+    def validate_dimensions(self):
+    
+        print('Running validate_dimensions...')
+
+        # Get the year and month labels from the headers
+        # NOTE: For ExTO load files, get the month labels only
+        time_labels = self.get_time_labels()
+
+        # Only the member columns are identified and validated; the forecast columns' Year and Period members were parsed by cleanup_load_sheet
+        members = self.load_sheet.members
+
+        # Every dimension's members are checked against its doc file on the thread pool (see dimension_specs)
+        # The checks don't depend on each other, so each one is submitted as soon as its column is identified
+        # and the validation takes about as long as the slowest dimension
+        executor = ThreadPoolExecutor(max_workers=dimension_validation_workers)
+        try:
+            validations = {}
+
+            # For all load files other than ExTO, validate the year and month labels in the headers
+            # In ExTO load files the Year members are in the rows, so they're validated with the other columns below
+            if not self.load_sheet.label_row is None:
+                validations['Years'] = executor.submit(self.validate_members, time_labels['YEAR'], 'Years')
+            validations['Period'] = executor.submit(self.validate_members, time_labels['PERIOD'], 'Period')
+
+            # Each member column is renamed to the header of the dimension whose members it contains
+            sheet_dimensions = []
+            member_headers = list(members.columns)
+            for n, header in enumerate(member_headers):
+                dimension = self.identify_dimension(members[header])
+                if not dimension is None:
+                    sheet_dim_header = dimension_specs[dimension]['header']
+                    member_headers[n] = sheet_dim_header
+                    s_members = members[header]
+                    validations[dimension] = executor.submit(self.validate_members, s_members[s_members != ''].rename(sheet_dim_header), dimension) # Filter out the empty cells
+                    sheet_dimensions.append(dimension)
+                else:
+                    pass # Leave the header as-is (even if it appears to be wrong - it will be flagged during validation)
+            members.columns = member_headers
+
+            validations = {dimension: validation.result() for dimension, validation in validations.items()}
+
+            # Where a valid dimension has aliases on the sheet, replace them with their member names
+            # The member names are looked up concurrently, and each column keeps its rows in the sheet's order, so they still line up with the forecast values
+            alias_dimensions = [dimension for dimension in sheet_dimensions if dimension_specs[dimension]['resolve_aliases'] and validations[dimension].empty == True and \
+                                re.match(dimension_specs[dimension]['signature'], str(members[dimension_specs[dimension]['header']].iloc[0])) is None]
+            member_names = {dimension: executor.submit(self.get_member_names, members[dimension_specs[dimension]['header']], dimension) for dimension in alias_dimensions}
+            for dimension in alias_dimensions:
+                members[dimension_specs[dimension]['header']] = member_names[dimension].result()
+
+        finally:
+            executor.shutdown(wait=True)
+
+        print('Members with new headers:')       
+        print(members.head())
+
+        # Every dimension must have been identified above
+        # A column is left unidentified if it doesn't contain at least one valid member (and thus its dimension header is missing)
+        missing_dims = {dimension: 'No column on the load sheet was identified as ' + dimension + ' (' + dimension_specs[dimension]['header'] + '). Check that the column exists and contains valid members.' \
+                        for dimension in dimension_specs if dimension_specs[dimension]['header'] in ['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE'] and not dimension_specs[dimension]['header'] in members.columns}
+        if missing_dims:
+
+            # Set error email info
+            error_email_info = {}
+            error_email_info['error_email_subject'] = 'WARNING: Load process failed - see attachment for details'
+            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
+            error_email_info['error_email_body'] = 'The load process failed. Please see the attachment for details. \n\n NOTE: No data on your sheet has been loaded.'
+
+            error_log_entry = "Validation failed because at least one dimension column was not found on the load sheet. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
+
+            missing_dims_df = pd.DataFrame.from_dict(missing_dims, orient='index', columns=['Details'])
+            ret = self.create_error_file(missing_dims_df, error_email_info, error_log_entry)
+            return False
+
+
+        # If ANY of the dimension validations failed, create a file containing all of the invalid members for the user to fix
+        # Do NOT create a load file
+        # The invalid members are listed dimension by dimension, in the order of dimension_specs
+        invalid_members = {dimension: validations[dimension] for dimension in dimension_specs if dimension in validations and validations[dimension].empty == False}
+        if invalid_members:
+                    
+            # Set error email info
+            error_email_info = {}
+            error_email_info['error_email_subject'] = 'WARNING: Load process failed - invalid Essbase members found on the load sheet'
+            error_email_info['error_email_filepath'] = r'\\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors\Validation_Errors_' + self.enhanced_file_name
+            error_email_info['error_email_body'] = """The attached file contains a list of the invalid Essbase members found on the load sheet.
+            Invalid members are those that do not have an exact match in SWA_RPT.
+            Discrepancies are often caused by capitalization, special characters, and space characters.
+            When a close match was found, it's shown in the "Did you mean" column.
+            Please correct the load sheet and repeat the load process. \n \n
+            NOTE: No data on your sheet has been loaded."""
+
+            error_log_entry = "Validation failed because of invalid members on the load sheet. For details see Validation_Errors_" + self.enhanced_file_name + r" at \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Validation_Errors"
+                    
+            invalid_members_df = pd.concat(df_dim for df_dim in invalid_members.values())  # Concatenate the dataframes into a single one
+            ret = self.create_error_file(invalid_members_df, error_email_info, error_log_entry)
+            print('At least one dimension file is incomplete')
+            return False
+
+        else:
+            # The load sheet's member columns now have their dimension headers and member names (see create_load_file)
+            logging.info("All members validated.")
+            print("All members validated.")
+            return True
+    
+   
+
+    def get_dimension_members(self, dimension):
+
+        # The level-zero members of a dimension's doc file that may be loaded, after the dimension's restrictions (see dimension_specs)
+        spec = dimension_specs[dimension]
+        dim_members = self.input_files[spec['extract']]
+        if not spec['data_storage'] is None:
+            dim_members = dim_members[dim_members['Data Storage'].str.upper().isin(spec['data_storage'])]
+        if not spec['allowed_members'] is None:
+            dim_members = dim_members[dim_members['Member Name'].str.upper().isin(spec['allowed_members'])]
+        if spec['open_years']:
+            dim_members = dim_members[dim_members['Member Name'].isin(self.get_calendar()['open_years'])]
+
+        return dim_members[dim_members['Level'] == spec['level']]
+
+
+
+    def identify_dimension(self, s_column):
+
+        # The dimension whose sheet members appear in a load sheet column (see dimension_detection_order), or None
+        for dimension in dimension_detection_order:
+            if not dimension in self.sheet_members:
+                spec = dimension_specs[dimension]
+                if spec['sheet_members'] is None:
+                    dim_file = self.input_files[spec['extract']]
+                    self.sheet_members[dimension] = dim_file['Member Name'].tolist() + dim_file['Alias: Default'].tolist()
+                else:
+                    self.sheet_members[dimension] = spec['sheet_members']
+            if s_column.isin(self.sheet_members[dimension]).any():
+                return dimension
+
+        return None
+
+
+
+    def validate_members(self, s_load_sheet_members, dimension):
+        
+        print('Running validate_members...')
+    
+        # The members that may be loaded in the dimension (see dimension_specs)
+        dim_members = self.get_dimension_members(dimension)
+        sheet_dim_header = dimension_specs[dimension]['header']
+
+        f_load_sheet_members = s_load_sheet_members.to_frame()
+
+        # This command: print(f_load_sheet.iloc[0,0].contains('FY[2-9][0-9]',regex=True))
+        # Creates this error: "AttributeError: 'str' object has no attribute 'contains' ""
+        # NOTE REGARDING THE ERROR: 
+        # The str method/object is for a pandas Series BUT NOT FOR A SINGLE ELEMENT OF A SERIES (even though that element is a string)
+        # By subscripting a series with [0] you are getting an element of the series. 
+
+        f_dim_members = dim_members[['Member Name','Alias: Default']]
+
+        # Look at the members on the load sheet to see if they're member names or aliases (see the dimension's signature)
+        if f_load_sheet_members[sheet_dim_header].astype(str).str.contains(dimension_specs[dimension]['signature'], regex=True).any():
+            dim_members_join_field = 'Member Name'
+        else:
+            dim_members_join_field = 'Alias: Default'
+
+        if self.backend == 'arrow':
+            # Only whether each member is in the dim file matters, so the arrow backend does a semi-join instead of the merge
+            # Nulls match nulls, the same way the merge matches them
+            cond1 = pa_compute.is_in(pa.array(f_load_sheet_members[sheet_dim_header], type=pa.string(), from_pandas=True),
+                                     value_set=pa.array(f_dim_members[dim_members_join_field], type=pa.string(), from_pandas=True), skip_nulls=False)
+            cond3 = f_load_sheet_members[sheet_dim_header].str.upper().isin(['MAY']) # Filter out the anomalies
+            invalid_members = f_load_sheet_members[~ cond1.to_numpy(zero_copy_only=False) & ~ cond3]
+        else:
+            # Join the list of members from the load sheet to the members in the dim file
+            f_load_sheet_members = f_load_sheet_members.merge(f_dim_members, how='left', left_on=sheet_dim_header, right_on=dim_members_join_field)
+
+            # Rows where the member name AND alias are both NaN indicate invalid members on the load sheet
+            cond1 = f_load_sheet_members['Member Name'].isnull()
+            cond2 = f_load_sheet_members['Alias: Default'].isnull()
+            cond3 = f_load_sheet_members[sheet_dim_header].str.upper().isin(['MAY']) # Filter out the anomalies
+            invalid_members = f_load_sheet_members[(cond1 & cond2) & ~ cond3]
+
+            # Drop the Member Name and Alias columns
+            invalid_members = invalid_members.drop(columns=['Member Name','Alias: Default'])
+
+        # Drop all duplicate invalid members
+        # Create a standard column name for all dimensions
+        invalid_members = invalid_members.drop_duplicates()
+        invalid_members.columns = ['Invalid Members']
+
+        # Suggest the valid member each invalid one most likely meant, spelled the way the sheet spells the dimension
+        suggestion_index = self.get_suggestion_index(f_dim_members, dimension)
+        invalid_members['Did you mean'] = normalize_member_keys(invalid_members['Invalid Members']).map(suggestion_index[dim_members_join_field])
+
+        invalid_members = invalid_members.sort_values(by=['Invalid Members'])
+
+        return invalid_members
+
+
+
+    def get_suggestion_index(self, f_dim_members, dimension):
+
+        # Index from normalized keys (see normalize_member_keys) to the valid member names and aliases of a dimension
+        # It's built once per dimension, so each invalid member costs a single hash lookup instead of a scan of the doc file
+        if not dimension in self.suggestion_indexes:
+            member_names = f_dim_members['Member Name'].reset_index(drop=True)
+            aliases = f_dim_members['Alias: Default'].reset_index(drop=True)
+
+            # Key every member by both its member name and its alias; member names win when two keys collide
+            keys = pd.concat([normalize_member_keys(member_names), normalize_member_keys(aliases.dropna())])
+            keep = ~keys.duplicated()
+            keys = keys[keep]
+
+            suggestion_index = {}
+            suggestion_index['Member Name'] = pd.Series(member_names[keys.index].to_numpy(), index=keys.to_numpy())
+            suggestion_index['Alias: Default'] = pd.Series(aliases.fillna(member_names)[keys.index].to_numpy(), index=keys.to_numpy())
+            self.suggestion_indexes[dimension] = suggestion_index
+
+        return self.suggestion_indexes[dimension]
+
+    
+    
+    def get_member_names(self, s_load_sheet_members, dimension):
+        
+        print('Running get_member_names...')
+    
+        # The members that may be loaded in the dimension (see dimension_specs)
+        dim_members = self.get_dimension_members(dimension).dropna(subset=['Alias: Default'])
+
+        # Look up the member name of every alias on the load sheet; the result is in the same order as the sheet's rows
+        # An alias that names more than one member resolves to the first of them
+        alias_lookup = pd.Series(dim_members['Member Name'].values, index=dim_members['Alias: Default'].values)
+        alias_lookup = alias_lookup[~alias_lookup.index.duplicated()]
+
+        return s_load_sheet_members.map(alias_lookup)
+    
+    
+    
+    def create_load_file(self):
+    
+        # This function produces one or more text files that will be loaded into FIN_STMT
+
+        print('Running create_load_file...')
+        
+        # Test the handling of a runtime error outside of a try/except block
+        #z = 1/0
+
+        # Continue with the steps to create the load file...
+        # An ExTO sheet is the only one without a month labels row (see LoadSheet)
+        if self.load_sheet.label_row is None:
+            # This is the ExTO adjustments data (it is the only source file with Equipment Type in the first column)
+            # NOTE: Unlike the load files coming from users, this one already has Year in the rows
+
+            # A large ExTO sheet can be processed and written in blocks instead (sharded load files are always built whole)
+            if self.run_options.get('block_rows', default_run_options['block_rows']) > 0 and self.run_options.get('shards', default_run_options['shards']) == 1:
+                return self.stream_exto_load_file()
+
+            # Unpivot the months into the rows (the validated member columns include Year) and then reorder the columns
+            self.load_file = self.load_sheet.unpivot()
+            self.load_file = self.load_file[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName','UserEmail']]
+            self.load_file['SCEN'] = 'Actual'  # Replace Flash_Base with Actual in the ExTO file
+            self.load_file['VER'] = 'Final'    # Replace Working with Final in the ExTO file
+            self.melted_rows = len(self.load_file.index)
+        else:
+            # Unpivot every forecast column into the rows, with the Year and Period members parsed from its headers (see cleanup_load_sheet)
+            # The member columns were validated in place, so aliases are loaded as member names
+            # You never know how many month columns there will be, or which year(s) are being loaded
+
+            print('Load sheet members before unpivoting:')
+            print(self.load_sheet.members.head())
+
+            self.load_file = self.load_sheet.unpivot()
+
+            print('Load file df after unpivoting:')
+            print(self.load_file.head())
+            self.melted_rows = len(self.load_file.index)
+
+            # The months being loaded, in the order of the columns on the sheet
+            unique_periods = pd.DataFrame(self.load_sheet.periods, columns=['YEAR','PERIOD']).drop_duplicates()
+
+            # Reorder the new columns
+            self.load_file = self.load_file[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName','UserEmail']]
+
+        # Reorder the new columns
+        self.load_file = self.load_file[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName','UserEmail']]
+
+        # The dataframe already includes a column named 'FileName'
+        # Append the file type to the front of the filename and a timestamp to the end
+        # The name is claimed for this run, so another run in the same minute can't publish a file with the same name (see claim_output_name)
+        if all(self.load_file['VER'].isin(['Current Capacity'])):
+            if all(self.load_file['CC'].isin(['CC:40001','Non Operating (40001)'])):
+                self.load_file['FileName'] = claim_output_name('CurrentCapacity_Load_FleetOnly_' + self.workbook_name + '_' + str(current_datetime))
+                load_flag_value = 2 
+            else:
+                self.load_file['FileName'] = claim_output_name('CurrentCapacity_Load_' + self.workbook_name + '_' + str(current_datetime))
+                load_flag_value = 1
+        elif all(self.load_file['SCEN'].isin(['Actual'])):
+            # Actual_Load_ (these are the monthly ExTO adjustments)
+            self.load_file['FileName'] = claim_output_name('Actual_Load_' + self.workbook_name + '_' + str(current_datetime))
+            load_flag_value = 0
+        else:
+            # Working_Load_
+            self.load_file['FileName'] = claim_output_name('Working_Load_' + self.user_id + '_' + self.workbook_name + '_' + self.load_sheet_name + '_' + str(current_datetime))
+            load_flag_value = 0
+
+        # Embed the backup data into the load file (as a new column that will be ignored by the load rule)
+        #if not all(self.load_file['VER'].isin(['Current Capacity'])):  As of 4/26/22, capacity load files will have the new column too
+        print('Load file df before adding backup data:')
+        print(self.load_file.head())
+
+        # Get the associated pre-load data from the latest FIN_STMT backup file on the shared drive
+        load_sheet_members, load_sheet_keys = self.get_backup_filters(self.load_file)
+        df_backup_file = self.timed_stage('process_backup_file', self.process_backup_file, load_sheet_members, load_sheet_keys)
+
+        # Merge the backup file and the load file
+        self.load_file = self.add_backup_values(self.load_file, df_backup_file)
+
+        # Add the email columns to the dataframe    
+        self.load_file = self.add_email_columns(self.load_file, self.user_email)
+        load_file_name = str(self.load_file.loc[0,'FileName'])
+
+        # Optionally split the load file into shards that the Essbase batch can load in parallel
+        if self.run_options['shards'] > 1:
+            self.shard_load_file()
+
+        # Output the load file
+        write_output(self.load_file, 1)
+
+        if self.run_options['shards'] > 1:
+            write_shard_manifest(self.load_file, load_file_name, self.run_options['shard_by'])
+
+        # Summarize what the load does to the ACCT and CC parent totals
+        # The member-level sums are shared with the anomaly screen
+        partial_sums = [self.get_rollup_partial_sums(self.load_file)]
+        rollup_impact = self.timed_stage('summarize_rollup_impact', self.summarize_rollup_impact, load_file_name, partial_sums)
+        if not rollup_impact is None:
+            write_output(rollup_impact, 4)
+
+        # Warn about loaded values that are out of line with the backup values (the load file has already been written)
+        if self.run_options.get('anomaly_screen', default_run_options['anomaly_screen']):
+            anomalies = self.timed_stage('screen_anomalies', self.screen_anomalies, load_file_name, partial_sums)
+            if not anomalies is None:
+                write_output(anomalies, 5)
+
+        logging.info("Worksheet validation successful. Load file " + load_file_name + r".txt written to \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Output")
+        print('Worksheet validation successful. Load file written to Automation-FPA\Load_Files\Output...')
+
+        # For capacity loads only, create a flag file that indicates which months to load
+        # It's written to the same directory as the capacity data file and uses the same load rule
+        # The values loaded from this flag file will be referenced when the capacity calc scripts are run
+        # Note: load_flag_value was set in the previous if block
+        if load_flag_value == 1 or load_flag_value == 2: 
+            capacity_load_flags = self.create_capacity_flag_file(unique_periods,'Current Capacity',load_flag_value)
+            write_output(capacity_load_flags, 2)
+            logging.info(r"Capacity flag file written to \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Output")
+            print('Capacity flag file created')
+
+        return True
+
+    
+            
+    def get_backup_filters(self, df):
+
+        # Drop the duplicates in all dimensions; these series will be used as filters for the backup data
+        load_sheet_acct = df['ACCT'].drop_duplicates()
+        load_sheet_cc = df['CC'].drop_duplicates()
+        load_sheet_io = df['IO'].drop_duplicates()
+        load_sheet_co = df['CO'].drop_duplicates()
+        load_sheet_pc = df['PC'].drop_duplicates()
+        load_sheet_et = df['ET'].drop_duplicates()
+        load_sheet_scen = df['SCEN'].drop_duplicates()
+        load_sheet_ver = df['VER'].drop_duplicates()
+        load_sheet_type = df['TYPE'].drop_duplicates()
+        load_sheet_year  = df['YEAR'].drop_duplicates()
+
+        load_sheet_members = {'acct':load_sheet_acct,'cc':load_sheet_cc,'io':load_sheet_io,'co':load_sheet_co, \
+                              'pc':load_sheet_pc,'et':load_sheet_et,'scen':load_sheet_scen,'ver':load_sheet_ver, \
+                              'type':load_sheet_type,'year':load_sheet_year}
+
+        # The distinct intersections on the load sheet; the backup snapshot index looks these up directly
+        load_sheet_keys = df[backup_key_columns].drop_duplicates()
+
+        return load_sheet_members, load_sheet_keys
+
+
+
+    def add_backup_values(self, df, df_backup_file):
+
+        print('Adding backup data to the load file df...')
+        if self.backend == 'arrow':
+            # The backup's unpivot is fused into the join: each load row takes its month from the backup row it matched
+            return self.timed_stage('join_backup_values', join_backup_values, df, df_backup_file)
+
+        left_key = ['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD']
+        right_key = ['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD']
+        df = df.merge(df_backup_file, how='left', left_on=left_key, right_on=right_key)
+
+        # Rename the new columns
+        df.rename(columns={'DATA_x':'DATA','FileName_x':'FileName', 'DATA_y':'DATA_Backup','FileName_y':'FileName_Backup'},inplace=True)
+
+        # Drop the backup filename column
+        df = df.drop(columns=['FileName_Backup'])
+
+        #Fill all empty cells in the backup data column with zeros
+        return df.fillna({'DATA_Backup':0})
+
+
+
+    def stream_exto_load_file(self):
+
+        print('Running stream_exto_load_file...')
+
+        # The ExTO sheet is processed in blocks of block_rows sheet rows, each one end to end: unpivot, backup data, email columns, write
+        # Headless, only one block of load file rows is in memory at a time, so memory doesn't grow with the size of the sheet (see write_load_file_blocks)
+        # The load file has the same rows as an unstreamed run, in block order (an unstreamed file has every row's Jan, then every row's Feb, ...)
+        block_rows = self.run_options.get('block_rows', default_run_options['block_rows'])
+        load_file_name = claim_output_name('Actual_Load_' + self.workbook_name + '_' + str(current_datetime))
+
+        # ExTO rows are loaded to Actual/Final whatever the sheet's Scenario and Version (see create_load_file), so the backup is filtered on those
+        # The validated member columns are in the same rows as the forecast values, so each block's members and values are the same rows
+        self.load_sheet.members = self.load_sheet.members[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR']].assign(SCEN='Actual', VER='Final')
+        members = self.load_sheet.members
+
+        # Limit the export to the whole sheet's members once, so each block filters a small frame
+        # The snapshot is looked up block by block with its key index instead
+        if not self.finstmt_backup is None:
+            self.finstmt_backup = self.filter_backup_file(self.get_backup_filters(members)[0])
+
+        partial_sums = []
+        row_candidates = [] if self.run_options.get('anomaly_screen', default_run_options['anomaly_screen']) else None
+        self.melted_rows = 0
+        self.load_file_blocks = 0
+
+        # A recorded run keeps the blocks so the recording has the whole load file
+        blocks = self.get_exto_load_file_blocks(members, block_rows, load_file_name, partial_sums, row_candidates)
+        write_load_file_blocks(blocks, capture=self.run_options.get('record', default_run_options['record']))
+        print('Load file streamed in ' + str(self.load_file_blocks) + ' blocks (' + str(self.melted_rows) + ' rows)')
+
+        # Summarize what the load does to the ACCT and CC parent totals
+        rollup_impact = self.timed_stage('summarize_rollup_impact', self.summarize_rollup_impact, load_file_name, partial_sums)
+        if not rollup_impact is None:
+            write_output(rollup_impact, 4)
+
+        # Warn about loaded values that are out of line with the backup values
+        if not row_candidates is None:
+            anomalies = self.timed_stage('screen_anomalies', self.screen_anomalies, load_file_name, partial_sums, row_candidates)
+            if not anomalies is None:
+                write_output(anomalies, 5)
+
+        logging.info("Worksheet validation successful. Load file " + load_file_name + r".txt written to \\disk23\fin_plan-shared\Automation-FPA\Load_Files\Output in " + str(self.load_file_blocks) + " blocks")
+        print('Worksheet validation successful. Load file written to Automation-FPA\Load_Files\Output...')
+
+        return True
+
+
+
+    def get_exto_load_file_blocks(self, members, block_rows, load_file_name, partial_sums, row_candidates=None):
+
+        # Yields the load file of an ExTO sheet one block of sheet rows at a time (see stream_exto_load_file)
+        # Each block's rollup partial sums are added to partial_sums as it's produced, and the rows the anomaly screen may flag to row_candidates (unless it's None)
+        # The rows are screened once every block has been read, against their accounts' changes across the whole load file (see screen_anomalies)
+        finstmt_backup = self.finstmt_backup
+        for start in range(0, len(members.index), block_rows):
+            df = self.load_sheet.unpivot(slice(start, start + block_rows))
+            df = df[['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD','DATA','FileName','UserEmail']]
+            df['FileName'] = load_file_name
+            self.melted_rows += len(df.index)
+
+            # process_backup_file replaces the backup with the block's rows, so every block starts from the sheet's
+            self.finstmt_backup = finstmt_backup
+            load_sheet_members, load_sheet_keys = self.get_backup_filters(df)
+            df = self.add_backup_values(df, self.process_backup_file(load_sheet_members, load_sheet_keys))
+            df = self.add_email_columns(df, self.user_email)
+
+            partial_sums.append(self.get_rollup_partial_sums(df))
+            if not row_candidates is None:
+                row_candidates.append(anomaly_row_candidates(df))
+            self.load_file_blocks += 1
+            yield df
+
+
+
+    def get_rollup_partial_sums(self, df):
+
+        # The rows, loaded values and backup values of a load file (or a block of one) summed by member of each rollup dimension, SCEN, VER and YEAR
+        # The partial sums of the blocks of a load file add up to the partial sums of the whole file (see summarize_rollup_impact)
+        df_values = df[['ACCT','CC','SCEN','VER','YEAR']].copy()
+        df_values['Rows'] = 1
+        df_values['DATA'] = pd.to_numeric(df['DATA'], errors='coerce').fillna(0)
+        df_values['DATA_Backup'] = pd.to_numeric(df['DATA_Backup'], errors='coerce').fillna(0)
+
+        # The anomaly screen also needs the sum of the squared changes of each account's rows, so it can take their spread across the blocks (see account_change_stats)
+        df_values['DeltaSquares'] = (df_values['DATA'] - df_values['DATA_Backup']) ** 2
+
+        partial_sums = {}
+        for dim in rollup_dimensions:
+            sum_columns = ['Rows','DATA','DATA_Backup','DeltaSquares'] if dim == 'ACCT' else ['Rows','DATA','DATA_Backup']
+            partial_sums[dim] = df_values.groupby([dim,'SCEN','VER','YEAR'], dropna=False)[sum_columns].sum().reset_index()
+
+        return partial_sums
+
+
+
+    def summarize_rollup_impact(self, load_file_name, partial_sums=None):
+
+        print('Running summarize_rollup_impact...')
+
+        # Sums the loaded values (DATA) and the values they replace (DATA_Backup) at every ACCT and CC ancestor of the loaded members
+        # The member-level sums (see get_rollup_partial_sums) are joined to all of each member's ancestors in the closure table,
+        # so one groupby covers every rollup level; each sum is signed the way the member consolidates into the ancestor
+        # The partial sums are passed in (a streamed load file passes those of its blocks); otherwise they're taken from the whole load file
+        # The summary is informational; if it can't be built, the load file still stands
+        try:
+            if partial_sums is None:
+                partial_sums = [self.get_rollup_partial_sums(self.load_file)]
+
+            summaries = []
+            for dim in rollup_dimensions:
+                df_sums = pd.concat([block_sums[dim] for block_sums in partial_sums], ignore_index=True)
+                if len(partial_sums) > 1:
+                    df_sums = df_sums.groupby([dim,'SCEN','VER','YEAR'], dropna=False)[['Rows','DATA','DATA_Backup']].sum().reset_index()
+                df_rollup = df_sums.merge(self.get_closure_table(dim), left_on=dim, right_on='Member')
+                df_rollup[['DATA','DATA_Backup']] = df_rollup[['DATA','DATA_Backup']].mul(df_rollup['Sign'], axis=0)
+                summary = df_rollup.groupby(['Ancestor','Level','SCEN','VER','YEAR'], dropna=False).agg(
+                    LoadedMembers=(dim, 'nunique'), Rows=('Rows', 'sum'), DATA=('DATA', 'sum'), DATA_Backup=('DATA_Backup', 'sum')).reset_index()
+                summary.insert(0, 'Dimension', dim)
+                summaries.append(summary)
+
+            rollup_impact = pd.concat(summaries, ignore_index=True).rename(columns={'Ancestor':'Member'})
+            rollup_impact['Delta'] = rollup_impact['DATA'] - rollup_impact['DATA_Backup']
+            rollup_impact[['DATA','DATA_Backup','Delta']] = rollup_impact[['DATA','DATA_Backup','Delta']].round(6)
+            rollup_impact = rollup_impact.sort_values(['Dimension','Level','Member','SCEN','VER','YEAR'], ascending=[True, False, True, True, True, True])
+            rollup_impact['FileName'] = load_file_name
+
+            print('Rollup impact summary:')
+            print(rollup_impact.head())
+
+            return rollup_impact.reset_index(drop=True)
+
+        except Exception as e:
+            logging.warning('The rollup impact summary for ' + load_file_name + ' could not be created: ' + str(e))
+            return None
+
+
+
+    def screen_anomalies(self, load_file_name, partial_sums=None, row_candidates=None):
+
+        print('Running screen_anomalies...')
+
+        # Flags the loaded values that look wrong next to the values they replace (e.g., keyed in thousands, or an account with its sign flipped):
+        # the rows and the account totals that changed by a factor of scale_ratio or more, the accounts whose sign flipped,
+        # and the changes that stand out from the rest of their account (or, for an account, from the other accounts)
+        # The account totals, and each account's mean and spread of its rows' changes, come from the rollup partial sums
+        # A streamed load file also passes the rows of its blocks that may be flagged (see anomaly_row_candidates); whatever isn't passed in is taken from the whole load file
+        # The report is a warning for the analyst; the load file is written either way, and it still stands if the screen can't be run
+        try:
+            if partial_sums is None:
+                partial_sums = [self.get_rollup_partial_sums(self.load_file)]
+            if row_candidates is None:
+                row_candidates = [anomaly_row_candidates(self.load_file)]
+
+            df_sums = pd.concat([block_sums['ACCT'] for block_sums in partial_sums], ignore_index=True)
+            df_sums = df_sums.groupby(['ACCT','SCEN','VER','YEAR'], dropna=False)[['Rows','DATA','DATA_Backup','DeltaSquares']].sum().reset_index()
+            account_anomalies = screen_account_values(df_sums)
+            row_anomalies = screen_row_values(pd.concat(row_candidates, ignore_index=True), account_change_stats(df_sums))
+
+            if len(account_anomalies.index) == 0 and len(row_anomalies.index) == 0:
+                print('No anomalies found')
+                return None
+
+            anomalies = pd.concat([account_anomalies, row_anomalies], ignore_index=True).reindex(columns=['Level','ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD',
+                                                                                                        'Rows','DATA','DATA_Backup','Delta','Ratio','ZScore','Reason'])
+            anomalies[['DATA','DATA_Backup','Delta','Ratio','ZScore']] = anomalies[['DATA','DATA_Backup','Delta','Ratio','ZScore']].round(6)
+            anomalies['FileName'] = load_file_name
+
+            print('Anomalies: ' + str(len(account_anomalies.index)) + ' accounts, ' + str(len(row_anomalies.index)) + ' rows')
+            logging.warning('The anomaly screen flagged ' + str(len(account_anomalies.index)) + ' accounts and ' + str(len(row_anomalies.index)) + ' rows of load file ' + load_file_name)
+            return anomalies
+
+        except Exception as e:
+            logging.warning('The anomaly screen for ' + load_file_name + ' could not be run: ' + str(e))
+            return None
+
+    
+            
+    def shard_load_file(self):
+
+        print('Running shard_load_file...')
+
+        # Each shard covers a contiguous range of the shard_by dimension's members (e.g., an ACCT range or a set of years),
+        # with the ranges balanced by row count; a member's rows are never split across shards
+        shards = self.run_options['shards']
+        shard_by = self.run_options['shard_by']
+        load_file_name = str(self.load_file.loc[0,'FileName'])
+
+        member_rows = self.load_file[shard_by].value_counts().sort_index()
+        rows_before = member_rows.cumsum() - member_rows
+        member_shards = (rows_before * shards // len(self.load_file.index)).clip(upper=shards - 1)
+
+        # A dimension with fewer members than shards (or one very large member) produces fewer shards; number them consecutively
+        member_shards = member_shards.rank(method='dense').astype(int)
+        shard_count = member_shards.max()
+
+        # Name each shard after the load file: <FileName>_Part01of04
+        shard_names = load_file_name + '_Part' + member_shards.astype(str).str.zfill(2) + 'of' + str(shard_count).zfill(2)
+        self.load_file['FileName'] = self.load_file[shard_by].map(shard_names)
+
+        logging.info('Load file ' + load_file_name + ' split into ' + str(shard_count) + ' shards by ' + shard_by)
+        print('Load file split into ' + str(shard_count) + ' shards by ' + shard_by)
+
+    
+            
+    def create_error_file(self, error_details_df, error_email_info, error_log_entry=None):
+        
+        # The "error_log_entry" will be received for all error types except runtime errors
+
+        print('Running create_error_file...')
+        
+        print('Incoming error dataframe:')
+        print(error_details_df)
+       
+        # Add the FileName column to the dataframe
+        error_details_df['FileName'] = self.enhanced_file_name
+
+        # Add the recipients' email columns to the dataframe    
+        error_details_df = self.add_email_columns(error_details_df, self.user_email)
+
+        # Add columns containing info/details about the error
+        error_details_df['ErrorEmailSubject'] = error_email_info['error_email_subject']
+        error_details_df['ErrorFilePath'] = error_email_info['error_email_filepath']
+        error_details_df['ErrorEmailBody'] = error_email_info['error_email_body']
+            
+        print('Errors dataframe:')
+        print(error_details_df)
+
+        # Ouput the details of the error(s) but do NOT create the load file
+        write_output(error_details_df, 3)
+
+        if error_log_entry:
+            logging.error(error_log_entry)
+        
+        print('Load file validation FAILED. See the log for details.')
+
+# End of the DataLoader class
+        
+
+
+def normalize_member_keys(s):
+
+    # Case-folded, prefix-insensitive and without spaces or punctuation, so the common near-misses all produce the same key
+    # e.g., 'CC:40001', 'cc: 40001', 'CC 40001', 'cc40001' and '40001' all normalize to '40001'
+    # The two-letter prefix is dropped whether it's followed by a colon, a separator or the member's number
+    s = s.astype(str).str.replace(r'^\s*[A-Za-z]{2}(?:\s*[:\-_ ]\s*|(?=\d))', '', regex=True)
+    return s.str.casefold().str.replace(r'[\W_]+', '', regex=True)
+
+
+
+def calendar_key(label):
+
+    # Year and month spellings are compared without spaces, case or the _N suffix that makes repeated headers unique
+    # e.g., 'FY 2024', 'FY2024_2' and 'fy 2024' all produce 'FY2024'
+    return re.sub(r'\s+', '', re.sub(r'_\d+$', '', str(label))).upper()
+
+
+
+def build_calendar_table(year_dim):
+
+    # Every accepted spelling of a year header crossed with every accepted spelling of a month label,
+    # mapped to the Year and Period members (e.g., FY24 or FY 2024 with Jan or January is FY24/Jan)
+    # Year spellings come from the Year doc file; month spellings are the month names in month_spellings, not the Period doc file,
+    # whose level-zero members and aliases include words that aren't months
+    # Open is True for the years that can be loaded: the prior year and later
+    years = year_dim.loc[year_dim['Level'] == '0', ['Member Name','Alias: Default']]
+    year_numbers = pd.to_numeric(years['Alias: Default'].str.extract(r'(\d{4})\s*$', expand=False), errors='coerce')
+    years = years.assign(Open=year_numbers >= now.year - 1)
+    years = pd.concat([years.assign(YearKey=years['Member Name']), years.assign(YearKey=years['Alias: Default'])]).dropna(subset=['YearKey'])
+    years['YearKey'] = years['YearKey'].map(calendar_key)
+    years = years.drop_duplicates(subset=['YearKey']).rename(columns={'Member Name':'YEAR'})[['YearKey','YEAR','Open']]
+
+    periods = pd.DataFrame({'PeriodKey':list(month_spellings), 'PERIOD':list(month_spellings.values())})
+    periods['PeriodKey'] = periods['PeriodKey'].map(calendar_key)
+
+    table = years.merge(periods, how='cross')
+    table['Header'] = table['YEAR'] + '_' + table['PERIOD']
+
+    calendar = {}
+    calendar['table'] = table[['YearKey','PeriodKey','YEAR','PERIOD','Header','Open']]
+    calendar['years'] = dict(zip(years['YearKey'], years['YEAR']))
+    calendar['periods'] = dict(zip(periods['PeriodKey'], periods['PERIOD']))
+    calendar['open_years'] = set(years.loc[years['Open'], 'YEAR'])
+
+    print('Calendar table: ' + str(len(calendar['years'])) + ' year spellings, ' + str(len(calendar['periods'])) + ' month spellings')
+
+    return calendar
+
+
+
+def build_closure_table(dim_members):
+
+    # Every (member, ancestor) pair in a dimension's hierarchy, from the Parent column of its Outline Extractor doc file
+    # Each member is its own ancestor at depth 0; Level is the ancestor's level in the outline
+    # Sign is the product of the consolidation operators along the path (see consolidation_signs), so a member under one - parent
+    # subtracts from the ancestor and one under two adds to it; a path through a member that isn't consolidated isn't in the table
+    # A shared member has more than one parent, so it can have more than one path to the same ancestor; the shortest one is kept
+    parents = dim_members.loc[dim_members['Parent'].fillna('') != '']
+    operators = parents[consolidation_column] if consolidation_column in parents.columns else pd.Series('+', index=parents.index)
+    parents = pd.DataFrame({'Member':parents['Member Name'], 'Ancestor':parents['Parent'], 'Sign':operators.str.strip().map(consolidation_signs)})
+    parents = parents.dropna(subset=['Sign']).astype({'Sign':int}).drop_duplicates(subset=['Member','Ancestor'])
+
+    members = pd.Index(dim_members['Member Name']).union(pd.Index(parents['Ancestor'])).unique()
+    closure = [pd.DataFrame({'Member':members, 'Ancestor':members, 'Depth':0, 'Sign':1})]
+
+    # Walk up one level per pass; the number of passes is bounded in case the extract has a cycle
+    ancestors = parents.assign(Depth=1)
+    while len(ancestors.index) > 0 and len(closure) <= parents['Ancestor'].nunique():
+        closure.append(ancestors)
+        ancestors = ancestors.merge(parents.rename(columns={'Member':'Ancestor', 'Ancestor':'Next', 'Sign':'NextSign'}), on='Ancestor')
+        ancestors['Sign'] = ancestors['Sign'] * ancestors['NextSign']
+        ancestors = ancestors[['Member','Next','Depth','Sign']].rename(columns={'Next':'Ancestor'})
+        ancestors['Depth'] += 1
+        ancestors = ancestors.drop_duplicates(subset=['Member','Ancestor'])
+
+    closure = pd.concat(closure, ignore_index=True).drop_duplicates(subset=['Member','Ancestor'], keep='first')
+
+    levels = pd.to_numeric(dim_members.drop_duplicates(subset=['Member Name']).set_index('Member Name')['Level'], errors='coerce')
+    closure['Level'] = closure['Ancestor'].map(levels).astype('Int64')
+
+    return closure.reset_index(drop=True)
+
+
+
+def lookup_calendar_period(calendar, month_label):
+
+    # The Period member of a month label; the label may also contain other words (e.g., 'Forecast Jan')
+    period_member = calendar['periods'].get(calendar_key(month_label))
+    if period_member is None:
+        for word in str(month_label).split():
+            period_member = calendar['periods'].get(calendar_key(word))
+            if not period_member is None:
+                break
+
+    return period_member
+
+
+
+def lookup_calendar_header(calendar, year_label, month_label):
+
+    # The YEAR_PERIOD header (e.g., FY24_Jan) for a year header and a month label, or None if either isn't an accepted spelling
+    year_member = calendar['years'].get(calendar_key(year_label))
+    period_member = lookup_calendar_period(calendar, month_label)
+    if year_member is None or period_member is None:
+        return None
+
+    return year_member + '_' + period_member
+
+
+
+def split_load_sheet(df, file_name, user_email):
+
+    # Splits a load sheet read as a dataframe of its cells (the Alteryx input, or read_load_sheet's) into a LoadSheet, the blocks every check works on
+    # The rows and columns without any values are dropped; the first row decides the layout, as in stream_load_sheet:
+    # an ExTO sheet has Equipment Type members (ET:*) in its first row and ten member columns (Year is in the rows),
+    # and every other load sheet has its month labels in the first row, under the nine member columns and the year headers
+    # The forecast region is parsed into float64 once, one column at a time; the cells that aren't numbers are kept as text (see LoadSheet)
+    df = df.dropna(axis=0, how='all')
+    has_values = df.notna().any().to_numpy()
+    exto_data = len(df.index) > 0 and str(df.iloc[0,0]).startswith('ET:')
+    value_column = min(10 if exto_data else 9, len(df.columns))
+
+    label_row = None
+    if not exto_data and len(df.index) > 0:
+        label_row = [None if pd.isna(cell) else str(cell) for cell, keep in zip(df.iloc[0], has_values) if keep]
+        df = df.iloc[1:]
+
+    members = df.iloc[:, [n for n in range(value_column) if has_values[n]]].copy()
+    value_positions = [n for n in range(value_column, len(df.columns)) if has_values[n]]
+    region = df.iloc[:, value_positions]
+    values = np.empty(region.shape, dtype=np.float64, order='F')
+    for j in range(len(value_positions)):
+        values[:, j] = pd.to_numeric(region.iloc[:, j], errors='coerce')
+
+    # A cell that has a value but didn't parse as a number
+    rows, columns = np.nonzero(region.notna().to_numpy() & np.isnan(values))
+    text_cells = [(n, j, str(region.iat[n, j])) for n, j in zip(rows, columns)]
+
+    return LoadSheet(members, values, [df.columns[n] for n in value_positions], [n + 1 for n in value_positions], label_row, text_cells, file_name, user_email)
+
+
+# Check types used by validation_rules
+# Each check returns None when the rule passes, or a dictionary of values for the rule's message when it fails
+
+def check_member_pattern(load_sheet, rule):
+
+    # At least one value in the column must resemble a member name or alias of the dimension
+    members = load_sheet.members
+    if rule['column'] in members.columns and members[rule['column']].astype(str).str.contains(rule['pattern'], regex=True).any():
+        return None
+    return {}
+
+
+
+def check_member_list(load_sheet, rule):
+
+    # At least one value in the column must be one of the listed members
+    members = load_sheet.members
+    if rule['column'] in members.columns and members[rule['column']].isin(rule['members']).any():
+        return None
+    return {}
+
+
+
+def check_headers(load_sheet, rule):
+
+    # The critical cells on the year header row must contain the expected headers
+    headers = load_sheet.headers()
+    positions = list(rule['headers']) + list(rule['header_prefixes'])
+    if len(headers) <= max(positions) or len(headers) < -min(positions):
+        return {}
+    for position, header in rule['headers'].items():
+        if headers[position] != header:
+            return {}
+    for position, prefixes in rule['header_prefixes'].items():
+        if not str(headers[position]).startswith(prefixes):
+            return {}
+    return None
+
+
+
+def check_month_row(load_sheet, rule):
+
+    # The month labels row must start with empty cells, followed by a month name
+    month_row = load_sheet.label_row
+    if month_row is None or len(month_row) <= rule['first_month_column']:
+        return {}
+    if month_row[0:rule['empty_cells']].count('') != rule['empty_cells'] or \
+    not str(month_row[rule['first_month_column']]).startswith(rule['months']):
+        return {}
+    return None
+
+
+
+def check_unlabeled_columns(load_sheet, rule):
+
+    # Any forecast column header that follows the pattern "F##" and/or a month header of 0 (*not* an empty cell) is a column without headers
+    # Only the forecast columns' headers are checked, since an ExTO sheet's tenth member column is F10
+    if pd.Series(load_sheet.value_headers, dtype=object).astype(str).str.contains(rule['pattern'], regex=True).any() or \
+    (not load_sheet.label_row is None and 0 in load_sheet.label_row):
+        return {}
+    return None
+
+
+
+def check_numeric_region(load_sheet, rule):
+
+    # Every cell in the Forecast region must be numeric; the cells that aren't were kept as text when the sheet was read (see LoadSheet)
+    count = len(load_sheet.text_cells)
+    if count == 0:
+        return None
+
+    # Locate the non-numeric cells: the row on the sheet (the index is the sheet row less 2), the column letter on the sheet, the month label (the header on an ExTO sheet), and the value
+    # The year headers were rewritten by cleanup_load_sheet (e.g., FY24_1), so the column is reported the way the user sees it in Excel
+    rows, columns, texts = zip(*load_sheet.text_cells)
+    rows = np.array(rows)
+    columns = np.array(columns)
+    member_count = len(load_sheet.members.columns)
+    column_letters = [excel_column_letter(value_column) for value_column in load_sheet.value_columns]
+    details = pd.DataFrame({
+        'Sheet Row': load_sheet.members.index.to_numpy()[rows] + 2,
+        'Column': np.array(column_letters, dtype=object)[columns],
+        'Month': np.array(load_sheet.value_headers if load_sheet.label_row is None else load_sheet.label_row[member_count:], dtype=object)[columns],
+        'Value': list(texts)})
+
+    # A value repeated across a row (e.g., a row of dashes) is listed once, at its first column, with the number of cells that contain it
+    details['Value'] = details['Value'].astype(str)
+    details['Cells'] = details.groupby(['Sheet Row','Value'], sort=False)['Column'].transform('size')
+    details = details.drop_duplicates(subset=['Sheet Row','Value'])
+    if len(details.index) > rule['max_cells']:
+        details = details.head(rule['max_cells'])
+        print('Only the first ' + str(rule['max_cells']) + ' non-numeric cells will be listed')
+
+    # Keep the row numbers and counts as integers when the details are listed under the messages (which have no values for them)
+    details = details.astype({'Sheet Row':object, 'Cells':object})
+
+    return {'count':count, 'cells':'cells' if count > 1 else 'cell', 'details':details.reset_index(drop=True)}
+
+
+
+def excel_column_letter(column_number):
+
+    # The Excel letter of a column number (e.g., 1 is A, 27 is AA)
+    column_letter = ''
+    while column_number > 0:
+        column_number, remainder = divmod(column_number - 1, 26)
+        column_letter = chr(ord('A') + remainder) + column_letter
+    return column_letter
+
+
+
+validation_checks = {
+    'member_pattern':check_member_pattern,
+    'member_list':check_member_list,
+    'headers':check_headers,
+    'month_row':check_month_row,
+    'unlabeled_columns':check_unlabeled_columns,
+    'numeric_region':check_numeric_region
+}
+
+# Compile the rules' patterns once, when the script starts
+for rule in validation_rules + exto_validation_rules:
+    if 'pattern' in rule:
+        rule['pattern'] = re.compile(rule['pattern'])
+
+
+
+def get_validation_rules(load_sheet):
+
+    # The layout rules of the sheet's layout: an ExTO sheet is the only one without a month labels row (see LoadSheet)
+    if load_sheet.label_row is None:
+        return exto_validation_rules
+    return validation_rules
+
+
+
+def evaluate_validation_rules(load_sheet, rules):
+
+    print('Running evaluate_validation_rules...')
+
+    # Every rule is evaluated (rather than stopping at the first failure), so the analyst gets all of the problems in one report
+    # Returns the message of each rule that failed, and the failed cells of the rules whose checks locate them
+    violations = {}
+    violation_details = {}
+    for rule in rules:
+        if any(required_rule in violations for required_rule in rule.get('requires', [])):
+            continue
+        violation = validation_checks[rule['check']](load_sheet, rule)
+        if not violation is None:
+            violations[rule['name']] = rule['message'].format(**violation)
+            if 'details' in violation:
+                violation_details[rule['name']] = violation['details']
+
+    print('Validation rule violations: ' + str(len(violations)))
+
+    return violations, violation_details
+        
+
+
+def summary_information(load_sheet):
+    
+    print('Running summary_information...')
+    
+    # Create empty dictionary
+    summary_info = {}
+    
+    match_pattern_filepath = r'.*\\(.*).xls[xm]?.[|]{0,}\W{0,}(.*)\$'
+    match_pattern_email = r'.*([ex]\d{3,7})@wnco.com$'
+    
+    z1 = re.match(match_pattern_filepath, load_sheet.file_name)  # FileName actually contains the full path to the file
+    z2 = re.match(match_pattern_email, load_sheet.user_email)  # Email address is formatted as e12345@wnco.com
+        
+    if not z1 == None:
+        summary_info['workbook_name'] = ''.join(z1.group(1)) # Convert tuple to string
+    else:
+        summary_info['workbook_name'] = None
+        
+    if not z1 == None:
+        summary_info['load_sheet_name'] = ''.join(z1.group(2)) # Convert tuple to string
+    else:
+        summary_info['load_sheet_name'] = None
+
+    if not z2 == None:
+        summary_info['user_id'] = ''.join(z2.group(1)) # Convert tuple to string
+    else:
+        summary_info['user_id'] = None
+    
+    summary_info['user_email'] = load_sheet.user_email
+    
+    return summary_info
+
+
+def backup_partition_name(year, acct):
+
+    # zlib.crc32 is stable across runs and machines (unlike Python's hash), so the snapshot job and the loader always agree
+    return str(year) + '_' + str(zlib.crc32(str(acct).encode('utf-8')) % backup_partition_buckets).zfill(2)
+
+
+
+def get_backup_snapshot(export_file):
+
+    # Returns the snapshot manifest, or None if the snapshot can't stand in for export_file, the export the run would otherwise read
+    # Without the export's path (e.g., a #13 input that doesn't pass its FileName field) the snapshot can't be checked, so it isn't used
+    if pa is None or export_file is None or not os.path.exists(backup_snapshot_manifest):
+        return None
+
+    with open(backup_snapshot_manifest) as f:
+        backup_snapshot = json.load(f)
+
+    # A snapshot of a different export, or one taken before the export's latest refresh, is stale, so use the export instead
+    if os.path.normcase(os.path.normpath(backup_snapshot['source_file'])) != os.path.normcase(os.path.normpath(export_file)):
+        logging.warning('The backup snapshot was taken from ' + backup_snapshot['source_file'] + ', not ' + export_file + '; the full export will be used')
+        print('WARNING: The backup snapshot is of a different export')
+        return None
+    if os.path.exists(export_file) and os.path.getmtime(export_file) > backup_snapshot['source_mtime']:
+        logging.warning('The backup snapshot is older than the latest backup export; the full export will be used')
+        print('WARNING: The backup snapshot is stale')
+        return None
+
+    return backup_snapshot
+
+
+
+def get_backup_source(backup_option, export_file):
+
+    print('Running get_backup_source...')
+
+    # Decides once per run where the backup data comes from; the DataLoader, the run cache and the recording all use this decision
+    # export_file is the export the run reads when it doesn't use the snapshot (see get_input_files)
+    # The fingerprint identifies that backup for the run cache (see get_run_key): the snapshot by its manifest, the export by its path, modification time and size
+    # The snapshot job keeps the files of the snapshot it replaces, so a run can still map the snapshot it chose here (see fpa_backup_snapshot.py)
+    backup_snapshot = None
+    if backup_option == 'snapshot':
+        backup_snapshot = get_backup_snapshot(export_file)
+    if not backup_snapshot is None:
+        return {'source':'snapshot', 'snapshot':backup_snapshot, 'file':backup_snapshot['source_file'], 'source_mtime':backup_snapshot['source_mtime'],
+                'fingerprint':'snapshot:' + backup_snapshot['created'] + ':' + str(backup_snapshot['source_mtime'])}
+
+    # The export is identified before it's read; an export that can't be found has no fingerprint
+    backup_source = {'source':'export', 'snapshot':None, 'file':export_file, 'source_mtime':None, 'fingerprint':None}
+    if not export_file is None and os.path.exists(export_file):
+        export_stat = os.stat(export_file)
+        backup_source['source_mtime'] = export_stat.st_mtime
+        backup_source['fingerprint'] = 'export:' + export_file + ':' + str(export_stat.st_mtime_ns) + ':' + str(export_stat.st_size)
+    return backup_source
+
+
+
+def encode_backup_keys(df):
+
+    # One byte string per row: ACCT|CC|IO|CO|PC|ET|SCEN|VER|TYPE|YEAR
+    # Fixed-width numpy byte strings sort and binary-search without any Python-level comparisons
+    keys = df[backup_key_columns[0]].astype(str).str.cat([df[dim].astype(str) for dim in backup_key_columns[1:]], sep='|')
+    return keys.str.encode('utf-8').to_numpy(dtype='S')
+
+
+
+def lookup_backup_rows(partition_file_keys, partition_file_rows, keys):
+
+    # Binary-search the partition's sorted key index for the load sheet's keys and return the matching row offsets
+    # Both index files are memory-mapped, so only the pages touched by the search are read
+    index_keys = np.load(partition_file_keys, mmap_mode='r')
+    index_rows = np.load(partition_file_rows, mmap_mode='r')
+
+    # A key can appear more than once in the backup, so take every row between the left and right insertion points
+    left = np.searchsorted(index_keys, keys, side='left')
+    right = np.searchsorted(index_keys, keys, side='right')
+    counts = right - left
+    positions = np.repeat(left, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    return np.asarray(index_rows[positions])
+
+
+
+def read_backup_snapshot(backup_snapshot, load_sheet_members, load_sheet_keys=None, as_table=False):
+
+    print('Running read_backup_snapshot...')
+
+    # Only the partitions that can contain the load sheet's YEAR and ACCT combinations are opened
+    partitions = set()
+    for year in load_sheet_members['year']:
+        for acct in load_sheet_members['acct']:
+            partitions.add(backup_partition_name(year, acct))
+
+    # When the load sheet's exact intersections are known, look them up in each partition's key index instead of filtering
+    partition_keys = {}
+    if not load_sheet_keys is None:
+        load_sheet_partitions = [backup_partition_name(year, acct) for year, acct in zip(load_sheet_keys['YEAR'], load_sheet_keys['ACCT'])]
+        encoded_keys = encode_backup_keys(load_sheet_keys)
+        for partition, keys in pd.Series(list(encoded_keys)).groupby(load_sheet_partitions):
+            partition_keys[partition] = np.array(keys.tolist(), dtype='S')
+
+    member_filters = {'ACCT':'acct','CC':'cc','IO':'io','CO':'co','PC':'pc','ET':'et','SCEN':'scen','VER':'ver','TYPE':'type','YEAR':'year'}
+
+    tables = []
+    index_lookups = 0
+    for partition in sorted(partitions):
+        if not partition in backup_snapshot['partitions']:
+            continue
+        partition_info = backup_snapshot['partitions'][partition]
+
+        use_index = 'keys_file' in partition_info and not load_sheet_keys is None
+        if use_index and not partition in partition_keys:
+            continue  # None of the load sheet's intersections fall in this partition
+
+        # The file is memory-mapped, not copied; only the rows that are looked up or pass the filter are materialized
+        partition_file = os.path.join(backup_snapshot_dir, partition_info['file'])
+        table = pa.ipc.open_file(pa.memory_map(partition_file, 'r')).read_all()
+
+        if use_index:
+            # Point lookups: the cost depends on the number of keys on the load sheet, not the size of the partition
+            rows = lookup_backup_rows(os.path.join(backup_snapshot_dir, partition_info['keys_file']),
+                                      os.path.join(backup_snapshot_dir, partition_info['rows_file']),
+                                      partition_keys[partition])
+            tables.append(table.take(pa.array(rows)))
+            index_lookups = index_lookups + 1
+            continue
+
+        # Limit the data to the members on the load sheet
+        mask = None
+        for dim, member_key in member_filters.items():
+            cond = pa_compute.is_in(table[dim], value_set=pa.array(load_sheet_members[member_key].astype(str).tolist()))
+            mask = cond if mask is None else pa_compute.and_(mask, cond)
+        tables.append(table.filter(mask))
+
+    print('Backup snapshot partitions read: ' + str(len(tables)) + ' (' + str(index_lookups) + ' using the key index)')
+
+    # With no rows, keep the monthly values numeric like the export's, so the missing DATA_Backup values are filled the same way
+    # The arrow backend keeps the rows as an Arrow table (see plan_backup_source)
+    if not tables:
+        if as_table:
+            return pa.table({column: pa.array([], type=pa.string() if column in backup_key_columns else pa.float64()) for column in backup_columns})
+        return pd.DataFrame({column: pd.Series(dtype=object if column in backup_key_columns else float) for column in backup_columns})
+
+    if as_table:
+        return pa.concat_tables(tables)
+    return pa.concat_tables(tables).to_pandas()
+
+
+
+def plan_backup_source(backup_snapshot, finstmt_backup, load_sheet_members, load_sheet_keys=None):
+
+    # The first steps of the arrow backend's query plan: the backup rows that can match the load sheet, with their monthly values side by side
+    # BackupRow keeps each row's position, so the join's matches can be put back in the backup's order
+    # From the snapshot, the rows are looked up in the mapped partitions as usual; from the export, the member filters are pushed into the plan
+    if not backup_snapshot is None:
+        table = read_backup_snapshot(backup_snapshot, load_sheet_members, load_sheet_keys, as_table=True)
+        table = table.append_column('BackupRow', pa.array(np.arange(table.num_rows)))
+        return pa_acero.Declaration('table_source', pa_acero.TableSourceNodeOptions(table))
+
+    # The monthly values are converted the same way the snapshot converts them (see fpa_backup_snapshot.py)
+    backup = finstmt_backup.set_axis(backup_columns + ['FileName'], axis=1)
+    columns = {}
+    for column in backup_columns:
+        if column in backup_key_columns:
+            columns[column] = pa.array(backup[column], type=pa.string(), from_pandas=True)
+        else:
+            columns[column] = pa.array(pd.to_numeric(backup[column], errors='coerce'), type=pa.float64(), from_pandas=True)
+    columns['BackupRow'] = pa.array(np.arange(len(backup.index)))
+
+    member_filter = None
+    for dim in backup_key_columns:
+        cond = pa_compute.field(dim).isin(load_sheet_members[dim.lower()].astype(str).tolist())
+        member_filter = cond if member_filter is None else member_filter & cond
+
+    return pa_acero.Declaration.from_sequence([
+        pa_acero.Declaration('table_source', pa_acero.TableSourceNodeOptions(pa.table(columns))),
+        pa_acero.Declaration('filter', pa_acero.FilterNodeOptions(member_filter))
+    ])
+
+
+
+def join_backup_values(df, backup_source):
+
+    # Runs the arrow backend's query plan: the load rows are hash-joined to the backup rows on the 10 member columns across all cores,
+    # and each load row takes the value of its PERIOD from the matched row, so the backup never has to be unpivoted
+    # The rows come back in the same order as the pandas merge (load rows in order, then the backup's order), and unmatched rows get 0
+    period_columns = backup_columns[10:]
+    load_keys = {column: pa.array(df[column], type=pa.string(), from_pandas=True) for column in backup_key_columns}
+    load_keys['LoadRow'] = pa.array(np.arange(len(df.index)))
+
+    join_options = pa_acero.HashJoinNodeOptions('left outer', left_keys=backup_key_columns, right_keys=backup_key_columns,
+                                                left_output=['LoadRow'], right_output=['BackupRow'] + period_columns)
+    plan = pa_acero.Declaration('hashjoin', join_options, inputs=[pa_acero.Declaration('table_source', pa_acero.TableSourceNodeOptions(pa.table(load_keys))), backup_source])
+    joined = plan.to_table(use_threads=True).sort_by([('LoadRow','ascending'), ('BackupRow','ascending')])
+
+    load_rows = joined['LoadRow'].to_numpy()
+    period_values = np.column_stack([joined[period].to_numpy() for period in period_columns]) if len(load_rows) > 0 else np.empty((0, len(period_columns)))
+    period_positions = pd.Index(period_columns).get_indexer(df['PERIOD'].to_numpy()[load_rows])
+    data_backup = np.where(period_positions >= 0, period_values[np.arange(len(load_rows)), np.maximum(period_positions, 0)], np.nan)
+
+    df = df.iloc[load_rows].reset_index(drop=True)
+    df['DATA_Backup'] = np.where(np.isnan(data_backup), 0, data_backup)
+    return df
+
+
+
+def change_zscores(delta, groups):
+
+    # The z-score of each change within its group (e.g., the accounts of a Year); groups with fewer than min_rows changes, or no spread, get NaN
+    grouped = pd.Series(delta).groupby(groups)
+    spread = grouped.transform('std').to_numpy()
+    spread = np.where((grouped.transform('count').to_numpy() >= anomaly_thresholds['min_rows']) & (spread > 0), spread, np.nan)
+    return (delta - grouped.transform('mean').to_numpy()) / spread
+
+
+
+def account_change_stats(df_sums):
+
+    # The mean and sample standard deviation of the changes of each account's rows, from the ACCT partial sums of the whole load file:
+    # the row count n, the sum of the changes and the sum of their squares (see DataLoader.get_rollup_partial_sums)
+    # Accounts with fewer than min_rows rows, or no spread, get a NaN spread, as in change_zscores
+    df_stats = df_sums.assign(Delta=df_sums['DATA'] - df_sums['DATA_Backup']).groupby('ACCT')[['Rows','Delta','DeltaSquares']].sum()
+    rows = df_stats['Rows'].to_numpy(dtype=float)
+    mean = df_stats['Delta'].to_numpy() / rows
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.clip(df_stats['DeltaSquares'].to_numpy() - rows * mean ** 2, 0, None) / (rows - 1)
+    spread = np.sqrt(variance)
+    spread = np.where((rows >= anomaly_thresholds['min_rows']) & (spread > 0), spread, np.nan)
+    return pd.DataFrame({'Mean':mean, 'Spread':spread}, index=df_stats.index)
+
+
+
+def anomaly_reasons(checks):
+
+    # The names of the checks each flagged row failed, e.g., 'Scale, ZScore'
+    reasons = np.full(len(next(iter(checks.values()))), '', dtype=object)
+    for reason, failed in checks.items():
+        reasons = np.where(failed, reasons + reason + ', ', reasons)
+    return pd.Series(reasons).str[:-2].to_numpy()
+
+
+
+def screen_values(data, backup, zscore, check_sign=True):
+
+    # The ratio of every loaded value to the backup value it replaces, and the checks it failed with the z-score of its change (see anomaly_thresholds)
+    # Every step runs over whole arrays; returns the flagged values and the mask of the flagged positions
+    delta = data - backup
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(backup != 0, data / backup, np.nan)
+
+    # Clearing a value (a ratio of 0) is an ordinary change, so it's never flagged as a scale error
+    checks = {}
+    checks['Scale'] = (np.abs(ratio) >= anomaly_thresholds['scale_ratio']) | ((ratio != 0) & (np.abs(ratio) <= 1 / anomaly_thresholds['scale_ratio']))
+    if check_sign:
+        checks['Sign'] = ratio < 0
+    checks['ZScore'] = np.abs(zscore) >= anomaly_thresholds['zscore']
+    flagged = (np.abs(delta) >= anomaly_thresholds['min_delta']) & np.logical_or.reduce(list(checks.values()))
+
+    df_screen = pd.DataFrame({'DATA':data[flagged], 'DATA_Backup':backup[flagged], 'Delta':delta[flagged], 'Ratio':ratio[flagged], 'ZScore':zscore[flagged]})
+    df_screen['Reason'] = anomaly_reasons({reason: failed[flagged] for reason, failed in checks.items()})
+    return df_screen, flagged
+
+
+
+def anomaly_row_candidates(df):
+
+    # The load file rows (or the rows of a block of one) that the anomaly screen may flag: a change smaller than min_delta is never flagged,
+    # so only the other rows are kept until every block's changes are in the account statistics (see screen_row_values)
+    data = pd.to_numeric(df['DATA'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    backup = pd.to_numeric(df['DATA_Backup'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    candidates = np.abs(data - backup) >= anomaly_thresholds['min_delta']
+
+    df_rows = df[candidates][['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD']].reset_index(drop=True)
+    df_rows['DATA'] = data[candidates]
+    df_rows['DATA_Backup'] = backup[candidates]
+    return df_rows
+
+
+
+def screen_row_values(df_rows, account_stats):
+
+    # The load file rows whose value is out of line with the backup value it replaces, from the rows kept by anomaly_row_candidates
+    # A row's z-score is taken against the mean and spread of the changes of all of its account's rows in the load file (see account_change_stats)
+    # Single rows change sign often enough (e.g., a small variance) that only whole accounts are checked for a sign flip
+    data = df_rows['DATA'].to_numpy(dtype=float)
+    backup = df_rows['DATA_Backup'].to_numpy(dtype=float)
+    row_stats = account_stats.reindex(df_rows['ACCT'])
+    zscore = (data - backup - row_stats['Mean'].to_numpy()) / row_stats['Spread'].to_numpy()
+    df_screen, flagged = screen_values(data, backup, zscore, check_sign=False)
+
+    df_rows = df_rows[flagged].drop(columns=['DATA','DATA_Backup']).reset_index(drop=True)
+    df_rows.insert(0, 'Level', 'Row')
+    df_rows['Rows'] = 1
+    return pd.concat([df_rows, df_screen], axis=1)
+
+
+
+def screen_account_values(df_sums):
+
+    # The accounts whose total is out of line with the backup total it replaces, from the ACCT rollup partial sums (see DataLoader.get_rollup_partial_sums)
+    # An account's z-score is taken over the changes of the load file's accounts in the same Scenario, Version and Year
+    df_sums = df_sums.reset_index(drop=True)
+    data = df_sums['DATA'].to_numpy(dtype=float)
+    backup = df_sums['DATA_Backup'].to_numpy(dtype=float)
+    zscore = change_zscores(data - backup, df_sums.groupby(['SCEN','VER','YEAR'], dropna=False).ngroup().to_numpy())
+    df_screen, flagged = screen_values(data, backup, zscore)
+
+    df_accounts = df_sums[flagged][['ACCT','SCEN','VER','YEAR','Rows']].reset_index(drop=True)
+    df_accounts.insert(0, 'Level', 'Account')
+    return pd.concat([df_accounts, df_screen], axis=1)
+
+
+
+def serialize_output(df):
+
+    # The exact bytes of a headless output file; shard checksums are computed over the same bytes
+    return df.to_csv(index=False).encode('utf-8')
+
+
+
+def write_shard_manifest(df, load_file_name, shard_by):
+
+    print('Running write_shard_manifest...')
+
+    # The manifest lists each shard of a load file with its row count and checksum
+    # It's written after the shards, so the Essbase batch can start the shards' load rules in parallel once it appears
+    # A checksum is only listed where this script writes the shard's bytes (headless; see write_output)
+    # Inside Alteryx the workflow's output tools write the shards, so their bytes aren't known here and the manifest has no checksums
+    if not publish_outputs:
+        return
+
+    manifest = []
+    for shard_name, df_shard in df.groupby('FileName', sort=True):
+        shard = {}
+        shard['LoadFile'] = load_file_name
+        shard['ShardFile'] = shard_name + '.txt'
+        shard['ShardBy'] = shard_by
+        shard['FirstMember'] = df_shard[shard_by].min()
+        shard['LastMember'] = df_shard[shard_by].max()
+        shard['Rows'] = len(df_shard.index)
+        if Alteryx is None:
+            shard['SHA256'] = hashlib.sha256(serialize_output(df_shard)).hexdigest()
+        manifest.append(shard)
+
+    manifest_file = os.path.join(load_files_output_dir, load_file_name + '_manifest.csv')
+    publish_output_file(manifest_file, serialize_output(pd.DataFrame(manifest)))
+
+    logging.info('Shard manifest written to ' + manifest_file)
+    print('Shard manifest written to ' + manifest_file)
+
+
+
+def claim_output_name(file_name, prefix=''):
+
+    # Reserves an output file name that ends with the run's timestamp (e.g., Working_Load_..._2026-10-19-0436) for this run
+    # The timestamp only has minute resolution, so two runs (or two sheets of one run, e.g., Actual_Load_<workbook>) can build the same name;
+    # the first to claim it keeps it, and the others get a claim number before the timestamp (e.g., _R2_2026-10-19-0436), which still matches the batch's file masks
+    # A claim is a folder, and creating a folder either succeeds or fails as a whole, so runs on any host can claim names without a lock
+    # prefix is the part of the file's name that its writer adds to the FileName (e.g., CapacityFlags for a capacity flag file, see write_output);
+    # the whole name is claimed, and the FileName is returned with its claim number
+    # Names are claimed inside Alteryx too: the workflow's output tools name the files from the FileName column
+    # There the output tools write the files, so writing them atomically (to a temporary name, then renaming) is up to the workflow; see publish_output_file for headless runs
+    if not publish_outputs:
+        return file_name
+
+    stem, timestamp = file_name.rsplit('_', 1)
+    claims_dir = os.path.join(output_claims_dir, timestamp)
+    os.makedirs(claims_dir, exist_ok=True)
+
+    claim_number = 1
+    while True:
+        claimed_name = file_name if claim_number == 1 else stem + '_R' + str(claim_number) + '_' + timestamp
+        try:
+            os.mkdir(os.path.join(claims_dir, prefix + claimed_name))
+            if claim_number > 1:
+                logging.info(prefix + file_name + ' was already claimed by another run; this run\'s file is ' + prefix + claimed_name)
+            return claimed_name
+        except FileExistsError:
+            claim_number += 1
+
+
+
+def publish_output_file(file_path, data):
+
+    # Writes an output file in the run's workspace and then renames it into place, so no one ever sees a partial file
+    # Replacing a file is a single rename, so a run that writes the same file again (e.g., an analyst's error file) needs no lock either
+    os.makedirs(run_workspace_dir, exist_ok=True)
+    workspace_file = os.path.join(run_workspace_dir, os.path.basename(file_path))
+    with open(workspace_file, 'wb') as f:
+        f.write(data)
+    os.replace(workspace_file, file_path)
+
+
+
+def remove_run_workspace():
+
+    # Runs when the process exits (see setup_run): removes the run's workspace, and the workspaces and claims that are more than run_workspace_hours old
+    # Workspaces are named by run ID and claims by minute, so their age is read from their names
+    shutil.rmtree(run_workspace_dir, ignore_errors=True)
+    expiry_time = datetime.datetime.now() - datetime.timedelta(hours=run_workspace_hours)
+    try:
+        if os.path.isdir(run_workspaces_dir):
+            for workspace in os.listdir(run_workspaces_dir):
+                if workspace != 'Claims' and workspace < expiry_time.strftime('%Y%m%d-%H%M%S'):
+                    shutil.rmtree(os.path.join(run_workspaces_dir, workspace), ignore_errors=True)
+        if os.path.isdir(output_claims_dir):
+            for claims in os.listdir(output_claims_dir):
+                if claims < expiry_time.strftime('%Y-%m-%d-%H%M'):
+                    shutil.rmtree(os.path.join(output_claims_dir, claims), ignore_errors=True)
+    except OSError:
+        # Another run may be cleaning up at the same time; whatever is left is removed next time
+        pass
+
+
+
+def write_output(df, anchor):
+
+    # Inside Alteryx, the output anchors feed the workflow's output and email tools:
+    #   1 = load file, 2 = capacity flag file, 3 = error file, 4 = rollup impact summary, 5 = anomaly report
+    captured_outputs.append((anchor, df))
+    if not publish_outputs:
+        return
+    if Alteryx is not None:
+        Alteryx.write(df, anchor)
+        return
+
+    # Headless: write the files that the workflow's output tools would have written (each one through the run's workspace)
+    if anchor == 3:
+        file_path = os.path.join(validation_errors_dir, 'Validation_Errors_' + str(df['FileName'].iloc[0]))
+        publish_output_file(file_path, serialize_output(df))
+        print('Error file written to ' + file_path)
+        return
+
+    if anchor == 4:
+        os.makedirs(rollup_impact_dir, exist_ok=True)
+        file_path = os.path.join(rollup_impact_dir, 'RollupImpact_' + str(df['FileName'].iloc[0]) + '.txt')
+        publish_output_file(file_path, serialize_output(df))
+        print('Rollup impact summary written to ' + file_path)
+        return
+
+    if anchor == 5:
+        os.makedirs(anomaly_reports_dir, exist_ok=True)
+        file_path = os.path.join(anomaly_reports_dir, 'AnomalyReport_' + str(df['FileName'].iloc[0]) + '.txt')
+        publish_output_file(file_path, serialize_output(df))
+        print('Anomaly report written to ' + file_path)
+        return
+
+    # The FileName column names the output file; write one file per name
+    for file_name, df_file in df.groupby('FileName', sort=False):
+        if anchor == 2:
+            file_name = 'CapacityFlags' + file_name
+        file_path = os.path.join(load_files_output_dir, file_name + '.txt')
+        publish_output_file(file_path, serialize_output(df_file))
+        print('Output file written to ' + file_path)
+
+
+
+def write_load_file_blocks(blocks, capture=False):
+
+    # Writes a load file that's produced in blocks (see DataLoader.stream_exto_load_file); every block has the same FileName
+    # Headless, each block is appended to a file in the run's workspace as soon as it's produced, and the file is renamed into place once
+    # the last block is written (see publish_output_file), so the Essbase batch never picks up a partial file and only one block is in memory at a time
+    # Inside Alteryx an anchor takes a single dataframe, so the finished blocks are combined and written at the end;
+    # the unpivot, the backup rows and the join still only exist for one block at a time
+    # The blocks are only kept in captured_outputs when the outputs aren't published (e.g., a replay) or capture is requested
+    if publish_outputs and Alteryx is not None:
+        write_output(pd.concat(list(blocks), ignore_index=True), 1)
+        return
+
+    file_name = None
+    f = None
+    try:
+        for df in blocks:
+            if capture or not publish_outputs:
+                captured_outputs.append((1, df))
+            if not publish_outputs or len(df.index) == 0:
+                continue
+            if f is None:
+                file_name = str(df['FileName'].iloc[0]) + '.txt'
+                os.makedirs(run_workspace_dir, exist_ok=True)
+                f = open(os.path.join(run_workspace_dir, file_name), 'wb')
+                f.write(df.to_csv(index=False).encode('utf-8'))
+            else:
+                f.write(df.to_csv(index=False, header=False).encode('utf-8'))
+    except Exception:
+        if not f is None:
+            f.close()
+            os.remove(os.path.join(run_workspace_dir, file_name))
+        raise
+
+    if not f is None:
+        f.close()
+        file_path = os.path.join(load_files_output_dir, file_name)
+        os.replace(os.path.join(run_workspace_dir, file_name), file_path)
+        print('Output file written to ' + file_path)
+
+
+
+def read_load_sheet(workbook_path, load_sheet_name, user_email):
+
+    # Read the load sheet the same way the Alteryx Input Data tool does:
+    #   - The first row becomes the column headers; blank headers are named F1, F2, etc. by position
+    #   - Every cell is read as a string, and empty cells are left as nulls
+    #   - The FileName (full path plus sheet name) and UserEmail fields are added
+    # The cells are then split into the LoadSheet's blocks (see split_load_sheet)
+    df = pd.read_excel(workbook_path, sheet_name=load_sheet_name, header=0, dtype=str)
+
+    return prepare_load_sheet(df, workbook_path, load_sheet_name, user_email)
+
+
+
+def prepare_load_sheet(df, workbook_path, load_sheet_name, user_email):
+
+    # Name the headers and add the fields that Alteryx adds when it imports a sheet (see read_load_sheet)
+    # Headers are named the way Alteryx names them
+    headers = []
+    for n, header in enumerate(df.columns):
+        header = str(header)
+        if header.startswith('Unnamed:'):
+            header = 'F' + str(n + 1)
+        else:
+            # pandas makes repeated headers unique with a .1, .2 suffix; Alteryx uses _2, _3
+            repeated_header = re.match(r'(.*)\.(\d+)$', header)
+            if not repeated_header is None and repeated_header.group(1) in headers:
+                header = repeated_header.group(1) + '_' + str(int(repeated_header.group(2)) + 1)
+        headers.append(header)
+    df.columns = headers
+
+    return split_load_sheet(df, input_file_name(workbook_path, load_sheet_name), user_email)
+
+
+
+def input_file_name(workbook_path, load_sheet_name):
+
+    # The FileName field that Alteryx adds when it imports a sheet: the workbook's full path and the sheet name
+    # summary_information parses the workbook and sheet names out of this field, so always use Windows separators
+    return workbook_path.replace('/', '\\') + '|||`' + load_sheet_name + '$`'
+
+
+
+def stream_load_sheet(worksheet):
+
+    # Reads a worksheet opened in openpyxl's read-only mode in a single pass over its rows, building typed blocks as it goes:
+    #   members:     the member cells (the columns before the Forecast region) as strings
+    #   values:      the Forecast region as float64; empty and non-numeric cells are NaN
+    #   text_cells:  (row, column, text) of every cell in the Forecast region that isn't a number, so its text is never lost
+    #   label_row:   the month labels row (None for ExTO data, which has its months in the headers)
+    #   sheet_rows:  the sheet row number of each data row
+    # Rows without any values are skipped and columns without any values are dropped (cleanup_load_sheet would drop both)
+    rows = worksheet.iter_rows(values_only=True)
+    header_row = next(rows, None)
+    if header_row is None:
+        return None
+    width = len(header_row)
+
+    # Blank headers are named F1, F2, etc. by position and repeated headers get a _2, _3 suffix, as in Alteryx
+    headers = []
+    header_counts = {}
+    for n, header in enumerate(header_row):
+        if is_empty_cell(header):
+            headers.append('F' + str(n + 1))
+        else:
+            header = str(header)
+            header_counts[header] = header_counts.get(header, 0) + 1
+            headers.append(header if header_counts[header] == 1 else header + '_' + str(header_counts[header]))
+
+    value_column = None
+    label_row = None
+    has_values = np.zeros(width, dtype=bool)
+    text_cells = []
+    sheet_rows = []
+    n_rows = 0
+
+    for sheet_row, row in enumerate(rows, start=2):
+        row = [None if is_empty_cell(cell) else cell for cell in row[:width]]
+        row.extend([None] * (width - len(row)))
+        row_has_values = [not cell is None for cell in row]
+        if not any(row_has_values):
+            continue
+        has_values |= row_has_values
+
+        # The first row decides the layout: ExTO data has members (ET:*) in its first row and ten member columns (YEAR is in the rows)
+        # Every other load sheet has its month labels in the first row, under the nine member columns and the year headers
+        if value_column is None:
+            exto_data = str(row[0]).startswith('ET:')
+            value_column = min(10 if exto_data else 9, width)
+            capacity = max((worksheet.max_row or 0) - 1, 16)
+            members = np.empty((capacity, value_column), dtype=object)
+            values = np.full((capacity, width - value_column), np.nan)
+            if not exto_data:
+                label_row = [None if cell is None else str(cell) for cell in row]
+                continue
+
+        if n_rows == len(members):
+            members = np.concatenate([members, np.empty(members.shape, dtype=object)])
+            values = np.concatenate([values, np.full(values.shape, np.nan)])
+
+        members[n_rows] = [None if cell is None else str(cell) for cell in row[:value_column]]
+        for j, cell in enumerate(row[value_column:]):
+            if cell is None:
+                continue
+            if isinstance(cell, (int, float)) and not isinstance(cell, bool):
+                values[n_rows, j] = cell
+                continue
+            # Numbers stored as text are parsed like the pandas reader's cells (see split_load_sheet); anything else is kept as text
+            cell = str(cell)
+            try:
+                values[n_rows, j] = float(cell)
+            except ValueError:
+                pass
+            if np.isnan(values[n_rows, j]):
+                text_cells.append((n_rows, j, cell))
+        sheet_rows.append(sheet_row)
+        n_rows += 1
+
+    if value_column is None:
+        value_column = min(9, width)
+        members = np.empty((0, value_column), dtype=object)
+        values = np.empty((0, width - value_column))
+
+    # Drop the columns without any values; the text cells are renumbered to match
+    keep_members = has_values[:value_column]
+    keep_values = has_values[value_column:]
+    value_positions = np.cumsum(keep_values) - 1
+
+    blocks = {}
+    blocks['member_headers'] = [header for header, keep in zip(headers[:value_column], keep_members) if keep]
+    blocks['value_headers'] = [header for header, keep in zip(headers[value_column:], keep_values) if keep]
+    blocks['value_columns'] = [value_column + j + 1 for j in np.flatnonzero(keep_values)]
+    blocks['members'] = members[:n_rows, keep_members]
+    blocks['values'] = values[:n_rows, keep_values]
+    blocks['text_cells'] = [(n, int(value_positions[j]), text) for n, j, text in text_cells]
+    blocks['label_row'] = None if label_row is None else [cell for cell, keep in zip(label_row, has_values) if keep]
+    blocks['sheet_rows'] = np.array(sheet_rows, dtype=np.int64)
+
+    return blocks
+
+
+
+def is_empty_cell(cell):
+
+    # Cells that the pandas reader would read as nulls
+    return cell is None or (isinstance(cell, str) and cell in excel_na_values)
+
+
+
+def format_forecast_values(values):
+
+    # The text the pandas reader produces for each number: integral values without a decimal point (e.g., 100, not 100.0)
+    text = values.astype(str).astype(object)
+    integral = np.isfinite(values) & (np.abs(values) < 2**53)
+    integral[integral] = np.mod(values[integral], 1) == 0
+    text[integral] = values[integral].astype(np.int64).astype(str)
+    text[np.isnan(values)] = None
+    return text
+
+
+
+def load_sheet_from_blocks(blocks, file_name, user_email):
+
+    # The streamed blocks are the LoadSheet's blocks: the float64 forecast block is used as it was read, without building a dataframe of the sheet
+    # The member block is indexed by sheet row like split_load_sheet's (sheet row 2 is index 0)
+    members = pd.DataFrame(blocks['members'], columns=blocks['member_headers'], index=blocks['sheet_rows'] - 2)
+    return LoadSheet(members, blocks['values'], blocks['value_headers'], blocks['value_columns'], blocks['label_row'], blocks['text_cells'], file_name, user_email)
+
+
+
+def read_load_sheet_streaming(workbook_path, load_sheet_name, user_email):
+
+    # Same load sheet as read_load_sheet, without parsing the whole workbook into an object dataframe first
+    # The forecast cells are read as numbers straight into the LoadSheet's float64 block (see load_sheet_from_blocks)
+    workbook = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        blocks = stream_load_sheet(workbook[load_sheet_name])
+    finally:
+        workbook.close()
+
+    return load_sheet_from_blocks(blocks, input_file_name(workbook_path, load_sheet_name), user_email)
+
+
+
+def is_load_sheet(load_sheet):
+
+    # A load sheet has the F1 - F9 member columns followed by the FY year headers,
+    # or (ExTO data) Equipment Type members in the first column
+    headers = load_sheet.headers()
+    if len(headers) > 9 and headers[0] == 'F1' and headers[8] == 'F9' and calendar_key(headers[9]).startswith('FY'):
+        return True
+    if load_sheet.label_row is None and len(load_sheet.members.index) > 0 and str(load_sheet.members.iloc[0,0]).startswith('ET:'):
+        return True
+    return False
+
+
+
+def read_workbook_load_sheets(workbook_path, user_email, reader='pandas'):
+
+    # Parse the workbook once and keep every sheet that's laid out like a load sheet, in workbook order
+    sheets = {}
+    if reader == 'stream':
+        workbook = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                blocks = stream_load_sheet(worksheet)
+                if not blocks is None:
+                    sheets[worksheet.title] = load_sheet_from_blocks(blocks, input_file_name(workbook_path, worksheet.title), user_email)
+        finally:
+            workbook.close()
+    else:
+        with pd.ExcelFile(workbook_path) as workbook:
+            for load_sheet_name, df in pd.read_excel(workbook, sheet_name=None, header=0, dtype=str).items():
+                sheets[load_sheet_name] = prepare_load_sheet(df, workbook_path, load_sheet_name, user_email)
+
+    load_sheets = {}
+    for load_sheet_name, load_sheet in sheets.items():
+        if is_load_sheet(load_sheet):
+            load_sheets[load_sheet_name] = load_sheet
+        else:
+            print('Sheet ' + load_sheet_name + ' is not a load sheet; it will be skipped')
+
+    print('Load sheets found in the workbook: ' + str(list(load_sheets)))
+
+    return load_sheets
+
+
+
+def read_outline_extract(dimension):
+
+    # Outline Extractor doc files are read as strings (e.g., the Level column is compared to '0')
+    return pd.read_csv(os.path.join(outline_extracts_dir, outline_extract_files[dimension]), dtype=str)
+
+
+
+def read_backup_file():
+
+    # The FIN_STMT backup has no headers; the first 10 columns are members and the rest are monthly values
+    # Column headers are assigned later in DataLoader.process_backup_file
+    return pd.read_csv(backup_file, header=None, dtype={n: str for n in range(10)})
+
+
+
+def load_input_file(reader, *reader_args):
+
+    # Runs on a worker thread; returns the dataframe along with how long it took to load
+    start_time = time.perf_counter()
+    df = reader(*reader_args)
+    return df, time.perf_counter() - start_time
+
+
+
+def get_input_files_from_share(headless_request):
+
+    print("Running get_input_files_from_share...")
+
+    # The same inputs as the Alteryx input anchors, read directly from the shared drive
+    # The backup file is by far the largest, so it's submitted first to start the longest read as early as possible
+    # It isn't read at all when the run's backup source is the memory-mapped snapshot (see get_backup_source)
+    # A load sheet name of * reads every load sheet in the workbook into LOADSHEETS instead (see process_workbook)
+    # Load sheets are streamed with openpyxl's read-only mode unless the run asks for the pandas reader (or openpyxl is missing)
+    reader = headless_request['run_options'].get('reader', default_run_options['reader'])
+    if openpyxl is None:
+        reader = 'pandas'
+
+    backup_source = get_backup_source(headless_request['run_options'].get('backup', default_run_options['backup']), backup_file)
+
+    input_readers = {}
+    if backup_source['source'] == 'export':
+        input_readers['BACKUP'] = (read_backup_file,)
+    if headless_request['load_sheet_name'] == '*':
+        load_sheet_inputs = ['LOADSHEETS']
+        input_readers['LOADSHEETS'] = (read_workbook_load_sheets, headless_request['workbook_path'], headless_request['user_email'], reader)
+    elif reader == 'stream':
+        load_sheet_inputs = ['LOADSHEET']
+        input_readers['LOADSHEET'] = (read_load_sheet_streaming, headless_request['workbook_path'], headless_request['load_sheet_name'], headless_request['user_email'])
+    else:
+        load_sheet_inputs = ['LOADSHEET']
+        input_readers['LOADSHEET'] = (read_load_sheet, headless_request['workbook_path'], headless_request['load_sheet_name'], headless_request['user_email'])
+    for dimension in outline_extract_files:
+        input_readers[dimension] = (read_outline_extract, dimension)
+
+    # The reads are dominated by network latency on the share, so load them concurrently on a bounded thread pool
+    load_start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=input_load_workers) as executor:
+        futures = {}
+        for input_name, input_reader in input_readers.items():
+            futures[input_name] = executor.submit(load_input_file, *input_reader)
+
+        input_files = {}
+        for input_name, future in futures.items():
+            input_files[input_name], load_seconds = future.result()
+            print('Loaded ' + input_name + ' in ' + '{:.2f}'.format(load_seconds) + ' seconds ' + str(getattr(input_files[input_name], 'shape', '')))
+            logging.info('Input ' + input_name + ' loaded in ' + '{:.2f}'.format(load_seconds) + ' seconds')
+
+    logging.info('All input files loaded in ' + '{:.2f}'.format(time.perf_counter() - load_start_time) + ' seconds')
+
+    # Keep the same key order as the Alteryx input anchors
+    input_files = {input_name: input_files.get(input_name) for input_name in load_sheet_inputs + list(outline_extract_files) + ['BACKUP']}
+    input_files['BACKUP_SOURCE'] = backup_source
+
+    print("All input files have been imported")
+
+    return input_files
+
+
+
+def get_input_files(headless_request=None):
+    
+    print("Running get_input_files...")
+
+    # When running headless, the input files are read directly from the shared drive
+    if headless_request is not None:
+        return get_input_files_from_share(headless_request)
+    
+    input_files = {}
+    
+    # Get the user's load workbook, the Outline Extractor doc files, the list of capacity accounts, and the FIN_STMT backup data file
+
+    # Get the user's load workbook
+    # The user will be prompted to browse to it and select the load sheet within the workbook
+    # They will also be required to enter their eID (including the 'e')
+    # The sheet arrives as text with the FileName and UserEmail fields added, and is split into the LoadSheet's blocks (see split_load_sheet)
+    df = Alteryx.read("#1")
+    input_files['LOADSHEET'] = split_load_sheet(df.drop(columns=['FileName','UserEmail']), df['FileName'].iloc[0], df['UserEmail'].iloc[0])
+
+    # Get the Outline Extractor doc files for each dimension
+    # As of 8/19/22 these file are retrieved by Alteryx from: \\disk23\fin_plan-shared\Automation-FPA\OutlineExtracts
+    # Updated files are placed in that folder as needed (ie, when new cost centers, accounts, etc. are created)
+    # The location to get the updated files from is: \\disk23\fin_plan-shared\Automation-ALTERYX\OutlineExtracts
+    ACCT_dim = Alteryx.read("#2")
+    input_files['ACCT'] = ACCT_dim 
+
+    CC_dim = Alteryx.read("#3")
+    input_files['CC'] = CC_dim
+
+    IO_dim = Alteryx.read("#4")
+    input_files['IO'] = IO_dim
+
+    CO_dim = Alteryx.read("#5")
+    input_files['CO'] = CO_dim
+
+    PC_dim = Alteryx.read("#6")
+    input_files['PC'] = PC_dim
+
+    ET_dim = Alteryx.read("#7")
+    input_files['ET'] = ET_dim
+
+    SCEN_dim = Alteryx.read("#8")
+    input_files['SCEN'] = SCEN_dim
+
+    VER_dim = Alteryx.read("#9")
+    input_files['VER'] = VER_dim
+
+    TYPE_dim = Alteryx.read("#10")
+    input_files['TYPE'] = TYPE_dim
+
+    YEAR_dim = Alteryx.read("#11")
+    input_files['YEAR'] = YEAR_dim
+
+    PERIOD_dim = Alteryx.read("#12")
+    input_files['PERIOD'] = PERIOD_dim
+
+    # Get the latest FIN_STMT backup file
+    finstmt_backup = Alteryx.read("#13")
+    input_files['BACKUP'] = finstmt_backup
+
+    # The #13 input passes the export's full path in its FileName field, like the load sheet's (#1)
+    # The run reads the snapshot in place of the anchor's rows only when the snapshot is of that export and current (see get_backup_snapshot)
+    export_file = None
+    if 'FileName' in finstmt_backup.columns and len(finstmt_backup.index) > 0:
+        export_file = str(finstmt_backup['FileName'].iloc[0])
+    input_files['BACKUP_SOURCE'] = get_backup_source(default_run_options['backup'], export_file)
+
+    print("All input files have been imported")
+
+    return input_files
+    
+
+
+def run_data_loader(input_files, summary_info, run_options):
+
+    # Validates the load sheet and creates the load file (or the error file); returns True if a load file was created
+    print('Creating the dataload object...')
+    my_load_obj = DataLoader(input_files, summary_info, run_options)
+    if not my_load_obj:
+        return False
+
+    stage_durations.clear()
+    run_statistics.clear()
+    try:
+        if my_load_obj.validation_and_cleanup() == False:
+            return False
+
+        if my_load_obj.process_load_sheet() == False:
+            return False
+
+        return True
+
+    finally:
+        stage_durations.update(my_load_obj.stage_durations)
+        run_statistics['melted_rows'] = my_load_obj.melted_rows
+        run_statistics['load_file_blocks'] = my_load_obj.load_file_blocks
+
+
+
+def fingerprint_frame(df):
+
+    # Content hash of a dataframe, including its column headers
+    sha = hashlib.sha256()
+    sha.update('|'.join(str(col) for col in df.columns).encode('utf-8'))
+    sha.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+
+def fingerprint_load_sheet(load_sheet):
+
+    # Content hash of a load sheet: its member block, the bytes of its forecast block, and everything else the run reads from it
+    sha = hashlib.sha256()
+    sha.update(fingerprint_frame(load_sheet.members).encode('utf-8'))
+    sha.update(np.ascontiguousarray(load_sheet.values).tobytes())
+    sha.update(json.dumps([load_sheet.headers(), load_sheet.value_columns, load_sheet.label_row, load_sheet.text_cells,
+                           load_sheet.file_name, load_sheet.user_email], default=str).encode('utf-8'))
+    return sha.hexdigest()
+
+
+
+def get_run_key(input_files, run_options):
+
+    print('Running get_run_key...')
+
+    # The run's outputs depend only on the load sheet, the dimension files, the backup data, the open-year window and the run options
+    # Recording a submission doesn't change its outputs, so the record option isn't part of the key
+    output_options = {option: value for option, value in run_options.items() if option != 'record'}
+    run_fingerprints = ['version:' + str(run_cache_version), 'year:' + str(now.year), 'options:' + json.dumps(output_options, sort_keys=True)]
+    run_fingerprints.append('LOADSHEET:' + fingerprint_load_sheet(input_files['LOADSHEET']))
+    for dim in ['ACCT','CC','IO','CO','PC','ET','SCEN','VER','TYPE','YEAR','PERIOD']:
+        run_fingerprints.append(dim + ':' + fingerprint_frame(input_files[dim]))
+
+    # The backup is identified rather than hashed, by the fingerprint of the source the run reads (see get_backup_source)
+    # A run whose backup can't be identified isn't cached; hashing the whole backup would cost more than the cache saves
+    backup_fingerprint = input_files['BACKUP_SOURCE']['fingerprint']
+    if backup_fingerprint is None:
+        print('The backup data can\'t be identified, so the run cache isn\'t used')
+        return None
+    run_fingerprints.append('BACKUP:' + backup_fingerprint)
+
+    return hashlib.sha256('\n'.join(run_fingerprints).encode('utf-8')).hexdigest()
+
+
+
+def get_backup_reference(backup_source):
+
+    # Identifies the backup data a run used, without copying it
+    backup_reference = {'source':backup_source['source'], 'file':backup_source['file'], 'source_mtime':backup_source['source_mtime']}
+    if not backup_source['snapshot'] is None:
+        backup_reference['created'] = backup_source['snapshot']['created']
+    return backup_reference
+
+
+
+def recorded_load_sheet(load_sheet):
+
+    # The LoadSheet is recorded as a dictionary of its blocks, not as the object: when the loader runs as a script
+    # the object would be pickled as __main__.LoadSheet, which fpa_replay.py can't load (see load_sheet_from_recording)
+    return {block: getattr(load_sheet, block) for block in LoadSheet.__slots__}
+
+
+
+def load_sheet_from_recording(recorded_blocks):
+
+    # Rebuilds a LoadSheet recorded by recorded_load_sheet
+    load_sheet = LoadSheet.__new__(LoadSheet)
+    for block in LoadSheet.__slots__:
+        setattr(load_sheet, block, recorded_blocks[block])
+    return load_sheet
+
+
+
+def start_recording(input_files, summary_info, run_options):
+
+    print('Running start_recording...')
+
+    # The inputs are serialized before the run, since validate_members adds columns to some of the dimension files
+    # The load sheet and the dimension files are small and are captured in full; the backup is only referenced (see get_backup_reference)
+    recording = {}
+    recording['summary_info'] = dict(summary_info)
+    recording['run_options'] = dict(run_options)
+    recording['current_datetime'] = current_datetime
+    recording['year'] = now.year
+    recording['backup'] = get_backup_reference(input_files['BACKUP_SOURCE'])
+    recording['fingerprints'] = {}
+    recording['inputs'] = {}
+    recording['inputs']['LOADSHEET'] = pickle.dumps(recorded_load_sheet(input_files['LOADSHEET']), protocol=4)
+    recording['fingerprints']['LOADSHEET'] = fingerprint_load_sheet(input_files['LOADSHEET'])
+    for input_name in outline_extract_files:
+        recording['inputs'][input_name] = pickle.dumps(input_files[input_name], protocol=4)
+        recording['fingerprints'][input_name] = fingerprint_frame(input_files[input_name])
+
+    return recording
+
+
+
+def record_submission(recording, result, error=None):
+
+    print('Running record_submission...')
+
+    # error is the text of the runtime error that ended the run, if one did (see main)
+
+    try:
+        os.makedirs(recordings_dir, exist_ok=True)
+        # The run ID keeps the archives of concurrent runs of the same sheet apart
+        archive_name = current_datetime + '_' + recording['summary_info']['enhanced_file_name'][:-len('.txt')] + '_' + run_id + '.zip'
+        archive_file = os.path.join(recordings_dir, archive_name)
+
+        submission = {key: value for key, value in recording.items() if key != 'inputs'}
+        submission['result'] = result
+        submission['error'] = error
+        submission['stage_durations'] = dict(stage_durations)
+        submission['pandas_version'] = pd.__version__
+        submission['outputs'] = []
+
+        # Write the archive in the run's workspace and rename it into place, so fpa_replay.py never opens a partial archive
+        os.makedirs(run_workspace_dir, exist_ok=True)
+        workspace_file = os.path.join(run_workspace_dir, archive_name)
+        with zipfile.ZipFile(workspace_file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for input_name, input_data in recording['inputs'].items():
+                archive.writestr('inputs/' + input_name + '.pkl', input_data)
+            for n, (anchor, df) in enumerate(captured_outputs):
+                output_file = 'outputs/output_' + str(n) + '.pkl'
+                archive.writestr(output_file, pickle.dumps(df, protocol=4))
+                submission['outputs'].append({'anchor':anchor, 'file':output_file})
+            archive.writestr('submission.json', json.dumps(submission, indent=2))
+        os.replace(workspace_file, archive_file)
+
+        logging.info('Submission recorded to ' + archive_file)
+        print('Submission recorded to ' + archive_file)
+
+    except Exception as e:
+        # Recording is only a diagnostic aid; never fail a run because of it
+        logging.warning('The submission could not be recorded: ' + str(e))
+
+
+
+def save_run_history(run_record, outcome, run_seconds):
+
+    # Appends the run and the duration of each of its stages to the run history database
+    # outcome is 'loaded' (a load file was created), 'rejected' (an error file was created), 'cached' (replayed from the run cache), or 'error'
+    try:
+        os.makedirs(os.path.dirname(run_history_db), exist_ok=True)
+
+        # Several runs can finish at the same time on the server; SQLite serializes the writes, so wait for the lock instead of failing
+        connection = sqlite3.connect(run_history_db, timeout=30)
+        try:
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS runs (run_number INTEGER PRIMARY KEY AUTOINCREMENT, started TEXT, host TEXT, '
+                                   'user_id TEXT, workbook_name TEXT, load_sheet_name TEXT, sheet_rows INTEGER, sheet_columns INTEGER, '
+                                   'melted_rows INTEGER, outcome TEXT, run_seconds REAL)')
+                connection.execute('CREATE TABLE IF NOT EXISTS run_stages (run_number INTEGER, stage TEXT, seconds REAL)')
+
+                cursor = connection.execute('INSERT INTO runs (started, host, user_id, workbook_name, load_sheet_name, sheet_rows, sheet_columns, '
+                                            'melted_rows, outcome, run_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                            (run_record['started'], platform.node(), run_record['user_id'], run_record['workbook_name'],
+                                             run_record['load_sheet_name'], run_record['sheet_rows'], run_record['sheet_columns'],
+                                             run_statistics.get('melted_rows'), outcome, run_seconds))
+                connection.executemany('INSERT INTO run_stages (run_number, stage, seconds) VALUES (?, ?, ?)',
+                                       [(cursor.lastrowid, stage, seconds) for stage, seconds in stage_durations.items()])
+        finally:
+            connection.close()
+
+    except Exception as e:
+        # The history is only used for reporting; never fail a run because of it
+        logging.warning('The run could not be added to the run history: ' + str(e))
+
+
+
+def replay_file_name(file_name, cached_datetime, claimed_names, prefix=''):
+
+    # The name a cached output file gets when it's replayed: the cached run's claim number (if any) and timestamp are replaced
+    # with this run's timestamp and claim (see claim_output_name, which also explains prefix); a shard keeps its _PartNNofMM suffix
+    # claimed_names holds the names this replay has already claimed, so every file of a load file gets the same one
+    name_match = re.match(r'^(.*?)(?:_R\d+)?_' + re.escape(cached_datetime) + r'(_Part\d+of\d+)?$', file_name)
+    if name_match is None:
+        return file_name
+
+    unclaimed_name = name_match.group(1) + '_' + current_datetime
+    if not prefix + unclaimed_name in claimed_names:
+        claimed_names[prefix + unclaimed_name] = claim_output_name(unclaimed_name, prefix)
+    return claimed_names[prefix + unclaimed_name] + (name_match.group(2) or '')
+
+
+
+def replay_cached_run(run_key, run_options):
+
+    # Returns the cached result after writing the cached outputs again, or None if this submission hasn't been run before
+    cache_entry_dir = os.path.join(run_cache_dir, run_key)
+    if not os.path.exists(os.path.join(cache_entry_dir, 'run.json')):
+        return None
+
+    print('Running replay_cached_run...')
+
+    with open(os.path.join(cache_entry_dir, 'run.json')) as f:
+        cached_run = json.load(f)
+
+    claimed_names = {}
+    for output in cached_run['outputs']:
+        df = pd.read_pickle(os.path.join(cache_entry_dir, output['file']))
+        # Load and flag files are named with the run's timestamp; give them this run's timestamp, claimed for this run
+        # (the summaries of a load file are named after it, so they share its claim)
+        if output['anchor'] != 3:
+            prefix = 'CapacityFlags' if output['anchor'] == 2 else ''
+            file_names = {file_name: replay_file_name(file_name, cached_run['current_datetime'], claimed_names, prefix) for file_name in df['FileName'].unique()}
+            df['FileName'] = df['FileName'].map(file_names)
+        write_output(df, output['anchor'])
+        if output['anchor'] == 1 and run_options['shards'] > 1:
+            write_shard_manifest(df, re.sub(r'_Part\d+of\d+$', '', df['FileName'].iloc[0]), run_options['shard_by'])
+
+    logging.info('Identical submission found in the run cache (run ' + cached_run['current_datetime'] + '); its outputs were replayed')
+    print('Identical submission found in the run cache; its outputs were replayed')
+
+    return cached_run['result']
+
+
+
+def save_cached_run(run_key, result):
+
+    print('Running save_cached_run...')
+
+    try:
+        # Write the entry to a temporary folder and rename it, so a concurrent run never sees a partial entry
+        cache_entry_dir = os.path.join(run_cache_dir, run_key)
+        cache_temp_dir = cache_entry_dir + '.tmp' + str(os.getpid())
+        os.makedirs(cache_temp_dir)
+
+        cached_run = {'result':result, 'current_datetime':current_datetime, 'outputs':[]}
+        for n, (anchor, df) in enumerate(captured_outputs):
+            output_file = 'output_' + str(n) + '.pkl.gz'
+            df.to_pickle(os.path.join(cache_temp_dir, output_file))
+            cached_run['outputs'].append({'anchor':anchor, 'file':output_file})
+        with open(os.path.join(cache_temp_dir, 'run.json'), 'w') as f:
+            json.dump(cached_run, f)
+
+        if os.path.exists(cache_entry_dir):
+            shutil.rmtree(cache_temp_dir)  # Another run cached the same submission first
+        else:
+            os.rename(cache_temp_dir, cache_entry_dir)
+
+        # Remove the expired entries
+        expiry_time = time.time() - run_cache_days * 24 * 60 * 60
+        for entry in os.listdir(run_cache_dir):
+            entry_dir = os.path.join(run_cache_dir, entry)
+            if os.path.getmtime(entry_dir) < expiry_time:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+
+    except Exception as e:
+        # The cache is only an optimization; never fail a run because of it
+        logging.warning('The run could not be cached: ' + str(e))
+
+
+
+def process_workbook(headless_request):
+
+    print('Running process_workbook...')
+
+    # Every load sheet in the workbook is processed in one run, and each one gets its own load file or error file
+    # The workbook is parsed once, and the dimension files and the backup are loaded once and shared by all of the sheets
+    input_files = get_input_files(headless_request)
+    load_sheets = input_files.pop('LOADSHEETS')
+    if not load_sheets:
+        logging.warning('No load sheets were found in ' + headless_request['workbook_path'])
+        print('No load sheets were found in the workbook')
+        return False
+
+    results = {}
+    for load_sheet_name, load_sheet in load_sheets.items():
+        print('Processing load sheet ' + load_sheet_name + '...')
+        sheet_input_files = dict(input_files)
+        sheet_input_files['LOADSHEET'] = load_sheet
+        results[load_sheet_name] = main(headless_request, sheet_input_files)
+
+    for load_sheet_name, result in results.items():
+        print('Load sheet ' + load_sheet_name + (' was processed successfully' if result == True else ' was NOT processed successfully'))
+    logging.info(str(list(results.values()).count(True)) + ' of ' + str(len(results)) + ' load sheets in ' + headless_request['workbook_path'] + ' were processed successfully')
+
+    return all(result == True for result in results.values())
+
+
+
+def main(headless_request=None, input_files=None):
+    
+    # This function is the entry point into the entire process of validating the load sheet and creating a load file
+    # headless_request is only provided when the script runs outside of Alteryx (see get_headless_request)
+    # input_files is only provided by process_workbook, which has already loaded the inputs for all of the sheets in a workbook
+
+    setup_run()
+
+    run_start_time = time.perf_counter()
+    run_record = None
+    recording = None
+    
+    try:
+    
+        print("Running main...")
+
+        if input_files is None and headless_request is not None and headless_request['load_sheet_name'] == '*':
+            return process_workbook(headless_request)
+
+        if input_files is None:
+            input_files = get_input_files(headless_request)  # A dictionary is returned that contains all 14 files defined in get_input_files()
+        load_sheet = input_files['LOADSHEET']
+        finstmt_backup = input_files['BACKUP']
+
+        # Get summary information about the load from the FileName and UserEmail fields
+        # Info will include the user's eID and email address, the name of the workbook, and the name of the load sheet
+        # Note1: The email address is formatted as e12345@wnco.com
+        # Note2: The FileName field contains the full path to the analyst's Excel file
+        summary_info = summary_information(load_sheet)  # The info will be returned in a dictionary
+        user_id = summary_info.get('user_id', '')
+        user_email = summary_info.get('user_email', '')
+        workbook_name = summary_info.get('workbook_name', '')
+        load_sheet_name = summary_info.get('load_sheet_name', '')
+        summary_info['enhanced_file_name'] = user_id + '_' + workbook_name + '_' + load_sheet_name + '.txt'
+
+        logging.info("Validating the worksheet " + load_sheet_name + " in " + workbook_name + " for user " + user_id + "...")
+
+        # What the run history needs to know about the sheet before it's cleaned up
+        run_record = {'started':datetime.datetime.now().isoformat(timespec='seconds'), 'user_id':user_id, 'workbook_name':workbook_name, 'load_sheet_name':load_sheet_name,
+                      'sheet_rows':load_sheet.shape()[0], 'sheet_columns':load_sheet.shape()[1]}
+        stage_durations.clear()
+        run_statistics.clear()
+
+        # Display high-level info about the data to load
+        print('Load sheet before cleanup and processing:')
+        print(load_sheet.members.head())
+        print(load_sheet.shape())
+
+        # Add a new column to the FIN_STMT backup file
+        # Note: A headless run doesn't read the backup file when the backup snapshot is current
+        if finstmt_backup is not None:
+            finstmt_backup['FileName'] = 'CORPPLN_Forecast_CY'
+            print('FIN_STMT backup data:')
+            print(finstmt_backup.head())
+
+        # Options for this run (e.g., sharding the load file); a headless run can override the defaults
+        run_options = dict(default_run_options)
+        if headless_request is not None:
+            run_options.update(headless_request['run_options'])
+
+        # An identical resubmission replays the outputs of the earlier run instead of recomputing them
+        run_key = None
+        if use_run_cache:
+            run_key = get_run_key(input_files, run_options)
+        if not run_key is None:
+            cached_result = replay_cached_run(run_key, run_options)
+            if not cached_result is None:
+                save_run_history(run_record, 'cached', time.perf_counter() - run_start_time)
+                return cached_result
+
+        # Optionally record the submission so it can be replayed offline (see fpa_replay.py)
+        if run_options['record']:
+            recording = start_recording(input_files, summary_info, run_options)
+
+        captured_outputs.clear()
+        result = run_data_loader(input_files, summary_info, run_options)
+
+        # A streamed load file isn't kept in captured_outputs, so the run can't be replayed from the cache
+        if not run_key is None and run_statistics.get('load_file_blocks') is None:
+            save_cached_run(run_key, result)
+
+        if not recording is None:
+            record_submission(recording, result)
+
+        save_run_history(run_record, 'loaded' if result == True else 'rejected', time.perf_counter() - run_start_time)
+
+        return result
+    
+    except Exception as e:
+        
+        log = logging.getLogger("fpa_log")
+        log.exception(e)
+
+        if not run_record is None:
+            save_run_history(run_record, 'error', time.perf_counter() - run_start_time)
+
+        # A run that failed is recorded too, with the outputs written before the error (the runtime error file below is main's, not the run's)
+        if not recording is None:
+            record_submission(recording, False, str(e))
+
+        # Attach the log to the error email
+        error_messages = []
+        this_function_name = sys._getframe(  ).f_code.co_name
+        error_messages.append('The following runtime error occurred in the ' + str(this_function_name) + ' function or one of its sub-functions : ' + str(e))
+        runtime_error_df = pd.DataFrame(error_messages, columns=['Runtime Error'])
+
+        try:
+
+            print('Running create_error_file...')
+        
+            print('Incoming runtime error dataframe:')
+            print(runtime_error_df)
+
+            # Add the FileName column to the dataframe
+            runtime_error_df['FileName'] = user_id + '_' + workbook_name + '_' + load_sheet_name + '.txt'
+
+            # Add columns containing info/details about the error
+            if user_email:
+                runtime_error_df['UserEmail'] = user_email
+            else:
+                runtime_error_df['UserEmail'] = 'e79230@wnco.com'
+            runtime_error_df['ccEmail'] = 'e79230@wnco.com'
+            runtime_error_df['ErrorEmailSubject'] = 'CRITICAL ERROR: Load process failed - see attachment for details'
+            runtime_error_df['ErrorFilePath'] = log_file
+            runtime_error_df['ErrorEmailBody'] = 'A critical error occured during the load process. Please see the attachment for details.  NOTE: No data on your sheet has been loaded.'
+
+            print('Updated runtime error dataframe:')
+            print(runtime_error_df)
+
+            # Ouput the details of the error(s) but do NOT create the load file
+            write_output(runtime_error_df, 3)
+
+            print('Load file validation FAILED. See the log for details.')
+            
+        except Exception as e2:
+            log = logging.getLogger("fpa_log")
+            log.exception(e2)
+            
+        finally:
+            # Make sure the error (and everything logged before it) reaches the log on the share before the error email goes out
+            flush_log()
+            return False
+    
+
+
+def get_headless_request():
+
+    # Command line arguments for a headless run (the Alteryx workflow prompts the user for the same information)
+    parser = argparse.ArgumentParser(description='Validate an FP&A load sheet and create its Essbase load file')
+    parser.add_argument('workbook_path', help='Full path to the analyst\'s Excel workbook')
+    parser.add_argument('load_sheet_name', help='Name of the load sheet within the workbook, or * for every load sheet in it')
+    parser.add_argument('user_email', help='Analyst\'s email address (e.g., e12345@wnco.com)')
+    parser.add_argument('--shards', type=int, default=default_run_options['shards'], help='Split the load file into this many shards')
+    parser.add_argument('--shard-by', choices=['ACCT','YEAR'], default=default_run_options['shard_by'], help='Dimension used to split the load file')
+    parser.add_argument('--reader', choices=['stream','pandas'], default=default_run_options['reader'], help='How the load sheet is read')
+    parser.add_argument('--backup', choices=['snapshot','export'], default=default_run_options['backup'], help='Where the backup values are read from')
+    parser.add_argument('--backend', choices=['pandas','arrow'], default=default_run_options['backend'], help='What runs the backup join and the member checks')
+    parser.add_argument('--block-rows', type=int, default=default_run_options['block_rows'], help='Stream an ExTO sheet through in blocks of this many rows (0 builds the load file whole)')
+    parser.add_argument('--no-anomaly-screen', dest='anomaly_screen', action='store_false', default=default_run_options['anomaly_screen'], help='Don\'t screen the loaded values against the backup values')
+    parser.add_argument('--record', action='store_true', default=default_run_options['record'], help='Record the submission so fpa_replay.py can replay it')
+    args = parser.parse_args()
+
+    headless_request = {}
+    headless_request['workbook_path'] = args.workbook_path
+    headless_request['load_sheet_name'] = args.load_sheet_name
+    headless_request['user_email'] = args.user_email
+    headless_request['run_options'] = {'shards':args.shards, 'shard_by':args.shard_by, 'record':args.record, 'reader':args.reader, 'backup':args.backup, 'backend':args.backend, 'block_rows':args.block_rows, 'anomaly_screen':args.anomaly_screen}
+
+    return headless_request
+
+
+
+# In the Alteryx Jupyter notebook __name__ is also '__main__', so the workflow runs the process exactly as before
+if __name__ == '__main__':
+
+    headless_request = None
+    if Alteryx is None:
+        headless_request = get_headless_request()
+
+    if main(headless_request) == True:
+        print('Load sheet was processed successfully')
+    else:
+        print('Load sheet was NOT processed successfully')
+
+    # Inside Alteryx the Python tool's kernel may be stopped as soon as the cell finishes, so write the queued log records now
+    flush_log()
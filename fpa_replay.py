@@ -0,0 +1,193 @@
+
+import pandas as pd
+import os
+import sys
+import json
+import time
+import pickle
+import zipfile
+import argparse
+import logging
+
+import fpa_load_file_creator as loader
+
+
+##########################################################################################
+# NOTE: Replays submissions recorded by fpa_load_file_creator.py on a workstation or test server
+# Only headless runs started with --record are recorded; the Alteryx workflow always runs with the
+# default run options, which don't record
+#
+# Each recording is rerun through the DataLoader offline (nothing is written to the Output or
+# Validation_Errors folders), every stage is timed against the recorded run, and the outputs are
+# compared row-for-row with the recorded outputs
+# A run that raised a runtime error is recorded too; its replay is expected to raise the same error
+#
+#   python fpa_replay.py <recording.zip> [<recording.zip> ...]
+##########################################################################################
+
+
+def read_recording(archive_file):
+
+    print('Running read_recording...')
+
+    with zipfile.ZipFile(archive_file) as archive:
+        submission = json.loads(archive.read('submission.json'))
+
+        input_files = {}
+        input_files['LOADSHEET'] = loader.load_sheet_from_recording(pickle.loads(archive.read('inputs/LOADSHEET.pkl')))
+        for input_name in loader.outline_extract_files:
+            input_files[input_name] = pickle.loads(archive.read('inputs/' + input_name + '.pkl'))
+
+        recorded_outputs = []
+        for output in submission['outputs']:
+            recorded_outputs.append((output['anchor'], pickle.loads(archive.read(output['file']))))
+
+    return submission, input_files, recorded_outputs
+
+
+
+def get_replay_backup(submission):
+
+    # The backup itself isn't recorded; the replay uses the current backup and warns when it isn't the one the submission used
+    # Returns the backup export (None when the replay reads the snapshot) and the replay's backup source
+    backup_source = loader.get_backup_source(submission['run_options'].get('backup', loader.default_run_options['backup']), loader.backup_file)
+    if backup_source['source_mtime'] != submission['backup']['source_mtime']:
+        print('WARNING: The backup data has changed since the submission was recorded; DATA_Backup values may differ')
+
+    # As in a headless run, the export is only read when it's the backup source (see loader.get_input_files_from_share)
+    if backup_source['source'] == 'snapshot':
+        return None, backup_source
+
+    finstmt_backup = loader.read_backup_file()
+    finstmt_backup['FileName'] = 'CORPPLN_Forecast_CY'
+    return finstmt_backup, backup_source
+
+
+
+def canonical_output(df, recorded_datetime, replay_datetime):
+
+    # Every value as a string, the run's timestamp replaced, and the rows in a fixed order
+    # A recorded run's file names can have a claim number before the timestamp (see loader.claim_output_name); a replay's never do
+    # A running count of each row makes repeated rows distinct, so they are compared one-for-one
+    df = df.astype(str).replace(r'_R\d+_' + recorded_datetime, '_' + recorded_datetime, regex=True).replace(recorded_datetime, replay_datetime, regex=True)
+    df = df.sort_values(list(df.columns)).reset_index(drop=True)
+    df['Occurrence'] = df.groupby(list(df.columns), sort=False).cumcount()
+    return df
+
+
+
+def compare_outputs(recorded_outputs, replayed_outputs, recorded_datetime, replay_datetime):
+
+    # Compares the outputs anchor by anchor; returns one summary per anchor that either run wrote to
+    comparisons = []
+    anchors = sorted(set(anchor for anchor, df in recorded_outputs) | set(anchor for anchor, df in replayed_outputs))
+    for anchor in anchors:
+        recorded = [df for output_anchor, df in recorded_outputs if output_anchor == anchor]
+        replayed = [df for output_anchor, df in replayed_outputs if output_anchor == anchor]
+        df_recorded = pd.concat(recorded, ignore_index=True) if recorded else pd.DataFrame()
+        df_replayed = pd.concat(replayed, ignore_index=True) if replayed else pd.DataFrame()
+
+        comparison = {'anchor':anchor, 'recorded_rows':len(df_recorded.index), 'replayed_rows':len(df_replayed.index)}
+        comparison['columns_match'] = list(df_recorded.columns) == list(df_replayed.columns)
+
+        if comparison['columns_match'] and recorded and replayed:
+            df_recorded = canonical_output(df_recorded, recorded_datetime, replay_datetime)
+            df_replayed = canonical_output(df_replayed, recorded_datetime, replay_datetime)
+            df_compared = df_recorded.merge(df_replayed, how='outer', indicator=True)
+            comparison['only_recorded'] = int((df_compared['_merge'] == 'left_only').sum())
+            comparison['only_replayed'] = int((df_compared['_merge'] == 'right_only').sum())
+        else:
+            comparison['only_recorded'] = comparison['recorded_rows']
+            comparison['only_replayed'] = comparison['replayed_rows']
+
+        comparison['identical'] = comparison['columns_match'] and comparison['only_recorded'] == 0 and comparison['only_replayed'] == 0
+        comparisons.append(comparison)
+
+    return comparisons
+
+
+
+def print_stage_durations(recorded_durations, replayed_durations):
+
+    print('')
+    print('Stage durations (seconds):')
+    stages = list(replayed_durations) + [stage for stage in recorded_durations if not stage in replayed_durations]
+    df_durations = pd.DataFrame({'Recorded': pd.Series(recorded_durations, dtype=float), 'Replayed': pd.Series(replayed_durations, dtype=float)}).reindex(stages)
+    df_durations['Change'] = (df_durations['Replayed'] / df_durations['Recorded'] - 1).map(lambda x: '' if pd.isna(x) else '{:+.0%}'.format(x))
+    print(df_durations.round(3).to_string())
+
+
+
+def replay_submission(archive_file):
+
+    print('Running replay_submission for ' + archive_file + '...')
+
+    submission, input_files, recorded_outputs = read_recording(archive_file)
+    if submission['year'] != loader.now.year:
+        print('WARNING: The submission was recorded in ' + str(submission['year']) + '; the open-year window has moved since then')
+
+    input_files['BACKUP'], input_files['BACKUP_SOURCE'] = get_replay_backup(submission)
+
+    # Capture the outputs without writing them to the shared drive
+    loader.publish_outputs = False
+    loader.captured_outputs.clear()
+
+    # The outputs written before a runtime error were recorded, so they're compared the same way
+    start_time = time.perf_counter()
+    replay_error = None
+    try:
+        result = loader.run_data_loader(input_files, submission['summary_info'], submission['run_options'])
+    except Exception as e:
+        result = False
+        replay_error = str(e)
+    replay_seconds = time.perf_counter() - start_time
+
+    replayed_outputs = list(loader.captured_outputs)
+    comparisons = compare_outputs(recorded_outputs, replayed_outputs, submission['current_datetime'], loader.current_datetime)
+
+    print('')
+    print('Replay of ' + os.path.basename(archive_file) + ' (' + submission['summary_info']['enhanced_file_name'] + ')')
+    print('Result: recorded ' + str(submission['result']) + ', replayed ' + str(result))
+    if not submission.get('error') is None or not replay_error is None:
+        print('Runtime error: recorded ' + str(submission.get('error')) + ', replayed ' + str(replay_error))
+    print('Total replay time: ' + '{:.2f}'.format(replay_seconds) + ' seconds')
+    print_stage_durations(submission['stage_durations'], dict(loader.stage_durations))
+    print('')
+    print('Output comparison:')
+    print(pd.DataFrame(comparisons).to_string(index=False))
+
+    identical = result == submission['result'] and submission.get('error') == replay_error and all(comparison['identical'] for comparison in comparisons)
+    logging.info('Replay of ' + os.path.basename(archive_file) + ': ' + ('outputs identical' if identical else 'outputs DIFFER') + ' in ' + '{:.2f}'.format(replay_seconds) + ' seconds')
+
+    return identical
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Replay recorded FP&A load submissions and compare their outputs')
+    parser.add_argument('recordings', nargs='+', help='Recording archives written by fpa_load_file_creator.py')
+    args = parser.parse_args()
+
+    all_identical = True
+    for archive_file in args.recordings:
+        try:
+            if replay_submission(archive_file) == False:
+                all_identical = False
+        except Exception as e:
+            log = logging.getLogger("fpa_log")
+            log.exception(e)
+            print('Replay of ' + archive_file + ' FAILED: ' + str(e))
+            all_identical = False
+
+    return all_identical
+
+
+
+if __name__ == '__main__':
+
+    if main() == True:
+        print('All replayed submissions matched their recorded outputs')
+    else:
+        print('At least one replayed submission did NOT match its recorded outputs')
+        sys.exit(1)
@@ -0,0 +1,159 @@
+
+import pandas as pd
+import os
+import sys
+import sqlite3
+import argparse
+
+import fpa_load_file_creator as loader
+
+
+##########################################################################################
+# NOTE: Reports on the run history that fpa_load_file_creator.py appends to after every run
+# (see save_run_history); run it on the Alteryx server that holds the database
+#
+# Shows the duration percentiles of each stage overall and by month, and flags the runs and
+# stages that were slower than their trailing baseline (e.g., after an outline change)
+#
+# Runs replayed from the run cache are counted, but their durations are left out of the statistics
+#
+#   python fpa_run_history.py [--days 30] [--baseline-runs 20] [--threshold 1.5]
+##########################################################################################
+
+
+def read_run_history(run_history_db):
+
+    print('Running read_run_history...')
+
+    # One row per run, and one row per stage of each run; the whole run is included as the 'total' stage
+    connection = sqlite3.connect(run_history_db)
+    try:
+        df_runs = pd.read_sql_query('SELECT * FROM runs', connection)
+        df_stages = pd.read_sql_query('SELECT * FROM run_stages', connection)
+    finally:
+        connection.close()
+
+    df_runs['started'] = pd.to_datetime(df_runs['started'])
+    df_totals = df_runs[['run_number','run_seconds']].rename(columns={'run_seconds':'seconds'})
+    df_totals['stage'] = 'total'
+    df_stages = pd.concat([df_stages, df_totals], ignore_index=True)
+    df_stages = df_stages.merge(df_runs[['run_number','started','outcome','user_id','workbook_name','load_sheet_name','sheet_rows','melted_rows']], on='run_number')
+
+    return df_runs, df_stages.sort_values(['started','run_number']).reset_index(drop=True)
+
+
+
+def duration_percentiles(df_stages, group_columns):
+
+    # Count, median, 90th and 95th percentiles, and maximum of the stage durations in each group
+    grouped = df_stages.groupby(group_columns)['seconds']
+    df_percentiles = grouped.quantile([0.5, 0.9, 0.95]).unstack()
+    df_percentiles.columns = ['p50','p90','p95']
+    df_percentiles.insert(0, 'runs', grouped.count())
+    df_percentiles['max'] = grouped.max()
+    return df_percentiles.round(3)
+
+
+
+def flag_run_regressions(df_stages, baseline_runs, threshold, min_seconds):
+
+    # A run's stage is flagged when it took more than threshold times the median of the stage's previous baseline_runs runs
+    # (and at least min_seconds longer, so sub-second noise isn't reported)
+    df_stages = df_stages.copy()
+    df_stages['baseline'] = df_stages.groupby('stage')['seconds'].transform(
+        lambda seconds: seconds.shift(1).rolling(baseline_runs, min_periods=min(5, baseline_runs)).median())
+    df_stages['ratio'] = df_stages['seconds'] / df_stages['baseline']
+
+    regressed = (df_stages['ratio'] > threshold) & (df_stages['seconds'] - df_stages['baseline'] >= min_seconds)
+    return df_stages[regressed]
+
+
+
+def flag_stage_regressions(df_stages, recent_start, baseline_days, threshold):
+
+    # A stage is flagged when its median over the report window is more than threshold times its median over the baseline_days before it
+    recent = df_stages[df_stages['started'] >= recent_start]
+    baseline = df_stages[(df_stages['started'] < recent_start) & (df_stages['started'] >= recent_start - pd.Timedelta(days=baseline_days))]
+
+    df_compared = pd.DataFrame({'recent_runs': recent.groupby('stage')['seconds'].count(),
+                                'recent_p50': recent.groupby('stage')['seconds'].median(),
+                                'baseline_runs': baseline.groupby('stage')['seconds'].count(),
+                                'baseline_p50': baseline.groupby('stage')['seconds'].median()})
+    df_compared['ratio'] = df_compared['recent_p50'] / df_compared['baseline_p50']
+    return df_compared[df_compared['ratio'] > threshold].round(3)
+
+
+
+def print_report(df_runs, df_stages, args):
+
+    recent_start = pd.Timestamp.now().normalize() - pd.Timedelta(days=args.days)
+
+    print('')
+    print('Runs by outcome (last ' + str(args.days) + ' days):')
+    print(df_runs[df_runs['started'] >= recent_start]['outcome'].value_counts().to_string())
+
+    # Cached runs didn't run any stages, so they would only drag the percentiles down
+    df_timed = df_stages[df_stages['outcome'] != 'cached']
+    df_recent = df_timed[df_timed['started'] >= recent_start]
+
+    print('')
+    print('Stage durations in seconds (last ' + str(args.days) + ' days):')
+    if len(df_recent.index) > 0:
+        print(duration_percentiles(df_recent, ['stage']).to_string())
+
+    print('')
+    print('Stage durations in seconds by month:')
+    df_months = df_timed.assign(month=df_timed['started'].dt.strftime('%Y-%m'))
+    print(duration_percentiles(df_months, ['stage','month']).to_string())
+
+    print('')
+    print('Runs with a stage more than ' + str(args.threshold) + 'x its trailing median of ' + str(args.baseline_runs) + ' runs (last ' + str(args.days) + ' days):')
+    df_run_regressions = flag_run_regressions(df_timed, args.baseline_runs, args.threshold, args.min_seconds)
+    df_run_regressions = df_run_regressions[df_run_regressions['started'] >= recent_start]
+    if len(df_run_regressions.index) > 0:
+        print(df_run_regressions[['run_number','started','user_id','workbook_name','load_sheet_name','sheet_rows','melted_rows','stage','seconds','baseline','ratio']].round(3).to_string(index=False))
+    else:
+        print('None')
+
+    print('')
+    print('Stages whose median over the last ' + str(args.days) + ' days is more than ' + str(args.threshold) + 'x their median over the ' + str(args.baseline_days) + ' days before:')
+    df_stage_regressions = flag_stage_regressions(df_timed, recent_start, args.baseline_days, args.threshold)
+    if len(df_stage_regressions.index) > 0:
+        print(df_stage_regressions.to_string())
+    else:
+        print('None')
+
+    return len(df_run_regressions.index) + len(df_stage_regressions.index)
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Report on the FP&A load run history and flag the runs and stages that got slower')
+    parser.add_argument('--db', default=loader.run_history_db, help='Run history database (default: ' + loader.run_history_db + ')')
+    parser.add_argument('--days', type=int, default=30, help='Report window in days (default: 30)')
+    parser.add_argument('--baseline-runs', type=int, default=20, help='Number of earlier runs in a stage\'s trailing baseline (default: 20)')
+    parser.add_argument('--baseline-days', type=int, default=90, help='Days before the report window that a stage\'s median is compared with (default: 90)')
+    parser.add_argument('--threshold', type=float, default=1.5, help='How many times slower than the baseline counts as a regression (default: 1.5)')
+    parser.add_argument('--min-seconds', type=float, default=1.0, help='How many seconds slower a run\'s stage must be to be flagged (default: 1.0)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print('There is no run history at ' + args.db)
+        return False
+
+    df_runs, df_stages = read_run_history(args.db)
+    print('Run history: ' + str(len(df_runs.index)) + ' runs from ' + str(df_runs['started'].min()) + ' to ' + str(df_runs['started'].max()))
+
+    regressions = print_report(df_runs, df_stages, args)
+    return regressions == 0
+
+
+
+if __name__ == '__main__':
+
+    if main() == True:
+        print('No regressions were found')
+    else:
+        print('At least one run or stage regressed (or there is no run history)')
+        sys.exit(1)